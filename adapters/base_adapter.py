@@ -1,7 +1,112 @@
 import logging
+from commands import Action
 from errors import Error, ErrorCode
 
+def handles(action, property, values=None):
+    """
+    Registers an adapter method as the handler for one (action, property) pair:
+
+        @handles("ACTUATE", "state", values=["ON", "OFF"])
+        def set_state(self, command): ...
+
+    values lists the allowed "value" field, or is None for commands without one.
+    A method may handle several pairs by stacking the decorator.
+    """
+    Action(action)  # Fail at import time on a misspelled action.
+
+    def decorate(method):
+        method.__dict__.setdefault("_handles", []).append((action, property, values))
+        return method
+    return decorate
+
 class BaseAdapter:
+    # Commands the adapter accepts, as {action: {property: allowed_values}}.
+    # allowed_values is None for commands without a "value" field. The router
+    # builds its validation tables from this; adapters that leave it as None
+    # are validated against the hand-written COMMAND_SCHEMAS instead. Adapters
+    # using @handles get it derived from their handlers.
+    CAPABILITIES = None
+
+    # {(action, property): method name}, collected from @handles methods when the
+    # subclass is defined. The router compiles these into its dispatch index.
+    HANDLERS = {}
+
+    # Maximum number of commands CommandQueue runs on this adapter at once, e.g.
+    # 1 for a device on a shared bus. None means unlimited. Can be overridden per
+    # target with "max_concurrency" in adapters_config.json.
+    MAX_CONCURRENCY = None
+
+    # Adapters that can run without blocking may define
+    # `async def execute_async(self, command)`. AsyncCommandRouter awaits it
+    # directly and falls back to running `execute` in a thread pool otherwise.
+    execute_async = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        handlers = dict(cls.HANDLERS)
+        capabilities = {}
+        for name, member in vars(cls).items():
+            for action, property, values in getattr(member, "_handles", ()):
+                handlers[(action, property)] = name
+                capabilities.setdefault(action, {})[property] = values
+        cls.HANDLERS = handlers
+        if capabilities and "CAPABILITIES" not in vars(cls):
+            inherited = {action: dict(properties) for action, properties in (cls.CAPABILITIES or {}).items()}
+            for action, properties in capabilities.items():
+                inherited.setdefault(action, {}).update(properties)
+            cls.CAPABILITIES = inherited
+
+    def handlers(self):
+        """Returns {(action, property): bound handler method} for this adapter."""
+        return {key: getattr(self, name) for key, name in self.HANDLERS.items()}
+
+    def attach_events(self, emit):
+        """
+        Called by the router once the adapter is registered. Adapters that can push
+        readings (e.g. on a GPIO edge interrupt) call emit(property, value) from then
+        on; emit never blocks. The default does nothing.
+        """
+
+    def detach_events(self):
+        """Called before the adapter is removed or cleaned up; stop calling emit."""
+
+    def execute(self, command):
+        """
+        Executes a command by calling the handler registered for its action and
+        property. Adapters without @handles methods override this instead.
+        """
+        try:
+            name = self.HANDLERS.get((command.get("action"), command.get("property")))
+        except TypeError:
+            name = None
+        if name is None:
+            error = Error(ErrorCode.ADAPTER_EXECUTION_FAILED, f"Unsupported action or property for {type(self).__name__}")
+            logging.warning(error.to_dict())
+            return error
+        return getattr(self, name)(command)
+
+    # Adapters whose commands wait on the device (e.g. a sensor conversion) may
+    # define `begin_execute(self, command)`, returning a split_phase.PendingOperation
+    # or an Error. The router then completes the operation on a timer instead of
+    # holding a worker thread for the wait.
+    begin_execute = None
+
+    def health_check(self):
+        """
+        Probes the device and returns {"status": "healthy"} or
+        {"status": "unhealthy", "error": ...}. The default only reports that the
+        adapter is loaded; adapters that can reach their device should override it.
+        """
+        return {"status": "healthy"}
+
+    def execute_batch(self, commands):
+        """
+        Executes a group of commands for this adapter and returns one result per
+        command, in order. Adapters that can amortize work across a group (a single
+        bus transaction, one HTTP request) should override this.
+        """
+        return [self.execute(command) for command in commands]
+
     def __enter__(self):
         """Enter the runtime context related to this object."""
         return self
@@ -1,45 +1,81 @@
+import asyncio
 import logging
-import smbus2
-import time
 from errors import Error, ErrorCode
-from adapters.base_adapter import BaseAdapter
+from adapters.base_adapter import BaseAdapter, handles
+from i2c_bus import close_bus, open_bus
+from split_phase import PendingOperation
+from logging_config import log_command
 
 class HumiditySensorAdapter(BaseAdapter):
+    MAX_CONCURRENCY = 1
+
     def __init__(self, **kwargs):
-        self.bus = kwargs.get('bus', 1)
+        bus_number = kwargs.get('bus', 1)
         self.address = int(kwargs.get('address', '0x40'), 16)
+        self.measurement_delay = kwargs.get('measurement_delay', 0.5)
         try:
-            self.bus = smbus2.SMBus(self.bus)
-            logging.info(f"HumiditySensorAdapter initialized on I2C bus {self.bus} at address {hex(self.address)}")
+            # smbus_factory lets tests substitute a fake smbus2.SMBus
+            self.bus = open_bus(bus_number, kwargs.get('smbus_factory'))
+            logging.info(f"HumiditySensorAdapter initialized on I2C bus {bus_number} at address {hex(self.address)}")
         except Exception as e:
             error = Error(ErrorCode.ADAPTER_INITIALIZATION_FAILED, f"Failed to initialize HumiditySensorAdapter: {e}")
             logging.error(error.to_dict())
             raise e
 
-    def execute(self, command):
-        action = command.get("action")
-        property = command.get("property")
-
-        if action == "OBSERVE" and property == "current_humidity":
-            try:
-                self.bus.write_byte(self.address, 0xF5)
-                time.sleep(0.5)
-                data = self.bus.read_i2c_block_data(self.address, 0x00, 2)
-                humidity = ((data[0] << 8) | data[1]) * 125.0 / 65536.0 - 6.0
-                logging.info(f"Read humidity: {humidity}%")
-                return {"current_humidity": humidity}
-            except Exception as e:
-                error = Error(ErrorCode.ADAPTER_EXECUTION_FAILED, f"Error reading humidity sensor: {e}")
-                logging.error(error.to_dict())
-                return error
-        else:
+    def begin_execute(self, command):
+        """
+        Starts a command and returns a PendingOperation that completes it once the
+        sensor's conversion time has elapsed, or an Error.
+        """
+        if (command.get("action"), command.get("property")) not in self.HANDLERS:
             error = Error(ErrorCode.ADAPTER_EXECUTION_FAILED, "Unsupported action or property for HumiditySensorAdapter")
             logging.warning(error.to_dict())
             return error
+        try:
+            # Trigger a humidity measurement (no hold master mode)
+            self.bus.write_byte(self.address, 0xF5)
+            return PendingOperation(self.measurement_delay, self._read_humidity)
+        except Exception as e:
+            error = Error(ErrorCode.ADAPTER_EXECUTION_FAILED, f"Error reading humidity sensor: {e}")
+            logging.error(error.to_dict())
+            return error
+
+    def _read_humidity(self):
+        try:
+            data = self.bus.read_i2c_block_data(self.address, 0x00, 2)
+            humidity = ((data[0] << 8) | data[1]) * 125.0 / 65536.0 - 6.0
+            log_command("Read humidity: %s%%", humidity)
+            return {"current_humidity": humidity}
+        except Exception as e:
+            error = Error(ErrorCode.ADAPTER_EXECUTION_FAILED, f"Error reading humidity sensor: {e}")
+            logging.error(error.to_dict())
+            return error
+
+    @handles("OBSERVE", "current_humidity")
+    def read_humidity(self, command):
+        operation = self.begin_execute(command)
+        if isinstance(operation, Error):
+            return operation
+        return operation.wait()
+
+    async def execute_async(self, command):
+        operation = self.begin_execute(command)
+        if isinstance(operation, Error):
+            return operation
+        await asyncio.sleep(operation.remaining())
+        return operation.complete()
+
+    def health_check(self):
+        try:
+            # Read the user register; the sensor only ACKs if it is on the bus.
+            self.bus.read_i2c_block_data(self.address, 0xE7, 1)
+            return {"status": "healthy"}
+        except Exception as e:
+            return {"status": "unhealthy", "error": f"Humidity sensor not responding at {hex(self.address)}: {e}"}
 
     def cleanup(self):
         try:
-            self.bus.close()
+            close_bus(self.bus)
             logging.info("I2C bus closed for HumiditySensorAdapter")
         except Exception as e:
             error = Error(ErrorCode.ADAPTER_EXECUTION_FAILED, f"Error during I2C bus cleanup: {e}")
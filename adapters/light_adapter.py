@@ -1,14 +1,22 @@
 import logging
-import requests
 from errors import Error, ErrorCode
-from adapters.base_adapter import BaseAdapter
+from adapters.base_adapter import BaseAdapter, handles
+from http_pool import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, get_http_pool
+from logging_config import log_command
 
 class LightAdapter(BaseAdapter):
+    MAX_CONCURRENCY = 4
+
     def __init__(self, **kwargs):
         self.api_endpoint = kwargs.get('api_endpoint', 'http://localhost:5000/api/lights/living_room')
+        self.timeout = (
+            kwargs.get('connect_timeout', DEFAULT_CONNECT_TIMEOUT),
+            kwargs.get('read_timeout', DEFAULT_READ_TIMEOUT)
+        )
+        self.http = get_http_pool()
         try:
             # Test API endpoint connectivity
-            response = requests.get(self.api_endpoint)
+            response = self.http.get(self.api_endpoint, timeout=self.timeout)
             response.raise_for_status()
             logging.info(f"LightAdapter initialized with API endpoint: {self.api_endpoint}")
         except Exception as e:
@@ -16,27 +24,45 @@ class LightAdapter(BaseAdapter):
             logging.error(error.to_dict())
             raise e  # Let CommandRouter handle the error
 
-    def execute(self, command):
-        action = command.get("action")
-        property = command.get("property")
+    @handles("ACTUATE", "state", values=["ON", "OFF"])
+    def set_state(self, command):
         value = command.get("value")
+        try:
+            # Implement light actuation logic here, e.g., sending a POST request to the API
+            payload = {"state": value}
+            response = self.http.post(self.api_endpoint, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            log_command("Light state set to: %s", value)
+            return {"status": f"Light set to {value}"}
+        except Exception as e:
+            error = Error(ErrorCode.ADAPTER_EXECUTION_FAILED, f"Error actuating light: {e}")
+            logging.error(error.to_dict())
+            return error
 
-        if action == "ACTUATE" and property == "state":
-            try:
-                # Implement light actuation logic here, e.g., sending a POST request to the API
-                payload = {"state": value}
-                response = requests.post(self.api_endpoint, json=payload)
-                response.raise_for_status()
-                logging.info(f"Light state set to: {value}")
-                return {"status": f"Light set to {value}"}
-            except Exception as e:
-                error = Error(ErrorCode.ADAPTER_EXECUTION_FAILED, f"Error actuating light: {e}")
-                logging.error(error.to_dict())
-                return error
-        else:
+    async def execute_async(self, command):
+        if (command.get("action"), command.get("property")) not in self.HANDLERS:
             error = Error(ErrorCode.ADAPTER_EXECUTION_FAILED, "Unsupported action or property for LightAdapter")
             logging.warning(error.to_dict())
             return error
+        value = command.get("value")
+        try:
+            payload = {"state": value}
+            response = await self.http.post_async(self.api_endpoint, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            log_command("Light state set to: %s", value)
+            return {"status": f"Light set to {value}"}
+        except Exception as e:
+            error = Error(ErrorCode.ADAPTER_EXECUTION_FAILED, f"Error actuating light: {e}")
+            logging.error(error.to_dict())
+            return error
+
+    def health_check(self):
+        try:
+            response = self.http.get(self.api_endpoint, timeout=self.timeout)
+            response.raise_for_status()
+            return {"status": "healthy"}
+        except Exception as e:
+            return {"status": "unhealthy", "error": f"Light API unreachable: {e}"}
 
     def cleanup(self):
         try:
@@ -1,60 +1,132 @@
 import logging
 import sys
+import time
+from threading import Lock, Timer
 from errors import Error, ErrorCode
-from adapters.base_adapter import BaseAdapter
+from adapters.base_adapter import BaseAdapter, handles
+from logging_config import log_command
 
 try:
     import RPi.GPIO as GPIO
     GPIO_AVAILABLE = True
 except ImportError:
     GPIO_AVAILABLE = False
-    logging.warning("RPi.GPIO not available. GPIO functionalities will be disabled.")
+    # Simulated pins: drive them with fake_gpio.simulate_input(pin, value).
+    import fake_gpio as GPIO
+    logging.warning("RPi.GPIO not available. Using the simulated GPIO backend.")
 
 class MotionSensorAdapter(BaseAdapter):
     def __init__(self, **kwargs):
         self.pin = kwargs.get('pin', 17)  # Default GPIO pin if not provided
-        if GPIO_AVAILABLE:
-            try:
-                GPIO.setmode(GPIO.BCM)
-                GPIO.setup(self.pin, GPIO.IN)
-                logging.info(f"MotionSensorAdapter initialized on GPIO pin {self.pin}")
-            except Exception as e:
-                error = Error(ErrorCode.ADAPTER_INITIALIZATION_FAILED, f"Failed to initialize MotionSensorAdapter: {e}")
-                logging.error(error.to_dict())
-                raise e  # Let CommandRouter handle the error
-        else:
-            logging.info("GPIO not available. MotionSensorAdapter initialized without GPIO.")
-
-    def execute(self, command):
-        action = command.get("action")
-        property = command.get("property")
-
-        if action == "OBSERVE" and property == "motion_detected":
+        # Edges closer together than this are treated as contact bounce.
+        self.debounce_ms = kwargs.get('debounce_ms', 200)
+        self._emit = None
+        self._last_level = None
+        self._last_edge = None
+        self._recheck = None
+        self._edge_lock = Lock()
+        try:
+            GPIO.setmode(GPIO.BCM)
+            GPIO.setup(self.pin, GPIO.IN)
             if GPIO_AVAILABLE:
-                try:
-                    motion = GPIO.input(self.pin)
-                    logging.info(f"Motion detected: {'Yes' if motion else 'No'}")
-                    return {"motion_detected": bool(motion)}
-                except Exception as e:
-                    error = Error(ErrorCode.ADAPTER_EXECUTION_FAILED, f"Error reading motion sensor: {e}")
-                    logging.error(error.to_dict())
-                    return error
+                logging.info(f"MotionSensorAdapter initialized on GPIO pin {self.pin}")
             else:
-                # Simulate motion detection for development purposes
-                logging.info("GPIO not available. Simulating motion detection.")
-                return {"motion_detected": False}
-        else:
-            error = Error(ErrorCode.ADAPTER_EXECUTION_FAILED, "Unsupported action or property for MotionSensorAdapter")
-            logging.warning(error.to_dict())
+                logging.info(f"GPIO not available. MotionSensorAdapter initialized on simulated pin {self.pin}.")
+        except Exception as e:
+            error = Error(ErrorCode.ADAPTER_INITIALIZATION_FAILED, f"Failed to initialize MotionSensorAdapter: {e}")
+            logging.error(error.to_dict())
+            raise e  # Let CommandRouter handle the error
+
+    def attach_events(self, emit):
+        """Pushes motion_detected events on both edges of the sensor pin."""
+        self._emit = emit
+        self._last_level = GPIO.input(self.pin)
+        try:
+            GPIO.add_event_detect(self.pin, GPIO.BOTH, callback=self._on_edge, bouncetime=self.debounce_ms)
+        except Exception as e:
+            self._emit = None
+            logging.error(f"Could not enable edge detection on GPIO pin {self.pin}: {e}")
+
+    def detach_events(self):
+        if self._emit is None:
+            return
+        with self._edge_lock:
+            self._emit = None
+            if self._recheck is not None:
+                self._recheck.cancel()
+                self._recheck = None
+        try:
+            GPIO.remove_event_detect(self.pin)
+        except Exception as e:
+            logging.warning(f"Could not disable edge detection on GPIO pin {self.pin}: {e}")
+
+    def _on_edge(self, channel):
+        """GPIO interrupt callback. Runs on the GPIO library's thread, so it only reads and emits."""
+        if self._emit is None:
+            return
+        self._update_level(GPIO.input(self.pin))
+
+    def _update_level(self, level, settled=False):
+        """
+        Emits a change of level. Edges inside the debounce window (here or in the
+        library's bouncetime) are dropped, so every emitted edge schedules a
+        re-read of the pin once the window has passed: a change that settled
+        during the bounce is still reported.
+        """
+        with self._edge_lock:
+            emit = self._emit
+            if emit is None or level == self._last_level:
+                return
+            now = time.monotonic()
+            if (not settled and self._last_edge is not None
+                    and (now - self._last_edge) * 1000 < self.debounce_ms):
+                return
+            self._last_level = level
+            self._last_edge = now
+            if self._recheck is None and self.debounce_ms > 0:
+                self._recheck = Timer(self.debounce_ms / 1000.0, self._recheck_level)
+                self._recheck.daemon = True
+                self._recheck.start()
+            emit("motion_detected", bool(level))
+
+    def _recheck_level(self):
+        with self._edge_lock:
+            self._recheck = None
+            if self._emit is None:
+                return
+        try:
+            level = GPIO.input(self.pin)
+        except Exception as e:
+            logging.warning(f"Could not re-read GPIO pin {self.pin} after debounce: {e}")
+            return
+        self._update_level(level, settled=True)
+
+    @handles("OBSERVE", "motion_detected")
+    def read_motion(self, command):
+        try:
+            motion = GPIO.input(self.pin)
+            log_command("Motion detected: %s", "Yes" if motion else "No")
+            return {"motion_detected": bool(motion)}
+        except Exception as e:
+            error = Error(ErrorCode.ADAPTER_EXECUTION_FAILED, f"Error reading motion sensor: {e}")
+            logging.error(error.to_dict())
             return error
 
+    def health_check(self):
+        try:
+            GPIO.input(self.pin)
+            if not GPIO_AVAILABLE:
+                return {"status": "healthy", "simulated": True}
+            return {"status": "healthy"}
+        except Exception as e:
+            return {"status": "unhealthy", "error": f"Error reading GPIO pin {self.pin}: {e}"}
+
     def cleanup(self):
         try:
-            if GPIO_AVAILABLE:
-                GPIO.cleanup()
-                logging.info("GPIO cleanup completed for MotionSensorAdapter")
-            else:
-                logging.info("No GPIO cleanup needed for MotionSensorAdapter")
+            self.detach_events()
+            # Only this adapter's pin: a replacement adapter may already own others.
+            GPIO.cleanup(self.pin)
+            logging.info("GPIO cleanup completed for MotionSensorAdapter")
         except Exception as e:
             error = Error(ErrorCode.ADAPTER_EXECUTION_FAILED, f"Error during GPIO cleanup: {e}")
             logging.error(error.to_dict())
@@ -0,0 +1,99 @@
+import logging
+import fake_gpio
+from errors import Error, ErrorCode
+from adapters.base_adapter import BaseAdapter, handles
+from adapters.dummy_adapter import DummyAdapter
+from i2c_bus import close_bus, open_bus
+from logging_config import log_command
+from simulation import FakeHTTPPool, FakeSMBus, LatencyProfile
+
+class SimulatedAdapter(DummyAdapter):
+    """
+    A device for load testing. Commands go through a simulated backend ("smbus",
+    "gpio", "http", or "none" to just sleep) whose operations take a configurable
+    latency, so the benchmark suite can drive the router and queue without hardware:
+
+        "sim_1": {"module": "simulated_adapter",
+                  "params": {"backend": "smbus", "latency": {"distribution": "lognormal", "median": 0.002},
+                             "error_rate": 0.01, "seed": 1}}
+    """
+    execute = BaseAdapter.execute
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.backend = kwargs.get('backend', 'none')
+        self.error_rate = kwargs.get('error_rate', 0.0)
+        self.latency = LatencyProfile.from_dict(kwargs.get('latency'), seed=kwargs.get('seed'))
+        self.state = "OFF"
+        self.bus = None
+        self.http = None
+        if self.backend == "smbus":
+            self.address = kwargs.get('address', 0x40)
+            self.bus = open_bus(kwargs.get('bus', 90), lambda number: FakeSMBus(number, self.latency))
+        elif self.backend == "gpio":
+            self.pin = kwargs.get('pin', 27)
+            fake_gpio.setmode(fake_gpio.BCM)
+            fake_gpio.setup(self.pin, fake_gpio.IN)
+        elif self.backend == "http":
+            self.api_endpoint = kwargs.get('api_endpoint', 'http://simulated/api/device')
+            self.http = FakeHTTPPool(self.latency)
+        elif self.backend != "none":
+            raise ValueError(f"Unknown simulated backend: {self.backend}")
+
+    def _transfer(self, value=None):
+        """Performs one backend operation and returns the raw reading."""
+        if self.backend == "smbus":
+            if value is not None:
+                self.bus.write_byte(self.address, 1 if value == "ON" else 0)
+                return value
+            data = self.bus.read_i2c_block_data(self.address, 0x00, 2)
+            return (data[0] << 8) | data[1]
+        if self.backend == "gpio":
+            self.latency.wait()
+            if value is not None:
+                fake_gpio.output(self.pin, value == "ON")
+                return value
+            return fake_gpio.input(self.pin)
+        if self.backend == "http":
+            if value is not None:
+                self.http.post(self.api_endpoint, json={"state": value}).raise_for_status()
+                return value
+            return self.http.get(self.api_endpoint).json()
+        self.latency.wait()
+        return value if value is not None else 0
+
+    def _failure(self):
+        if self.error_rate and self.latency.chance(self.error_rate):
+            error = Error(ErrorCode.ADAPTER_EXECUTION_FAILED, f"Simulated {self.backend} failure")
+            logging.warning(error.to_dict())
+            return error
+        return None
+
+    @handles("OBSERVE", "value")
+    def read_value(self, command):
+        error = self._failure()
+        if error is not None:
+            return error
+        value = self._transfer()
+        log_command("Simulated %s read: %s", self.backend, value)
+        return {"value": value}
+
+    @handles("ACTUATE", "state", values=["ON", "OFF"])
+    def set_state(self, command):
+        error = self._failure()
+        if error is not None:
+            return error
+        self.state = self._transfer(command.get("value"))
+        log_command("Simulated %s state set to: %s", self.backend, self.state)
+        return {"status": f"State set to {self.state}"}
+
+    def health_check(self):
+        return {"status": "healthy", "simulated": True}
+
+    def cleanup(self):
+        if self.bus is not None:
+            close_bus(self.bus)
+            self.bus = None
+        if self.backend == "gpio":
+            fake_gpio.cleanup(self.pin)
+        super().cleanup()
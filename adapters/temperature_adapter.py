@@ -1,8 +1,11 @@
 import logging
 from errors import Error, ErrorCode
-from adapters.base_adapter import BaseAdapter
+from adapters.base_adapter import BaseAdapter, handles
+from logging_config import log_command
 
 class TemperatureAdapter(BaseAdapter):
+    MAX_CONCURRENCY = 1
+
     def __init__(self, **kwargs):
         self.port = kwargs.get('port', '/dev/ttyUSB0')  # Default port if not provided
         self.baudrate = kwargs.get('baudrate', 9600)    # Default baudrate if not provided
@@ -15,25 +18,26 @@ class TemperatureAdapter(BaseAdapter):
             logging.error(error.to_dict())
             raise e  # Let CommandRouter handle the error
 
-    def execute(self, command):
-        action = command.get("action")
-        property = command.get("property")
-
-        if action == "OBSERVE" and property == "current_temperature":
-            try:
-                # Implement temperature reading logic here
-                temperature = 25.0  # Placeholder value
-                logging.info(f"Read temperature: {temperature}C")
-                return {"current_temperature": temperature}
-            except Exception as e:
-                error = Error(ErrorCode.ADAPTER_EXECUTION_FAILED, f"Error reading temperature: {e}")
-                logging.error(error.to_dict())
-                return error
-        else:
-            error = Error(ErrorCode.ADAPTER_EXECUTION_FAILED, "Unsupported action or property for TemperatureAdapter")
-            logging.warning(error.to_dict())
+    @handles("OBSERVE", "current_temperature")
+    def read_temperature(self, command):
+        try:
+            # Implement temperature reading logic here
+            temperature = 25.0  # Placeholder value
+            log_command("Read temperature: %s°C", temperature)
+            return {"current_temperature": temperature}
+        except Exception as e:
+            error = Error(ErrorCode.ADAPTER_EXECUTION_FAILED, f"Error reading temperature: {e}")
+            logging.error(error.to_dict())
             return error
 
+    def health_check(self):
+        try:
+            # Implement a device probe here once the serial connection exists, e.g.,
+            # if not self.serial.is_open: ...
+            return {"status": "healthy"}
+        except Exception as e:
+            return {"status": "unhealthy", "error": f"Error probing temperature sensor on {self.port}: {e}"}
+
     def cleanup(self):
         try:
             # Implement cleanup logic here, e.g., closing serial connection
@@ -0,0 +1,124 @@
+"""
+Statistics for AGGREGATE queries.
+
+An AGGREGATE command names the statistics it wants in its "value" (default:
+count, mean, min and max). Supported statistics are count, sum, mean, min,
+max, std (population standard deviation) and percentiles written as pNN, e.g.
+p50, p95 or p99.9, interpolated linearly between the closest samples.
+compute_stats() uses NumPy when it is installed and falls back to pure Python
+otherwise; both give the same results.
+"""
+import math
+import re
+from itertools import chain
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+DEFAULT_STATS = ("count", "mean", "min", "max")
+SIMPLE_STATS = frozenset(("count", "sum", "mean", "min", "max", "std"))
+_PERCENTILE = re.compile(r"p(100|\d{1,2}(\.\d+)?)")
+
+def parse_stats(spec):
+    """
+    Returns the statistic names requested by an AGGREGATE command's "value" (a
+    name or a list of names; None for the defaults). Raises ValueError for
+    anything else.
+    """
+    if spec is None:
+        return list(DEFAULT_STATS)
+    if isinstance(spec, str):
+        spec = [spec]
+    if not isinstance(spec, (list, tuple)) or not spec:
+        raise ValueError("value must be a statistic name or a non-empty list of them")
+    for name in spec:
+        if not isinstance(name, str) or (name not in SIMPLE_STATS and not _PERCENTILE.fullmatch(name)):
+            raise ValueError(f"Unknown statistic: {name!r}")
+    return list(dict.fromkeys(spec))
+
+def parse_aggregate(command):
+    """
+    Checks an AGGREGATE command's property, window and statistics and returns
+    the statistic names. Raises ValueError describing the first problem.
+    """
+    window = command.get("window")
+    if not isinstance(command.get("property"), str):
+        raise ValueError("AGGREGATE requires a property")
+    if window is not None and (type(window) not in (int, float) or window <= 0):
+        raise ValueError("window must be a positive number of seconds")
+    return parse_stats(command.get("value"))
+
+def compute_stats(series, stats):
+    """
+    Computes stats over the samples of every series (one sequence of numbers per
+    target) pooled together. Returns {name: value}; every statistic but count
+    is None when there are no samples.
+    """
+    if numpy is not None:
+        return _compute_numpy(series, stats)
+    return _compute_python(series, stats)
+
+def _compute_numpy(series, stats):
+    arrays = [numpy.asarray(values, dtype=numpy.float64) for values in series]
+    values = numpy.concatenate(arrays) if arrays else numpy.empty(0)
+    if not values.size:
+        return _empty(stats)
+    percentiles = [name for name in stats if name not in SIMPLE_STATS]
+    computed = {}
+    if percentiles:
+        points = numpy.percentile(values, [float(name[1:]) for name in percentiles])
+        computed.update(zip(percentiles, points.tolist()))
+    for name in stats:
+        if name == "count":
+            computed[name] = int(values.size)
+        elif name == "sum":
+            computed[name] = float(values.sum())
+        elif name == "mean":
+            computed[name] = float(values.mean())
+        elif name == "min":
+            computed[name] = float(values.min())
+        elif name == "max":
+            computed[name] = float(values.max())
+        elif name == "std":
+            computed[name] = float(values.std())
+    return {name: computed[name] for name in stats}
+
+def _compute_python(series, stats):
+    values = [float(value) for value in chain.from_iterable(series)]
+    if not values:
+        return _empty(stats)
+    count = len(values)
+    total = math.fsum(values)
+    ordered = None
+    computed = {}
+    for name in stats:
+        if name == "count":
+            computed[name] = count
+        elif name == "sum":
+            computed[name] = total
+        elif name == "mean":
+            computed[name] = total / count
+        elif name == "min":
+            computed[name] = min(values)
+        elif name == "max":
+            computed[name] = max(values)
+        elif name == "std":
+            mean = total / count
+            computed[name] = math.sqrt(math.fsum((value - mean) ** 2 for value in values) / count)
+        else:
+            if ordered is None:
+                ordered = sorted(values)
+            computed[name] = _percentile(ordered, float(name[1:]))
+    return computed
+
+def _percentile(ordered, q):
+    """Linear interpolation between closest ranks, as numpy.percentile does by default."""
+    rank = (len(ordered) - 1) * q / 100.0
+    low = math.floor(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+def _empty(stats):
+    return {name: 0 if name == "count" else None for name in stats}
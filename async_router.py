@@ -0,0 +1,270 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from codec import DecodeError
+from core import CommandRouter
+from errors import Error, ErrorCode
+from logging_config import log_command
+
+class AsyncCommandRouter(CommandRouter):
+    def __init__(self, adapter_config_path, max_blocking_workers=32, **kwargs):
+        """
+        Initializes the asyncio-native command router.
+        :param adapter_config_path: Path to the adapters configuration file.
+        :param max_blocking_workers: Size of the thread pool used for adapters
+                                     that only provide a synchronous execute.
+        Other keyword arguments are passed to CommandRouter.
+        """
+        super().__init__(adapter_config_path, **kwargs)
+        self.max_blocking_workers = max_blocking_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_blocking_workers,
+            thread_name_prefix="AdapterExecutor"
+        )
+
+    async def _call_adapter_async(self, adapter, command, handler=None):
+        """
+        Awaits the adapter, using the executor for synchronous adapters.
+        :param handler: The command's handler from _prepare_command (default: adapter.execute).
+        """
+        execute_async = getattr(adapter, "execute_async", None)
+        if execute_async is not None:
+            return await execute_async(command)
+        if handler is None:
+            handler = adapter.execute
+        if asyncio.iscoroutinefunction(handler):
+            return await handler(command)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, handler, command)
+
+    async def _execute_adapter_async(self, target, adapter, command, handler=None):
+        """Awaitable counterpart of CommandRouter._execute_adapter."""
+        if not self._acquire(adapter):
+            return self._removed_error(target)
+        try:
+            if command.get("action") == "OBSERVE":
+                return await self._observe_async(target, adapter, command, handler)
+            result = await self._call_adapter_async(adapter, command, handler)
+            self.observe_cache.invalidate(target)
+            return result
+        finally:
+            self._release(adapter)
+
+    async def route_command_async(self, command):
+        """
+        Routes the command to the appropriate adapter without blocking the event loop.
+        Accepts the same command forms as CommandRouter.route_command.
+        """
+        try:
+            start = time.perf_counter()
+            command = self.decode_command(command)
+            self.stage_seconds.labels("parse", *self._metric_labels(command)).observe(time.perf_counter() - start)
+        except DecodeError:
+            error = Error(ErrorCode.INVALID_COMMAND, "Invalid JSON command")
+            logging.error(error.to_dict())
+            return self._record_response(error.to_dict())
+        return await self.route_parsed_async(command)
+
+    async def route_parsed_async(self, command):
+        """Routes an already parsed command (a dict or Command, e.g. one read by server.py)."""
+        try:
+            if self._is_fan_out(command):
+                start = time.perf_counter()
+                response = await self._route_fan_out_async(command)
+                self.stage_seconds.labels("execute", *self._metric_labels(command)).observe(time.perf_counter() - start)
+                return self._record_response(response)
+            prepared = self._prepare_command(command)
+            if isinstance(prepared, dict):
+                return self._record_response(prepared)
+            command, target, adapter, handler, chain = prepared
+
+            log_command("Routing command to adapter '%s': %s", target, command)
+            start = time.perf_counter()
+            result = await self._execute_adapter_async(target, adapter, command, handler)
+            self.stage_seconds.labels("execute", *self._metric_labels(command)).observe(time.perf_counter() - start)
+            return self._record_response(self._handle_result(result, command=command, chain=chain))
+
+        except Exception as e:
+            error = Error(ErrorCode.INTERNAL_ERROR, f"An unexpected error occurred: {e}")
+            logging.exception(error.to_dict())
+            return self._record_response(error.to_dict())
+
+    async def _route_member_async(self, command, member, deadline=None):
+        """Awaitable counterpart of CommandRouter._route_member."""
+        try:
+            prepared = self._prepare_command(self._member_command(command, member))
+            if isinstance(prepared, dict):
+                return self._record_response(prepared)
+            member_command, target, adapter, handler, chain = prepared
+            lanes = self.lanes
+            if lanes is not None and not await self._enter_lane_async(lanes, target, deadline):
+                return None
+            try:
+                result = await self._execute_adapter_async(target, adapter, member_command, handler)
+            finally:
+                if lanes is not None:
+                    lanes.leave(target)
+            return self._record_response(
+                self._handle_result(result, log_response=False, command=member_command, chain=chain)
+            )
+        except Exception as e:
+            error = Error(ErrorCode.INTERNAL_ERROR, f"An unexpected error occurred on '{member}': {e}")
+            logging.exception(error.to_dict())
+            return self._record_response(error.to_dict())
+
+    async def _enter_lane_async(self, lanes, target, deadline):
+        """
+        Takes a slot in target's execution lane, waiting until deadline at most.
+        A full lane is waited on in the executor, so the event loop keeps running.
+        """
+        if lanes.try_enter(target):
+            return True
+        timeout = max(0.0, deadline - time.monotonic()) if deadline is not None else None
+        entering = asyncio.get_running_loop().run_in_executor(self._executor, lanes.enter, target, timeout)
+        try:
+            return await asyncio.shield(entering)
+        except asyncio.CancelledError:
+            def give_back(future):
+                # The slot was taken after the caller stopped waiting for it
+                if not future.cancelled() and future.exception() is None and future.result():
+                    lanes.leave(target)
+            entering.add_done_callback(give_back)
+            raise
+
+    async def _route_group_async(self, group, command):
+        """
+        Awaitable counterpart of CommandRouter._route_group. Members with
+        execute_async are awaited on the event loop; the others run in the executor.
+        """
+        prepared = self._prepare_group_command(command)
+        if isinstance(prepared, dict):
+            return prepared
+        command, chain = prepared
+        log_command("Fanning out to %d members of group '%s': %s", len(group.members), group.name, command)
+        return self._group_response(group, command, chain, await self._fan_out_async(group, command))
+
+    async def _fan_out_async(self, group, command):
+        """
+        Awaitable counterpart of CommandRouter._fan_out. Members with
+        execute_async are awaited on the event loop; the others run in the executor.
+        """
+        slots = asyncio.Semaphore(group.max_parallel)
+        expired = False
+        deadline = time.monotonic() + group.timeout
+
+        async def route(member):
+            async with slots:
+                if expired:
+                    return None
+                return await self._route_member_async(command, member, deadline)
+
+        tasks = [asyncio.ensure_future(route(member)) for member in group.members]
+        if tasks:
+            # Members still running at the timeout finish in the background; their responses are dropped.
+            _, pending = await asyncio.wait(tasks, timeout=group.timeout)
+            expired = bool(pending)
+        return [task.result() if task.done() else None for task in tasks]
+
+    async def _route_aggregate_async(self, command):
+        """Awaitable counterpart of CommandRouter._route_aggregate."""
+        prepared = self._prepare_aggregate(command)
+        if isinstance(prepared, dict):
+            return prepared
+        command, chain, group, stats = prepared
+        property, window = command.get("property"), command.get("window")
+        if window is None:
+            readings = await self._fan_out_async(group, {"action": "OBSERVE", "property": property})
+        else:
+            readings = self._sampled_windows(group, property, window)
+        return self._aggregate_response(group, command, chain, stats, readings)
+
+    async def _route_fan_out_async(self, command):
+        if command.get("action") == "AGGREGATE":
+            return await self._route_aggregate_async(command)
+        return await self._route_group_async(self._group_for(command), command)
+
+    async def _observe_async(self, target, adapter, command, handler):
+        """Awaitable counterpart of CommandRouter._observe."""
+        result = self._sampled_result(target, command)
+        if result is not None:
+            return result
+        return await self.observe_cache.get_or_load_async(
+            target, command.get("property"), lambda: self._call_adapter_async(adapter, command, handler)
+        )
+
+    async def _observe_batched(self, target, adapter, command, handler):
+        try:
+            return await self._observe_async(target, adapter, command, handler)
+        except Exception as e:
+            return self._batch_error(target, e)
+
+    async def _execute_batch_async(self, target, adapter, commands, handlers):
+        """
+        Awaitable counterpart of CommandRouter._execute_batch. The OBSERVEs of a
+        run are awaited concurrently; other commands run in order, as with
+        execute_batch, so an ON followed by an OFF leaves the target OFF.
+        """
+        if not self._acquire(adapter):
+            return [self._removed_error(target)] * len(commands)
+        try:
+            results = []
+            for observe, run, run_handlers in self._batch_runs(commands, handlers):
+                if observe:
+                    results.extend(await asyncio.gather(*(
+                        self._observe_batched(target, adapter, command, handler)
+                        for command, handler in zip(run, run_handlers)
+                    )))
+                    continue
+                try:
+                    if adapter.execute_async is not None:
+                        run_results = [await adapter.execute_async(command) for command in run]
+                    else:
+                        loop = asyncio.get_running_loop()
+                        run_results = await loop.run_in_executor(self._executor, adapter.execute_batch, run)
+                except Exception as e:
+                    run_results = [self._batch_error(target, e)] * len(run)
+                if len(run_results) != len(run):
+                    return run_results
+                results.extend(run_results)
+                self.observe_cache.invalidate(target)
+            return results
+        finally:
+            self._release(adapter)
+
+    async def route_batch_async(self, commands):
+        """
+        Routes a batch of commands, running each target group concurrently.
+        AGGREGATE queries and commands to group targets run in input order, as in
+        CommandRouter.route_batch.
+        Returns a list of responses in the same order as the input commands.
+        """
+        try:
+            commands = self._parse_batch(commands)
+            if isinstance(commands, dict):
+                return self._record_response(commands)
+            responses, steps = self._group_batch(commands)
+            for step in steps:
+                if isinstance(step, tuple):
+                    index, command = step
+                    responses[index] = await self._route_fan_out_async(command)
+                    continue
+                targets = list(step)
+                results = await asyncio.gather(*(
+                    self._execute_batch_async(target, step[target][0], step[target][2], step[target][4])
+                    for target in targets
+                ))
+                for target, group_results in zip(targets, results):
+                    self._collect_batch_results(target, responses, step[target], group_results)
+            for response in responses:
+                self._record_response(response)
+            return responses
+
+        except Exception as e:
+            error = Error(ErrorCode.INTERNAL_ERROR, f"An unexpected error occurred: {e}")
+            logging.exception(error.to_dict())
+            return self._record_response(error.to_dict())
+
+    def shutdown(self, wait=True):
+        """Shuts down the executor used for synchronous adapters."""
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,74 @@
+"""
+Benchmark for the parse-to-response path.
+
+Routes the same OBSERVE command through CommandRouter.route_command given in
+each accepted form (a str decoded with the standard library, bytes decoded with
+every installed codec, a parsed dict and a Command) and encodes each response
+with the same codec, as the network server does.
+
+Run from the repository root:
+    python -m benchmarks.bench_codec [--commands N]
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+from codec import StdlibJsonCodec, available_codecs, get_codec
+from commands import Command
+from core import CommandRouter
+from logging_config import configure_logging
+
+CONFIG = {
+    "temperature_sensor_1": {"module": "temperature_adapter", "params": {}}
+}
+
+COMMAND = {
+    "action": "OBSERVE",
+    "target": "temperature_sensor_1",
+    "property": "current_temperature"
+}
+
+def scenarios():
+    """Yields (name, codec, command) for every input form available here."""
+    stdlib = StdlibJsonCodec()
+    yield "str, stdlib json", stdlib, json.dumps(COMMAND)
+    for name, library in sorted(available_codecs().items()):
+        codec = get_codec(name)
+        yield f"bytes, {library}", codec, codec.encode(COMMAND)
+    yield "dict (pre-parsed)", stdlib, dict(COMMAND)
+    yield "Command (pre-parsed)", stdlib, Command(**COMMAND)
+
+def measure(router, codec, command, count):
+    """Returns commands/sec for routing command and encoding each response."""
+    start = time.perf_counter()
+    for _ in range(count):
+        codec.encode(router.route_command(command))
+    elapsed = time.perf_counter() - start
+    return count / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--commands", type=int, default=50000)
+    args = parser.parse_args()
+
+    configure_logging(level=logging.WARNING, log_file=None, console=False)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config_path = os.path.join(tmpdir, "adapters_config.json")
+        with open(config_path, "w") as f:
+            json.dump(CONFIG, f)
+        router = CommandRouter(config_path)
+
+        baseline = None
+        for name, codec, command in scenarios():
+            router.codec = codec
+            response = router.route_command(command)
+            assert "error" not in response, response
+            rate = measure(router, codec, command, args.commands)
+            baseline = baseline or rate
+            print(f"{name:28s} {rate:12,.0f} commands/sec  {rate / baseline:5.2f}x")
+        router.cleanup_all()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark for the command journal's group commit.
+
+Appends ACTUATE commands to a CommandJournal from several producer threads,
+each waiting for its command to be fsynced, and reports commands/sec and the
+mean number of commands made durable per fsync. Then runs the same producers
+through CommandQueue.enqueue_command with journaling, so the rate includes
+routing by the queue's workers.
+
+Run from the repository root:
+    python -m benchmarks.bench_journal [--seconds S] [--producers 1,8,64] [--dir PATH]
+
+--dir should be on the disk the journal will use in production; the default
+temporary directory may be on tmpfs, where fsync is almost free.
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+from threading import Event, Thread
+from command_queue import CommandQueue
+from core import CommandRouter
+from journal import CommandJournal
+from logging_config import configure_logging
+from metrics import MetricsRegistry
+
+CONFIG = {
+    "temperature_sensor_1": {"module": "temperature_adapter", "params": {}}
+}
+
+COMMAND = {
+    "action": "ACTUATE",
+    "target": "living_room_light",
+    "property": "state",
+    "value": "ON"
+}
+
+OBSERVE = {
+    "action": "OBSERVE",
+    "target": "temperature_sensor_1",
+    "property": "current_temperature"
+}
+
+def run_producers(producers, seconds, produce):
+    """Calls produce() from each producer thread until time is up. Returns the total call count."""
+    stop = Event()
+    counts = [0] * producers
+
+    def producer(index):
+        while not stop.is_set():
+            produce()
+            counts[index] += 1
+
+    threads = [Thread(target=producer, args=(i,)) for i in range(producers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return sum(counts)
+
+def bench_journal(directory, producers, seconds, fsync):
+    metrics = MetricsRegistry()
+    journal = CommandJournal(directory, fsync=fsync, metrics=metrics)
+    journal.open()
+
+    def produce():
+        journal.complete(journal.append(COMMAND))
+
+    total = run_producers(producers, seconds, produce)
+    journal.close()
+    batches = metrics.snapshot()["prism_journal_batch_records"]
+    commits = sum(sample["value"]["count"] for sample in batches["samples"])
+    return total / seconds, total / max(commits, 1)
+
+def bench_queue(config_path, directory, producers, seconds):
+    router = CommandRouter(config_path, metrics=MetricsRegistry())
+    queue = CommandQueue(router, worker_count=4, journal=directory, journal_actions=("OBSERVE",))
+    queue.handle_response = lambda response: None
+    queue.start()
+    total = run_producers(producers, seconds, lambda: queue.enqueue_command(OBSERVE))
+    queue.stop()
+    router.cleanup_all()
+    return total / seconds
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--producers", default="1,8,64")
+    parser.add_argument("--dir", default=None, help="Directory for the journal segments.")
+    args = parser.parse_args()
+    producer_counts = [int(count) for count in args.producers.split(",")]
+
+    configure_logging(level=logging.WARNING, log_file=None, console=False)
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmpdir:
+        config_path = os.path.join(tmpdir, "adapters_config.json")
+        with open(config_path, "w") as f:
+            json.dump(CONFIG, f)
+        for producers in producer_counts:
+            for fsync in (True, False):
+                directory = tempfile.mkdtemp(dir=tmpdir)
+                rate, per_commit = bench_journal(directory, producers, args.seconds, fsync)
+                label = f"journal, {producers} producers, {'fsync' if fsync else 'no fsync'}"
+                print(f"{label:40s} {rate:12,.0f} commands/sec  {per_commit:7.1f} commands/commit")
+        for producers in producer_counts:
+            rate = bench_queue(config_path, tempfile.mkdtemp(dir=tmpdir), producers, args.seconds)
+            label = f"CommandQueue, {producers} producers"
+            print(f"{label:40s} {rate:12,.0f} commands/sec")
+
+if __name__ == "__main__":
+    main()
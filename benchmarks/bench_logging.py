@@ -0,0 +1,69 @@
+"""
+Benchmark for per-command logging overhead.
+
+Routes the same OBSERVE command through CommandRouter.route_command under
+several logging configurations and reports the time the calling thread
+spends per command.
+
+Run from the repository root:
+    python -m benchmarks.bench_logging [--commands N]
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+from core import CommandRouter
+from logging_config import configure_logging, shutdown_logging
+from middleware.logging_middleware import LoggingMiddleware
+
+CONFIG = {
+    "temperature_sensor_1": {"module": "temperature_adapter", "params": {}}
+}
+
+COMMAND = json.dumps({
+    "action": "OBSERVE",
+    "target": "temperature_sensor_1",
+    "property": "current_temperature"
+})
+
+def scenarios(tmpdir):
+    log_file = os.path.join(tmpdir, "prism.log")
+    jsonl_path = os.path.join(tmpdir, "prism.jsonl")
+    return [
+        ("logging disabled (WARNING)", dict(level=logging.WARNING, log_file=log_file)),
+        ("sync file handler", dict(log_file=log_file)),
+        ("async queue handler", dict(async_mode=True, log_file=log_file)),
+        ("async, no caller info", dict(async_mode=True, log_file=log_file, caller_info=False)),
+        ("async + 100/s rate limit", dict(async_mode=True, log_file=log_file, max_per_second=100)),
+        ("async + JSON-lines sink", dict(async_mode=True, log_file=None, jsonl_path=jsonl_path)),
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--commands", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config_path = os.path.join(tmpdir, "adapters_config.json")
+        with open(config_path, "w") as f:
+            json.dump(CONFIG, f)
+
+        configure_logging(level=logging.WARNING, log_file=None, console=False)
+        router = CommandRouter(config_path)
+        router.add_middleware(LoggingMiddleware())
+
+        for name, options in scenarios(tmpdir):
+            configure_logging(console=False, **options)
+            start = time.perf_counter()
+            for _ in range(args.commands):
+                router.route_command(COMMAND)
+            elapsed = time.perf_counter() - start
+            shutdown_logging()
+            print(f"{name:30s} {elapsed / args.commands * 1e6:8.1f} us/command")
+
+        configure_logging(log_file=None, console=False)
+
+if __name__ == "__main__":
+    main()
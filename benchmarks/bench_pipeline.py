@@ -0,0 +1,329 @@
+"""
+Load generator and benchmark for the command pipeline.
+
+Builds a router over simulated adapters (adapters.simulated_adapter, on fake
+SMBus, GPIO and HTTP backends), then drives it with a seeded, reproducible
+command mix:
+
+  router  Each of --concurrency threads calls CommandRouter.route_command in a loop.
+  queue   Each thread calls CommandQueue.enqueue_command and waits for the response
+          (closed loop). With --rate, one thread enqueues at a fixed rate instead
+          (open loop) and latency is measured from each command's scheduled send
+          time, so a stalled queue shows up in the percentiles.
+
+Reports throughput, p50/p90/p99/p999/max latency, errors by code and memory
+(peak RSS, and the peak traced Python heap with --tracemalloc), and can save the
+results as JSON and compare them with a previous run.
+
+Run from the repository root:
+    python -m benchmarks.bench_pipeline --profile mixed --mode both --output results.json
+    python -m benchmarks.bench_pipeline --profile mixed --compare results.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from threading import Event, Lock, Thread
+from command_queue import CommandQueue
+from commands import Command
+from core import CommandRouter
+from logging_config import configure_logging
+from metrics import MetricsRegistry
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Simulated devices per profile: [(backend, count, latency, error_rate)].
+PROFILES = {
+    "fast": [("none", 8, {"distribution": "fixed", "seconds": 0.0}, 0.0)],
+    "i2c": [("smbus", 4, {"distribution": "uniform", "low": 0.0005, "high": 0.0015}, 0.0)],
+    "http": [("http", 8, {"distribution": "lognormal", "median": 0.003, "sigma": 0.6}, 0.001)],
+    "mixed": [
+        ("none", 4, {"distribution": "fixed", "seconds": 0.0}, 0.0),
+        ("gpio", 4, {"distribution": "fixed", "seconds": 0.0001}, 0.0),
+        ("smbus", 4, {"distribution": "uniform", "low": 0.0005, "high": 0.0015}, 0.0),
+        ("http", 4, {"distribution": "lognormal", "median": 0.003, "sigma": 0.6,
+                     "tail_probability": 0.01, "tail_seconds": 0.05}, 0.001),
+    ],
+}
+
+def build_config(profile, seed):
+    """Returns an adapters_config dict with one simulated target per device in the profile."""
+    config = {}
+    for backend, count, latency, error_rate in PROFILES[profile]:
+        for i in range(count):
+            params = {"backend": backend, "latency": latency, "error_rate": error_rate, "seed": seed * 1000 + len(config)}
+            if backend == "smbus":
+                # Two devices per simulated bus, so sensors contend for the bus lock.
+                params.update(bus=90 + i // 2, address=0x40 + i)
+            elif backend == "gpio":
+                params.update(pin=20 + i)
+            config[f"sim_{backend}_{i}"] = {"module": "simulated_adapter", "params": params}
+    return config
+
+def parse_mix(text):
+    """Parses "observe=0.8,actuate=0.2" into [(action, weight)]."""
+    mix = []
+    for part in text.split(","):
+        action, _, weight = part.partition("=")
+        mix.append((action.strip().upper(), float(weight or 1)))
+    return mix
+
+def generate_commands(targets, mix, count, seed, form):
+    """Returns count commands drawn from the mix over the targets, the same for every seed."""
+    rng = random.Random(seed)
+    actions = [action for action, _ in mix]
+    weights = [weight for _, weight in mix]
+    commands = []
+    for _ in range(count):
+        action = rng.choices(actions, weights)[0]
+        target = rng.choice(targets)
+        if action == "ACTUATE":
+            command = Command("ACTUATE", target, "state", rng.choice(("ON", "OFF")))
+        else:
+            command = Command(action, target, "value")
+        if form == "json":
+            command = json.dumps(command.to_dict())
+        elif form == "dict":
+            command = command.to_dict()
+        commands.append(command)
+    return commands
+
+class Recorder:
+    """Collects per-command latencies and error codes from many threads."""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = {}
+        self._lock = Lock()
+
+    def record(self, latency, response):
+        with self._lock:
+            self.latencies.append(latency)
+            if isinstance(response, dict) and "error" in response:
+                code = str(response["error"]["code"])
+                self.errors[code] = self.errors.get(code, 0) + 1
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def summarize(name, mode, recorder, elapsed, memory):
+    latencies = sorted(recorder.latencies)
+    count = len(latencies)
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 4)
+
+    return {
+        "name": name,
+        "mode": mode,
+        "commands": count,
+        "seconds": round(elapsed, 4),
+        "throughput": round(count / elapsed, 1) if elapsed else None,
+        "latency_ms": {
+            "mean": ms(sum(latencies) / count) if count else None,
+            "p50": ms(percentile(latencies, 0.50)),
+            "p90": ms(percentile(latencies, 0.90)),
+            "p99": ms(percentile(latencies, 0.99)),
+            "p999": ms(percentile(latencies, 0.999)),
+            "max": ms(latencies[-1]) if count else None,
+        },
+        "errors": recorder.errors,
+        "memory": memory,
+    }
+
+def run_threads(concurrency, commands, work):
+    """Splits commands across threads calling work(command). Returns the elapsed seconds."""
+    shards = [commands[i::concurrency] for i in range(concurrency)]
+    start_gate = Event()
+
+    def run(shard):
+        start_gate.wait()
+        for command in shard:
+            work(command)
+
+    threads = [Thread(target=run, args=(shard,)) for shard in shards]
+    for thread in threads:
+        thread.start()
+    start = time.perf_counter()
+    start_gate.set()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+def drive_router(router, commands, concurrency, recorder):
+    def work(command):
+        start = time.perf_counter()
+        response = router.route_command(command)
+        recorder.record(time.perf_counter() - start, response)
+
+    return run_threads(concurrency, commands, work)
+
+def drive_queue(queue, commands, concurrency, recorder, rate=None):
+    if rate is None:
+        def work(command):
+            start = time.perf_counter()
+            response = queue.enqueue_command(command).result()
+            recorder.record(time.perf_counter() - start, response)
+
+        return run_threads(concurrency, commands, work)
+
+    # Open loop: latency counts from when the command was due, not when it was sent.
+    done = Event()
+    remaining = [len(commands)]
+    remaining_lock = Lock()
+
+    def finished(scheduled, response):
+        recorder.record(time.perf_counter() - scheduled, response)
+        with remaining_lock:
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                done.set()
+
+    start = time.perf_counter()
+    for i, command in enumerate(commands):
+        scheduled = start + i / rate
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        queue.enqueue_command(command, callback=lambda response, scheduled=scheduled: finished(scheduled, response))
+    done.wait()
+    return time.perf_counter() - start
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+def run_scenario(args, config_path, mode, commands):
+    router = CommandRouter(config_path, metrics=MetricsRegistry())
+    queue = None
+    if mode == "queue":
+        queue = CommandQueue(router, worker_count=args.workers, scheduler=args.scheduler,
+                             max_depth=args.max_depth)
+        queue.handle_response = lambda response: None  # Responses are read from the futures.
+        queue.start()
+    # Warm up caches, dispatch and thread pools with a slice of the same workload.
+    warmup = commands[:args.warmup]
+    if queue is None:
+        drive_router(router, warmup, args.concurrency, Recorder())
+    else:
+        drive_queue(queue, warmup, args.concurrency, Recorder())
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    recorder = Recorder()
+    if queue is None:
+        elapsed = drive_router(router, commands, args.concurrency, recorder)
+    else:
+        elapsed = drive_queue(queue, commands, args.concurrency, recorder, args.rate)
+    memory = {"peak_rss_kb": peak_rss_kb()}
+    if args.tracemalloc:
+        memory["traced_peak_kb"] = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+
+    if queue is not None:
+        queue.stop()
+    router.cleanup_all()
+    open_loop = queue is not None and args.rate
+    name = f"{args.profile}/{mode}/" + (f"r{args.rate:g}" if open_loop else f"c{args.concurrency}")
+    return summarize(name, mode, recorder, elapsed, memory)
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def compare(results, baseline, threshold):
+    """Prints throughput and p99 changes against a baseline run. Returns True if any regressed."""
+    previous = {result["name"]: result for result in baseline["results"]}
+    regressed = False
+    for result in results:
+        old = previous.get(result["name"])
+        if old is None:
+            print(f"{result['name']:32s} no baseline")
+            continue
+        throughput = result["throughput"] / old["throughput"] - 1
+        p99 = result["latency_ms"]["p99"] / old["latency_ms"]["p99"] - 1 if old["latency_ms"]["p99"] else 0.0
+        worse = throughput < -threshold or p99 > threshold
+        regressed |= worse
+        print(f"{result['name']:32s} throughput {throughput:+7.1%}  p99 {p99:+7.1%}" + ("  REGRESSED" if worse else ""))
+    return regressed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="mixed")
+    parser.add_argument("--mode", choices=("router", "queue", "both"), default="both")
+    parser.add_argument("--mix", default="observe=0.8,actuate=0.2", help="Action weights, e.g. observe=0.8,actuate=0.2.")
+    parser.add_argument("--form", choices=("command", "dict", "json"), default="json",
+                        help="How commands are handed to the pipeline.")
+    parser.add_argument("--commands", type=int, default=20000)
+    parser.add_argument("--warmup", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=None, help="Open-loop commands/sec (queue mode).")
+    parser.add_argument("--workers", type=int, default=8, help="CommandQueue worker threads.")
+    parser.add_argument("--scheduler", choices=("fifo", "priority"), default="fifo")
+    parser.add_argument("--max-depth", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--tracemalloc", action="store_true", help="Also trace the Python heap (slows the run).")
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--compare", help="Compare with a previous --output file.")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Relative throughput drop or p99 rise reported as a regression.")
+    args = parser.parse_args()
+
+    configure_logging(level=logging.WARNING, log_file=None, console=False)
+    config = build_config(args.profile, args.seed)
+    commands = generate_commands(sorted(config), parse_mix(args.mix), args.commands, args.seed, args.form)
+    modes = ("router", "queue") if args.mode == "both" else (args.mode,)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config_path = os.path.join(tmpdir, "adapters_config.json")
+        with open(config_path, "w") as f:
+            json.dump(config, f)
+        for mode in modes:
+            result = run_scenario(args, config_path, mode, commands)
+            results.append(result)
+            latency = result["latency_ms"]
+            print(f"{result['name']:32s} {result['throughput']:10,.0f} commands/sec  "
+                  f"p50 {latency['p50']:.3f}  p99 {latency['p99']:.3f}  p999 {latency['p999']:.3f} ms  "
+                  f"errors {sum(result['errors'].values())}  rss {result['memory']['peak_rss_kb']} KB")
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Microbenchmark for command validation.
+
+Compares the original per-command jsonschema path (get_validator, then
+iter_errors and sort) with the compiled CommandValidator fast path.
+
+Run from the repository root:
+    python -m benchmarks.bench_validation [--iterations N]
+"""
+import argparse
+import time
+from command_schemas import get_validator
+from command_validation import CommandValidator
+
+COMMANDS = [
+    {"action": "OBSERVE", "target": "motion_sensor_1", "property": "motion_detected"},
+    {"action": "OBSERVE", "target": "temperature_sensor_1", "property": "current_temperature"},
+    {"action": "OBSERVE", "target": "humidity_sensor_1", "property": "current_humidity"},
+]
+
+def legacy_validate(command):
+    """The validation path CommandRouter used before CommandValidator."""
+    validator = get_validator(command)
+    if not validator:
+        return False
+    errors = sorted(validator.iter_errors(command), key=lambda e: e.path)
+    return not errors
+
+def measure(validate, iterations):
+    """Returns commands/sec for validate over the sample commands."""
+    commands = COMMANDS * (iterations // len(COMMANDS))
+    start = time.perf_counter()
+    for command in commands:
+        validate(command)
+    elapsed = time.perf_counter() - start
+    return len(commands) / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=30000)
+    args = parser.parse_args()
+
+    validator = CommandValidator()
+    for command in COMMANDS:
+        assert legacy_validate(command) and validator.validate(command).is_valid
+
+    before = measure(legacy_validate, args.iterations)
+    after = measure(validator.validate, args.iterations)
+    print(f"jsonschema iter_errors: {before:12,.0f} commands/sec")
+    print(f"compiled fast path:     {after:12,.0f} commands/sec")
+    print(f"speedup:                {after / before:12.1f}x")
+
+if __name__ == "__main__":
+    main()
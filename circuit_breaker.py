@@ -0,0 +1,89 @@
+import logging
+import time
+from threading import Lock
+
+CLOSED = "closed"
+OPEN = "open"
+
+class _Circuit:
+    __slots__ = ("state", "failures", "opened_at", "last_error")
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.last_error = None
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=2, metrics=None):
+        """
+        Tracks which targets are known to be down. Health check results are fed in
+        with record_success/record_failure; once a target fails failure_threshold
+        checks in a row its circuit opens and the router rejects its commands
+        immediately. The next successful check closes it again.
+        :param metrics: Optional MetricsRegistry; a prism_circuit_open gauge is kept per target.
+        """
+        self.failure_threshold = failure_threshold
+        self._circuits = {}
+        self._open = frozenset()
+        self._lock = Lock()
+        self._gauge = None
+        if metrics is not None:
+            self._gauge = metrics.gauge(
+                "prism_circuit_open", "1 while a target's circuit breaker is open.", ("target",)
+            )
+
+    def allow(self, target):
+        """Returns False while the target's circuit is open."""
+        return target not in self._open
+
+    def _circuit(self, target):
+        circuit = self._circuits.get(target)
+        if circuit is None:
+            circuit = self._circuits[target] = _Circuit()
+        return circuit
+
+    def record_success(self, target):
+        with self._lock:
+            circuit = self._circuit(target)
+            circuit.failures = 0
+            circuit.last_error = None
+            if circuit.state == OPEN:
+                circuit.state = CLOSED
+                circuit.opened_at = None
+                self._open = self._open - {target}
+                logging.info(f"Circuit closed for target '{target}'")
+        if self._gauge is not None:
+            self._gauge.labels(target).set(0)
+
+    def record_failure(self, target, error=None):
+        with self._lock:
+            circuit = self._circuit(target)
+            circuit.failures += 1
+            circuit.last_error = error
+            if circuit.state == OPEN or circuit.failures < self.failure_threshold:
+                return
+            circuit.state = OPEN
+            circuit.opened_at = time.time()
+            # Published as a new frozenset so allow() can read it without the lock.
+            self._open = self._open | {target}
+        logging.warning(f"Circuit opened for target '{target}' after {circuit.failures} failed health checks: {error}")
+        if self._gauge is not None:
+            self._gauge.labels(target).set(1)
+
+    def reset(self, target):
+        """Closes a target's circuit and clears its failure count."""
+        self.record_success(target)
+
+    def get_state(self):
+        """Returns {target: {"state", "failures", "opened_at", "last_error"}}."""
+        with self._lock:
+            return {
+                target: {
+                    "state": circuit.state,
+                    "failures": circuit.failures,
+                    "opened_at": circuit.opened_at,
+                    "last_error": circuit.last_error
+                }
+                for target, circuit in self._circuits.items()
+            }
@@ -0,0 +1,134 @@
+"""
+Wire codecs for commands and responses.
+
+Every codec turns bytes or str into Python objects with decode, and objects into
+bytes with encode. get_codec("json") returns the fastest JSON implementation that
+is installed (orjson, then ujson, then the standard library); "msgpack" is
+available when the msgpack package is installed. Decoding errors are always
+raised as DecodeError, whichever library is underneath.
+"""
+import json
+
+class DecodeError(ValueError):
+    """Raised when a codec cannot decode its input."""
+
+class StdlibJsonCodec:
+    name = "json"
+    library = "json"
+    binary = False
+
+    def __init__(self):
+        self._encoder = json.JSONEncoder(separators=(",", ":"))
+
+    def decode(self, data):
+        if isinstance(data, memoryview):
+            data = bytes(data)
+        try:
+            return json.loads(data)
+        except (ValueError, TypeError) as e:
+            raise DecodeError(str(e)) from e
+
+    def encode(self, obj):
+        return self._encoder.encode(obj).encode("utf-8")
+
+class OrjsonCodec:
+    name = "json"
+    library = "orjson"
+    binary = False
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+
+    def decode(self, data):
+        try:
+            return self._orjson.loads(data)
+        except (ValueError, TypeError) as e:
+            raise DecodeError(str(e)) from e
+
+    def encode(self, obj):
+        return self._orjson.dumps(obj)
+
+class UjsonCodec:
+    name = "json"
+    library = "ujson"
+    binary = False
+
+    def __init__(self):
+        import ujson
+        self._ujson = ujson
+
+    def decode(self, data):
+        if isinstance(data, (bytearray, memoryview)):
+            data = bytes(data)
+        try:
+            return self._ujson.loads(data)
+        except (ValueError, TypeError) as e:
+            raise DecodeError(str(e)) from e
+
+    def encode(self, obj):
+        return self._ujson.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+class MsgpackCodec:
+    name = "msgpack"
+    library = "msgpack"
+    binary = True
+
+    def __init__(self):
+        import msgpack
+        self._msgpack = msgpack
+
+    def decode(self, data):
+        if isinstance(data, str):
+            raise DecodeError("msgpack input must be bytes")
+        try:
+            return self._msgpack.unpackb(data, raw=False)
+        except Exception as e:
+            # msgpack raises a variety of ValueError subclasses and ExtraData.
+            raise DecodeError(str(e)) from e
+
+    def encode(self, obj):
+        return self._msgpack.packb(obj, use_bin_type=True)
+
+# Implementations tried in order for each codec name.
+_CANDIDATES = {
+    "json": (OrjsonCodec, UjsonCodec, StdlibJsonCodec),
+    "msgpack": (MsgpackCodec,),
+}
+
+_codecs = {}
+
+def register_codec(name, codec):
+    """Registers a codec object (with decode and encode) under a name."""
+    _codecs[name] = codec
+
+def get_codec(name="json"):
+    """
+    Returns the codec registered under name, instantiating the first installed
+    implementation on first use. Raises ValueError if none is available.
+    """
+    codec = _codecs.get(name)
+    if codec is not None:
+        return codec
+    candidates = _CANDIDATES.get(name)
+    if candidates is None:
+        raise ValueError(f"Unknown codec: {name}")
+    for candidate in candidates:
+        try:
+            codec = candidate()
+        except ImportError:
+            continue
+        _codecs.setdefault(name, codec)
+        return _codecs[name]
+    raise ValueError(f"Codec '{name}' is not available; install {candidates[0].library}")
+
+def available_codecs():
+    """Returns {name: library} for every codec that can be used here."""
+    available = {}
+    for name in set(_CANDIDATES) | set(_codecs):
+        try:
+            codec = get_codec(name)
+        except ValueError:
+            continue
+        available[name] = getattr(codec, "library", type(codec).__name__)
+    return available
@@ -1,19 +1,88 @@
-from queue import Queue
-from threading import Thread
+import time
+from concurrent.futures import Future
+from threading import Thread, current_thread
 import logging
+from codec import DecodeError
+from errors import Error, ErrorCode
+from execution_lanes import ExecutionLanes
+from journal import CommandJournal
+from logging_config import log_command
+from scheduler import (
+    ACCEPTED, DEFAULT_ACTION_PRIORITIES, OVERFLOW_BLOCK, PRIORITY_NORMAL, REJECTED,
+    FifoScheduler, PriorityScheduler, QueuedCommand
+)
 
 class CommandQueue:
-    def __init__(self, router, worker_count=2):
+    def __init__(self, router, worker_count=2, scheduler="fifo", aging_rate=1.0, action_priorities=None,
+                 default_max_concurrency=None, split_phase=False, name="default", max_depth=None,
+                 overflow=OVERFLOW_BLOCK, journal=None, journal_actions=("ACTUATE",)):
         """
         Initializes the command queue.
         :param router: Instance of CommandRouter to process commands.
         :param worker_count: Number of worker threads to process commands.
+        :param scheduler: "fifo" to process commands in arrival order, or "priority"
+                          to serve priority classes in order with aging.
+        :param aging_rate: Priority levels a waiting command gains per second
+                           (priority scheduler only).
+        :param action_priorities: Dict mapping actions to default priority classes
+                                  (priority scheduler only). Lower is more urgent.
+        :param default_max_concurrency: Per-target concurrency limit for adapters that
+                                        do not declare one. None means unlimited.
+        :param split_phase: If True, commands on adapters with begin_execute are started
+                            by a worker and completed on the router's completion timer,
+                            so workers do not sleep through device wait times.
+        :param name: Value of the "queue" label on this queue's metrics.
+        :param max_depth: Maximum number of queued commands, or None for unbounded.
+        :param overflow: What to do with a command enqueued while max_depth commands are
+                         queued: "block" the producer until a worker frees a slot,
+                         "reject" it with QUEUE_FULL, "drop_oldest_observe" to evict the
+                         longest-queued OBSERVE instead, or "coalesce" to merge it into a
+                         pending command for the same action, target and property (done
+                         whenever such a command is pending) and reject it otherwise.
+        :param journal: Directory (or unopened CommandJournal) for a write-ahead journal. Commands
+                        with an action in journal_actions are fsynced to it before
+                        enqueue_command returns, and commands not yet answered when the
+                        process stopped are re-enqueued by start().
+        :param journal_actions: Actions whose commands are journaled.
         """
-        self.queue = Queue()
+        options = dict(on_expired=self._handle_expired, max_depth=max_depth, overflow=overflow,
+                       on_dropped=self._handle_dropped)
+        if scheduler == "priority":
+            self.queue = PriorityScheduler(aging_rate=aging_rate, **options)
+        elif scheduler == "fifo":
+            self.queue = FifoScheduler(**options)
+        else:
+            raise ValueError(f"Unknown scheduler: {scheduler}")
+        self.scheduler = scheduler
+        self.action_priorities = dict(DEFAULT_ACTION_PRIORITIES if action_priorities is None else action_priorities)
         self.router = router
+        self.lanes = ExecutionLanes(router, default_max_concurrency, requeue=self.queue.requeue)
+        if router.lanes is None:
+            router.lanes = self.lanes
+        router.reload_listeners.append(self._handle_reload)
+        self.split_phase = split_phase
         self.workers = []
         self.worker_count = worker_count
         self.running = False
+        self.name = name
+        self.journal_actions = frozenset(journal_actions)
+        self.journal = CommandJournal(journal, metrics=router.metrics) if isinstance(journal, str) else journal
+        self._recovered = self.journal.open() if self.journal is not None else []
+        metrics = router.metrics
+        metrics.gauge(
+            "prism_queue_depth", "Commands waiting in the scheduler.", ("queue",)
+        ).labels(name).set_function(self.queue.qsize)
+        self.wait_seconds = metrics.histogram(
+            "prism_queue_wait_seconds", "Time commands spent queued before a worker picked them up.",
+            ("queue", "priority")
+        )
+        self.overflow_total = metrics.counter(
+            "prism_queue_overflow_total", "Commands rejected, dropped or coalesced by the overflow policy.",
+            ("queue", "outcome")
+        )
+        self.errors_total = metrics.counter(
+            "prism_errors_total", "Error responses by error code.", ("code",)
+        )
 
     def start(self):
         """Starts the worker threads."""
@@ -23,33 +92,268 @@ class CommandQueue:
             worker.start()
             self.workers.append(worker)
             logging.info(f"Started {worker.name}")
+        self._replay_journal()
 
     def stop(self):
         """Stops the worker threads."""
         self.running = False
-        # Put sentinel values to unblock threads
-        for _ in self.workers:
-            self.queue.put(None)
+        # Close the scheduler to unblock threads
+        self.queue.close()
         for worker in self.workers:
             worker.join()
             logging.info(f"Stopped {worker.name}")
+        # Commands still queued stay pending in the journal and are replayed on the next start.
+        if self.journal is not None:
+            self.journal.close()
+
+    def _replay_journal(self):
+        """
+        Re-enqueues the commands recovered from the journal, keeping their journal
+        entries. They bypass max_depth and the overflow policy, since rejecting them
+        would complete their journal entries without running them.
+        """
+        recovered, self._recovered = self._recovered, []
+        for seq, command in recovered:
+            command, key = self._parse(command)
+            item = self._make_item(command, self._default_priority(key), None, key=key)
+            item.journal_seqs = [seq]
+            self._put(item, force=True)
+        if recovered:
+            logging.info(f"Replayed {len(recovered)} journaled commands")
+
+    def _parse(self, command):
+        """
+        Decodes a command once at enqueue time. Returns (command, key) where command
+        is the parsed command (or the original input if it cannot be decoded, so the
+        router reports the error) and key is its (action, target, property), used for
+        priorities, execution lanes and coalescing, or None.
+        """
+        try:
+            command = self.router.decode_command(command)
+            key = (command.get("action"), command.get("target"), command.get("property"))
+            hash(key)
+        except (DecodeError, TypeError, AttributeError):
+            return command, None
+        return command, key
+
+    def _default_priority(self, key):
+        """Returns the priority class for a command based on its action."""
+        if self.scheduler != "priority" or key is None:
+            return PRIORITY_NORMAL
+        return self.action_priorities.get(key[0], PRIORITY_NORMAL)
+
+    def _make_item(self, command, priority, timeout, callback=None, key=None):
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        return QueuedCommand(command, priority, deadline, callback, key, Future())
+
+    def _journal(self, item, commands):
+        """
+        Appends the journaled commands among commands to the journal and waits for
+        them to be durable. Returns False (after answering the item) if that failed.
+        """
+        commands = [command for command, key in commands if key is not None and key[0] in self.journal_actions]
+        if not commands:
+            return True
+        try:
+            item.journal_seqs = self.journal.append_many(commands)
+        except (OSError, RuntimeError) as e:
+            error = Error(ErrorCode.JOURNAL_WRITE_FAILED, f"Could not journal command: {e}")
+            logging.error(error.to_dict())
+            self._respond_error(item, error)
+            return False
+        return True
+
+    def _put(self, item, force=False):
+        """
+        Hands an item to the scheduler and returns its future.
+        :param force: Bypass max_depth and the overflow policy (see _Scheduler.put).
+        """
+        outcome = self.queue.put(item, force)
+        if outcome == REJECTED:
+            self.overflow_total.labels(self.name, "rejected").inc()
+            error = Error(ErrorCode.QUEUE_FULL, f"Command queue is full ({self.queue.max_depth} commands)")
+            logging.warning(error.to_dict())
+            self._respond_error(item, error)
+        elif outcome != ACCEPTED:
+            self.overflow_total.labels(self.name, outcome).inc()
+        return item.future
+
+    def enqueue_command(self, command, priority=None, timeout=None, callback=None):
+        """
+        Enqueues a command for processing. Returns a concurrent.futures.Future that
+        resolves to the command's response (also passed to handle_response).
+        :param command: An encoded command, a dict or a Command (see CommandRouter.route_command).
+        :param priority: Priority class overriding the action's default (lower is more urgent).
+        :param timeout: Seconds after which the command is dropped if no worker has
+                        picked it up yet.
+        :param callback: Called with the response instead of handle_response.
+        """
+        command, key = self._parse(command)
+        if priority is None:
+            priority = self._default_priority(key)
+        item = self._make_item(command, priority, timeout, callback, key)
+        if self.journal is not None and not self._journal(item, [(command, key)]):
+            return item.future
+        future = self._put(item)
+        log_command("Enqueued command: %s", command)
+        return future
+
+    def enqueue_batch(self, command_strings, priority=PRIORITY_NORMAL, timeout=None, callback=None):
+        """
+        Enqueues a batch of commands as a single queue item. The batch is routed
+        with CommandRouter.route_batch and its responses are handled in order.
+        Returns a Future resolving to the list of responses (or a single error response).
+        :param callback: Called once with the list of responses (or a single error
+                         response) instead of handle_response.
+        """
+        commands = list(command_strings)
+        if self.journal is not None:
+            parsed = [self._parse(command) for command in commands]
+            item = self._make_item([command for command, _ in parsed], priority, timeout, callback)
+            if not self._journal(item, parsed):
+                return item.future
+        else:
+            item = self._make_item(commands, priority, timeout, callback)
+        future = self._put(item)
+        log_command("Enqueued batch of %d commands", len(commands))
+        return future
 
-    def enqueue_command(self, command_string):
-        """Enqueues a command for processing."""
-        self.queue.put(command_string)
-        logging.info(f"Enqueued command: {command_string}")
+    def get_stats(self):
+        """Returns queue depth and queue-wait latency per priority class."""
+        return self.queue.get_stats()
+
+    def get_lane_depths(self):
+        """Returns active and parked command counts for each target's execution lane."""
+        return self.lanes.get_depths()
+
+    def _target_of(self, item):
+        """Returns the target of a queued command, or None for batches and malformed commands."""
+        if item.key is None or not isinstance(item.key[1], str):
+            return None
+        return item.key[1]
+
+    def _handle_reload(self, report):
+        """Applies changed per-target concurrency limits after CommandRouter.reload_config."""
+        targets = report["added"] + report["removed"] + report["replaced"] + report["updated"]
+        for item in self.lanes.refresh(targets):
+            self.queue.requeue(item)
+
+    def _handle_expired(self, item):
+        """Responds to a command dropped because its deadline passed."""
+        error = Error(ErrorCode.COMMAND_EXPIRED, "Command deadline passed before it could be processed")
+        logging.warning(error.to_dict())
+        self._respond_error(item, error)
+
+    def _handle_dropped(self, item):
+        """Responds to an OBSERVE evicted to make room for a newer command."""
+        self.overflow_total.labels(self.name, "dropped").inc()
+        error = Error(ErrorCode.QUEUE_FULL, "Command dropped from the full queue to make room for newer commands")
+        logging.warning(error.to_dict())
+        self._respond_error(item, error)
 
     def _process_queue(self):
-        """Worker thread to process commands."""
+        """
+        Worker thread to process commands. A command whose target lane is full is
+        parked in that lane and the worker moves on; whichever worker frees a slot
+        in the lane runs the parked command next.
+        """
         while self.running:
-            command = self.queue.get()
-            if command is None:
-                # Sentinel value to exit
+            item = self.queue.get()
+            if item is None:
+                # Scheduler closed
                 break
-            logging.info(f"{Thread.current_thread().name} processing command: {command}")
-            response = self.router.route_command(command)
-            self.handle_response(response)
+            self.wait_seconds.labels(self.name, str(item.priority)).observe(time.monotonic() - item.enqueued_at)
+            target = self._target_of(item)
+            if target is not None and not self.lanes.try_acquire(target, item):
+                continue
+            if self.split_phase and not isinstance(item.command, list):
+                self.router.route_command_deferred(
+                    item.command, lambda response, item=item, target=target: self._complete_deferred(item, target, response)
+                )
+                continue
+            while item is not None:
+                try:
+                    self._process_item(item)
+                finally:
+                    item = self._release_lane(target) if target is not None else None
+
+    def _release_lane(self, target):
+        """
+        Releases a slot in target's lane once a command finished. Returns the parked
+        command the slot was handed to, for the caller to run next, or None. The
+        lane's other parked commands go back to the scheduler.
+        """
+        while True:
+            item, parked = self.lanes.release(target)
+            for waiting in parked:
+                self.queue.requeue(waiting)
+            if item is None or not item.is_expired(time.monotonic()):
+                return item
+            self._handle_expired(item)
+            self.queue.task_done()
+
+    def _process_item(self, item):
+        """Routes a queued command or batch and handles its responses."""
+        command = item.command
+        try:
+            if isinstance(command, list):
+                log_command("%s processing batch of %d commands", current_thread().name, len(command))
+                responses = self.router.route_batch(command)
+                self._respond(item, responses)
+            else:
+                log_command("%s processing command: %s", current_thread().name, command)
+                response = self.router.route_command(command)
+                self._respond(item, response)
+        finally:
+            self.queue.task_done()
+
+    def _complete_deferred(self, item, target, response):
+        """
+        Finishes a command routed with route_command_deferred. May run on the
+        completion timer thread, so a command parked in the lane is handed back to
+        the scheduler rather than run here.
+        """
+        try:
+            self._respond(item, response)
+        finally:
             self.queue.task_done()
+            if target is not None:
+                _, parked = self.lanes.release(target, handoff=False)
+                for waiting in parked:
+                    self.queue.requeue(waiting)
+
+    def _respond(self, item, response):
+        """
+        Delivers a response to the item's future and to its callback or
+        handle_response, then to any commands coalesced into it. A callback that
+        raises is logged and does not keep the response from the other waiters.
+        """
+        for waiter in [item] + (item.followers or []):
+            try:
+                if waiter.future is not None and not waiter.future.done():
+                    waiter.future.set_result(response)
+                if waiter.callback is not None:
+                    waiter.callback(response)
+                elif isinstance(waiter.command, list) and isinstance(response, list):
+                    for entry in response:
+                        self.handle_response(entry)
+                else:
+                    self.handle_response(response)
+            except Exception as e:
+                error = Error(ErrorCode.INTERNAL_ERROR, f"Response callback failed: {e}")
+                logging.exception(error.to_dict())
+            finally:
+                if waiter.journal_seqs is not None:
+                    for seq in waiter.journal_seqs:
+                        self.journal.complete(seq)
+
+    def _respond_error(self, item, error):
+        """
+        Responds to the item and its coalesced commands with an error raised by the
+        queue itself, counting it like the router counts the errors it returns.
+        """
+        self.errors_total.labels(str(error.code.value)).inc(1 + len(item.followers or ()))
+        self._respond(item, error.to_dict())
 
     def handle_response(self, response):
         """Handles the response from the router."""
@@ -57,6 +57,32 @@ COMMAND_SCHEMAS = {
 
 VALIDATORS = {key: Draft7Validator(schema) for key, schema in COMMAND_SCHEMAS.items()}
 
+# Optional OBSERVE field asking for statistics over the last N seconds of samples.
+WINDOW_SCHEMA = {"type": "number", "exclusiveMinimum": 0}
+
+def build_schema(action, target, property, values=None, window=False):
+    """
+    Builds a command schema in the same shape as COMMAND_SCHEMAS for one
+    action/target/property. If values is given, the command must carry a
+    "value" from that list. If window is True, an optional "window" is allowed.
+    """
+    schema = {
+        "type": "object",
+        "properties": {
+            "action": {"type": "string", "enum": [action]},
+            "target": {"type": "string", "enum": [target]},
+            "property": {"type": "string", "enum": [property]}
+        },
+        "required": ["action", "target", "property"],
+        "additionalProperties": False
+    }
+    if values is not None:
+        schema["properties"]["value"] = {"enum": list(values)}
+        schema["required"].append("value")
+    if window:
+        schema["properties"]["window"] = WINDOW_SCHEMA
+    return schema
+
 def get_validator(command):
     """
     Returns the appropriate validator based on the command's action and target.
@@ -0,0 +1,164 @@
+from jsonschema import Draft7Validator
+from command_schemas import COMMAND_SCHEMAS, WINDOW_SCHEMA, build_schema, get_validator
+
+class ValidatorResult:
+    def __init__(self, is_valid, errors):
+        self.is_valid = is_valid
+        self.errors = errors
+
+VALID = ValidatorResult(True, [])
+
+# Rule marker for commands that must not carry a "value" field.
+NO_VALUE = None
+
+def _enum(schema, name):
+    """Returns the enum of a string property in a command schema, or None."""
+    prop = schema.get("properties", {}).get(name)
+    if not isinstance(prop, dict) or "enum" not in prop:
+        return None
+    return prop["enum"]
+
+def compile_schema(schema):
+    """
+    Compiles a command schema into fast-path rules.
+    Returns a list of ((action, target, property), allowed_values, windowed) tuples,
+    or None if the schema uses features the fast path does not understand.
+    allowed_values is NO_VALUE when the command must not carry a "value" field;
+    windowed is True when an optional "window" field is allowed.
+    """
+    if schema.get("type") != "object" or schema.get("additionalProperties") is not False:
+        return None
+    properties = schema.get("properties", {})
+    required = set(schema.get("required", []))
+    if set(properties) - {"action", "target", "property", "value", "window"}:
+        return None
+    windowed = "window" in properties
+    if windowed and (properties["window"] != WINDOW_SCHEMA or "window" in required):
+        return None
+    if not {"action", "target", "property"} <= required:
+        return None
+    actions, targets, props = _enum(schema, "action"), _enum(schema, "target"), _enum(schema, "property")
+    if actions is None or targets is None or props is None:
+        return None
+    if "value" in properties:
+        values = _enum(schema, "value")
+        if values is None or "value" not in required:
+            return None
+        try:
+            values = frozenset(values)
+        except TypeError:
+            return None
+    else:
+        values = NO_VALUE
+    return [((action, target, prop), values, windowed) for action in actions for target in targets for prop in props]
+
+class CommandValidator:
+    def __init__(self, adapters=None):
+        """
+        Initializes the command validator.
+        :param adapters: Dict of loaded adapters keyed by target. Schemas are built
+                         from each adapter's CAPABILITIES and compiled into a lookup
+                         table together with the hand-written COMMAND_SCHEMAS.
+        """
+        self.rules = {}
+        self.windowed = set()
+        self.validators = {}
+        self.rebuild(adapters or {})
+
+    def rebuild(self, adapters):
+        """Rebuilds the schemas and fast-path rules for the given adapters."""
+        rules = {}
+        windowed = set()
+        validators = {}
+        schemas = list(COMMAND_SCHEMAS.values())
+        for target, adapter in adapters.items():
+            capabilities = getattr(adapter, "CAPABILITIES", None)
+            if not capabilities:
+                continue
+            for action, properties in capabilities.items():
+                for property, values in properties.items():
+                    schema = build_schema(action, target, property, values, window=(action == "OBSERVE" and values is None))
+                    schemas.append(schema)
+                    validators[(action, target, property)] = Draft7Validator(schema)
+                # Used to report errors for commands naming an unsupported property.
+                validators[(action, target)] = Draft7Validator({
+                    "type": "object",
+                    "properties": {"property": {"type": "string", "enum": sorted(properties)}},
+                    "required": ["action", "target", "property"]
+                })
+
+        for schema in schemas:
+            compiled = compile_schema(schema)
+            if compiled is None:
+                continue
+            for key, values, allows_window in compiled:
+                if allows_window:
+                    windowed.add(key)
+                existing = rules.get(key, NO_VALUE)
+                if existing is not NO_VALUE and values is not NO_VALUE:
+                    rules[key] = existing | values
+                else:
+                    rules.setdefault(key, values)
+
+        # Hand-written schemas are split per value (e.g. ON and OFF), so give
+        # full_validate one schema per rule that accepts everything the fast path does.
+        for key, values in rules.items():
+            if key not in validators:
+                allowed = None if values is NO_VALUE else sorted(values, key=str)
+                validators[key] = Draft7Validator(build_schema(*key, allowed, window=key in windowed))
+
+        # Swap the tables in one step so concurrent validate() calls never see
+        # a partially built state.
+        self.rules, self.windowed, self.validators = rules, windowed, validators
+
+    def validate(self, command):
+        """
+        Validates a command. Returns a ValidatorResult.
+        The fast path is a single dict lookup; only commands that miss it are run
+        through jsonschema for full error reporting.
+        """
+        key = (command.get("action"), command.get("target"), command.get("property"))
+        try:
+            values = self.rules[key]
+        except (KeyError, TypeError):
+            pass
+        else:
+            if values is NO_VALUE:
+                size = len(command)
+                if size == 3:
+                    return VALID
+                if size == 4 and key in self.windowed:
+                    window = command.get("window")
+                    if type(window) in (int, float) and window > 0:
+                        return VALID
+            elif len(command) == 4 and "value" in command:
+                try:
+                    if command["value"] in values:
+                        return VALID
+                except TypeError:
+                    pass
+        return self.full_validate(command)
+
+    def full_validate(self, command):
+        """Validates a command with jsonschema, collecting every error message."""
+        action, target = command.get("action"), command.get("target")
+        validator = None
+        for key in ((action, target, command.get("property")), (action, target)):
+            try:
+                validator = self.validators.get(key)
+            except TypeError:
+                continue
+            if validator is not None:
+                break
+        if validator is None:
+            validator = get_validator(command)
+        if not validator:
+            return ValidatorResult(False, ["No schema defined for this command."])
+        if not isinstance(command, dict):
+            # jsonschema only treats dicts as objects, e.g. for Command instances.
+            command = dict(command.items())
+        errors = sorted(validator.iter_errors(command), key=lambda e: e.path)
+        if errors:
+            error_messages = [error.message for error in errors]
+            return ValidatorResult(False, error_messages)
+        return VALID
@@ -6,3 +6,76 @@ class Action(Enum):
     PARAMETERIZE = "PARAMETERIZE"
     CONFIGURE = "CONFIGURE"
     LINK = "LINK"
+    # Handled by the router: statistics over many targets (see aggregation).
+    AGGREGATE = "AGGREGATE"
+
+# Marks a Command field that was not given, so it is absent like a missing dict key.
+_MISSING = object()
+
+class Command:
+    """
+    A parsed command in under half the memory of a dict. It behaves like the
+    equivalent read-only dict (get, [], in, len, keys, items), so it can be passed
+    anywhere a parsed JSON command is accepted, including CommandRouter.route_command.
+    """
+    __slots__ = ("action", "target", "property", "value", "window")
+    FIELDS = frozenset(__slots__)
+
+    def __init__(self, action, target, property, value=_MISSING, window=_MISSING):
+        self.action = action
+        self.target = target
+        self.property = property
+        self.value = value
+        self.window = window
+
+    @classmethod
+    def from_dict(cls, command):
+        """Builds a Command from a parsed dict. Raises TypeError on unknown fields."""
+        return cls(**command)
+
+    def get(self, key, default=None):
+        if key in self.FIELDS:
+            value = getattr(self, key)
+            if value is not _MISSING:
+                return value
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def keys(self):
+        return [key for key in self.__slots__ if getattr(self, key) is not _MISSING]
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.keys()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return 3 + (self.value is not _MISSING) + (self.window is not _MISSING)
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, Command):
+            return self.items() == other.items()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __reduce__(self):
+        # The missing-field marker is not picklable by identity, so pickle the fields.
+        return (Command.from_dict, (self.to_dict(),))
+
+    def __repr__(self):
+        return f"Command({self.to_dict()!r})"
@@ -0,0 +1,60 @@
+import logging
+import os
+from threading import Event, Thread
+
+class ConfigWatcher:
+    def __init__(self, router, interval=2.0, drain_timeout=30.0, path=None):
+        """
+        Watches the adapters configuration file and calls router.reload_config when
+        it changes.
+        :param router: CommandRouter to reload.
+        :param interval: Seconds between checks of the file's modification time and size.
+        :param drain_timeout: Passed to reload_config for replaced and removed adapters.
+        :param path: File to watch (default: the router's config path).
+        """
+        self.router = router
+        self.interval = interval
+        self.drain_timeout = drain_timeout
+        self.path = path or router.config_path
+        self.last_report = None
+        self._stamp = self._read_stamp()
+        self._stop = Event()
+        self._thread = None
+
+    def _read_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = Thread(target=self._run, daemon=True, name="ConfigWatcher")
+        self._thread.start()
+        logging.info(f"Watching {self.path} for changes every {self.interval}s")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def check(self):
+        """Reloads if the file changed since the last check. Returns the reload report or None."""
+        stamp = self._read_stamp()
+        if stamp is None or stamp == self._stamp:
+            return None
+        self._stamp = stamp
+        report = self.router.reload_config(self.path, drain_timeout=self.drain_timeout)
+        if report is not None:
+            self.last_report = report
+        return report
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                # A bad reload must not stop the watcher; the next change is retried.
+                logging.exception(f"Error reloading {self.path}")
@@ -1,139 +1,1200 @@
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from importlib import import_module
 import logging
-from commands import Action
+from threading import Condition, Event, Lock
+from codec import DecodeError, get_codec
+from commands import Action, Command
 from errors import Error, ErrorCode
-from command_schemas import get_validator
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("prism.log"),
-        logging.StreamHandler()
-    ]
-)
+from command_validation import CommandValidator, ValidatorResult
+from observe_cache import ObserveCache
+from split_phase import CompletionTimer
+from sampling import SamplingEngine
+from logging_config import configure_logging, log_command
+from middleware.pipeline import MiddlewarePipeline
+from metrics import get_registry
+from circuit_breaker import CircuitBreaker
+from events import EventBus
+from target_groups import aggregate, aggregate_readings, is_group, load_groups, members_of
+from aggregation import parse_aggregate
+
+# Configure logging, unless the application already has. Call
+# logging_config.configure_logging(async_mode=True, ...) to switch to the
+# queue-backed pipeline.
+configure_logging(force=False)
+
+# Metric label values for commands; anything else is reported as "unknown".
+ACTION_LABELS = frozenset(action.value for action in Action)
 
 class CommandRouter:
-    def __init__(self, adapter_config_path):
-        self.adapters = self._load_adapters(adapter_config_path)
-        self.middleware = []
+    def __init__(self, adapter_config_path, cache_max_entries=1024, init_mode="sequential",
+                 startup_budget=None, init_workers=8, metrics=None, targets=None, codec="json",
+                 group_workers=64):
+        """
+        Initializes the command router.
+        :param adapter_config_path: Path to the adapters configuration file.
+        :param cache_max_entries: Maximum number of cached OBSERVE results.
+        :param init_mode: "sequential" constructs adapters one after another,
+                          "parallel" constructs them concurrently, and "lazy" defers
+                          construction until a target first receives a command.
+        :param startup_budget: Seconds to wait for parallel initialization. Adapters
+                               still initializing afterwards are added once ready.
+        :param init_workers: Threads used for parallel initialization.
+        :param metrics: MetricsRegistry to record into (default: the process-wide registry).
+        :param targets: Only load the adapters for these targets, e.g. one shard of a
+                        ProcessCommandQueue. None loads every configured target.
+        :param codec: Codec name ("json", "msgpack") or codec object used to decode
+                      commands given as str or bytes. See codec.get_codec.
+        :param group_workers: Threads shared by all group commands for fanning out
+                              to their members (see target_groups).
+        """
+        self.config_path = adapter_config_path
+        self.codec = get_codec(codec) if isinstance(codec, str) else codec
+        self.metrics = metrics if metrics is not None else get_registry()
+        # Events pushed by adapters (e.g. GPIO edges); see subscribe.
+        self.events = EventBus(metrics=self.metrics)
+        self.config = self._read_config(adapter_config_path)
+        self.targets = set(targets) if targets is not None else None
+        if targets is not None:
+            self.config = {target: info for target, info in self.config.items() if target in targets}
+        self.init_mode = init_mode
+        self.init_report = {}
+        self.adapter_classes = {}
+        self.adapters = {}
+        self._adapters_lock = Lock()
+        self._deferred = {}
+        self._deferred_locks = {}
+        self._startup_complete = Event()
+        # {(action, target, property): (adapter, bound handler)} compiled from each
+        # adapter's @handles methods; see _rebuild_dispatch.
+        self.dispatch = {}
+        # Commands running per adapter (by id), so removed adapters can be drained.
+        self._in_flight = {}
+        self._retired = set()
+        self._in_flight_condition = Condition()
+        self._reload_lock = Lock()
+        # Called with the report of every reload_config that changed something.
+        self.reload_listeners = []
+        # {name: TargetGroup} for the "group" entries of the configuration.
+        self.groups = load_groups(self.config)
+        self.group_workers = group_workers
+        self._group_executor = None
+        self.adapters = self._load_adapters(self.config, init_mode, startup_budget, init_workers)
+        self._rebuild_dispatch()
+        # Adapters finishing after the startup budget wait for this before registering.
+        self._startup_complete.set()
+        self.validator = CommandValidator(self.adapter_classes)
+        self.middleware = MiddlewarePipeline()
+        self.observe_cache = ObserveCache(
+            ttls={target: info["cache_ttl"] for target, info in self.config.items() if "cache_ttl" in info},
+            max_entries=cache_max_entries
+        )
+        self.completion_timer = CompletionTimer()
+        self.sampler = None
+        # The ExecutionLanes of the first CommandQueue on this router, which the
+        # sampling engine's reads also take slots in.
+        self.lanes = None
+        self.stage_seconds = self.metrics.histogram(
+            "prism_command_stage_seconds", "Time spent in each routing stage.", ("stage", "target", "action")
+        )
+        self.errors_total = self.metrics.counter(
+            "prism_errors_total", "Error responses by error code.", ("code",)
+        )
+        # Fed by AdapterHealthCheck; see start_monitoring(router.adapters, router.circuit_breaker).
+        self.circuit_breaker = CircuitBreaker(metrics=self.metrics)
+        for target, adapter in self.adapters.items():
+            self._attach_events(target, adapter)
 
-    def add_middleware(self, middleware):
-        """Adds a middleware to the middleware chain."""
-        self.middleware.append(middleware)
+    def add_middleware(self, middleware, actions=None, targets=None):
+        """
+        Adds a middleware to the middleware chain.
+        :param actions: Only run the middleware for these actions (default: all).
+        :param targets: Only run the middleware for these targets (default: all).
+        """
+        self.middleware.add(middleware, actions, targets)
         logging.info(f"Added middleware: {middleware.__class__.__name__}")
 
+    def remove_middleware(self, middleware):
+        """Removes a middleware from the middleware chain."""
+        if self.middleware.remove(middleware):
+            logging.info(f"Removed middleware: {middleware.__class__.__name__}")
+
     def _execute_middleware_chain(self, command):
-        """Executes the middleware chain on the command."""
-        for middleware in self.middleware:
-            command = middleware.process(command)
-        return command
+        """
+        Runs the before hooks of the middleware that apply to the command.
+        Returns (command, chain, response); response is not None when a middleware
+        rejected or answered the command itself.
+        """
+        chain = self.middleware.chain(command.get("action"), command.get("target"))
+        command, response = chain.run_before(command)
+        return command, chain, response
 
-    def _load_adapters(self, config_path):
-        """Loads adapter modules based on the configuration file."""
-        adapters = {}
+    def _read_config(self, config_path):
+        """Reads the adapters configuration file."""
         with open(config_path, 'r') as f:
-            config = json.load(f)
-            for target, adapter_info in config.items():
-                module_name = adapter_info.get("module")
-                params = adapter_info.get("params", {})
-                try:
-                    module = import_module(f'adapters.{module_name}')
-                    class_name = ''.join(word.capitalize() for word in module_name.split('_'))
-                    adapter_class = getattr(module, class_name)
-                    adapters[target] = adapter_class(**params)
-                    logging.info(f"Loaded adapter for target '{target}': {module_name} with params {params}")
-                except ImportError as e:
-                    error = Error(ErrorCode.ADAPTER_INITIALIZATION_FAILED, f"ImportError: {e}")
-                    logging.error(error.to_dict())
-                except AttributeError:
-                    error = Error(ErrorCode.ADAPTER_INITIALIZATION_FAILED, f"Class '{class_name}' not found in module '{module_name}'.")
-                    logging.error(error.to_dict())
-                except TypeError as e:
-                    error = Error(ErrorCode.ADAPTER_INITIALIZATION_FAILED, f"TypeError: {e}")
-                    logging.error(error.to_dict())
+            return json.load(f)
+
+    def _resolve_adapter_class(self, target, adapter_info):
+        """Imports the adapter class for a target. Returns None if it cannot be found."""
+        module_name = adapter_info.get("module")
+        class_name = ''.join(word.capitalize() for word in module_name.split('_'))
+        try:
+            module = import_module(f'adapters.{module_name}')
+            return getattr(module, class_name)
+        except ImportError as e:
+            error = Error(ErrorCode.ADAPTER_INITIALIZATION_FAILED, f"ImportError: {e}")
+            logging.error(error.to_dict())
+        except AttributeError:
+            error = Error(ErrorCode.ADAPTER_INITIALIZATION_FAILED, f"Class '{class_name}' not found in module '{module_name}'.")
+            logging.error(error.to_dict())
+        self.init_report[target] = {"status": "failed", "seconds": 0.0, "error": error.message}
+        return None
+
+    def _construct_adapter(self, target, adapter_class, params):
+        """Constructs an adapter, recording how long it took. Returns None on failure."""
+        start = time.perf_counter()
+        try:
+            adapter = adapter_class(**params)
+        except Exception as e:
+            elapsed = time.perf_counter() - start
+            if isinstance(e, TypeError):
+                error = Error(ErrorCode.ADAPTER_INITIALIZATION_FAILED, f"TypeError: {e}")
+            else:
+                error = Error(ErrorCode.ADAPTER_INITIALIZATION_FAILED, f"Failed to initialize adapter for target '{target}': {e}")
+            logging.error(error.to_dict())
+            self.init_report[target] = {"status": "failed", "seconds": elapsed, "error": error.message}
+            return None
+        elapsed = time.perf_counter() - start
+        self.init_report[target] = {"status": "loaded", "seconds": elapsed, "error": None}
+        logging.info(f"Loaded adapter for target '{target}': {adapter_class.__name__} with params {params} in {elapsed:.3f}s")
+        return adapter
+
+    def _load_adapters(self, config, init_mode="sequential", startup_budget=None, init_workers=8):
+        """Loads adapter modules based on the configuration."""
+        specs = {}
+        for target, adapter_info in config.items():
+            if is_group(adapter_info):
+                continue
+            adapter_class = self._resolve_adapter_class(target, adapter_info)
+            if adapter_class is not None:
+                self.adapter_classes[target] = adapter_class
+                specs[target] = (adapter_class, adapter_info.get("params", {}))
+
+        if init_mode == "lazy":
+            for target in specs:
+                self.init_report[target] = {"status": "deferred", "seconds": 0.0, "error": None}
+                self._deferred_locks[target] = Lock()
+            self._deferred = specs
+            return {}
+        if init_mode == "parallel":
+            return self._load_adapters_parallel(specs, startup_budget, init_workers)
+        if init_mode != "sequential":
+            raise ValueError(f"Unknown init_mode: {init_mode}")
+
+        adapters = {}
+        for target, (adapter_class, params) in specs.items():
+            adapter = self._construct_adapter(target, adapter_class, params)
+            if adapter is not None:
+                adapters[target] = adapter
         return adapters
 
+    def _load_adapters_parallel(self, specs, startup_budget, init_workers):
+        """
+        Constructs adapters concurrently. Adapters not ready within startup_budget
+        keep initializing in the background and are registered when they finish.
+        """
+        adapters = {}
+        if not specs:
+            return adapters
+        executor = ThreadPoolExecutor(max_workers=min(init_workers, len(specs)), thread_name_prefix="AdapterInit")
+        futures = {
+            executor.submit(self._construct_adapter, target, adapter_class, params): target
+            for target, (adapter_class, params) in specs.items()
+        }
+        done, not_done = wait(futures, timeout=startup_budget)
+        for future in done:
+            adapter = future.result()
+            if adapter is not None:
+                adapters[futures[future]] = adapter
+        for future in not_done:
+            target = futures[future]
+            self.init_report[target] = {"status": "pending", "seconds": startup_budget, "error": None}
+            logging.warning(f"Adapter for target '{target}' still initializing after {startup_budget}s startup budget")
+            future.add_done_callback(lambda future, target=target: self._register_late_adapter(target, future))
+        executor.shutdown(wait=False)
+        return adapters
+
+    def _register_late_adapter(self, target, future):
+        adapter = future.result()
+        if adapter is None:
+            return
+        self._startup_complete.wait()
+        self._register_adapter(target, adapter)
+        logging.info(f"Adapter for target '{target}' became available after startup")
+
+    def _register_adapter(self, target, adapter):
+        """Publishes an adapter by swapping in a new adapters dict."""
+        with self._adapters_lock:
+            self.adapters = {**self.adapters, target: adapter}
+            self._rebuild_dispatch()
+        self._attach_events(target, adapter)
+
+    def subscribe(self, target=None, property=None, callback=None, max_buffer=256):
+        """
+        Subscribes to events pushed by adapters, e.g. motion_detected on a GPIO edge.
+        See EventBus.subscribe; returns a Subscription.
+        """
+        return self.events.subscribe(target, property, callback, max_buffer)
+
+    def _attach_events(self, target, adapter):
+        """Lets an adapter publish events for its target."""
+        attach = getattr(adapter, "attach_events", None)
+        if attach is None:
+            return
+
+        def emit(property, value):
+            # A pushed value supersedes any cached reading.
+            self.observe_cache.invalidate(target)
+            self.events.publish(target, property, value)
+
+        try:
+            attach(emit)
+        except Exception as e:
+            logging.error(f"Could not attach events for target '{target}': {e}")
+
+    def _detach_events(self, target, adapter):
+        detach = getattr(adapter, "detach_events", None)
+        if detach is None:
+            return
+        try:
+            detach()
+        except Exception as e:
+            logging.error(f"Could not detach events for target '{target}': {e}")
+
+    def remove_adapter(self, target, drain_timeout=None):
+        """
+        Unregisters a target's adapter and returns it, or None if the target has no
+        adapter. New commands for the target are rejected at once. The caller is
+        responsible for cleaning the adapter up.
+        :param drain_timeout: If given, wait up to this many seconds for commands
+                              already running on the adapter to finish.
+        """
+        with self._adapters_lock:
+            adapter = self.adapters.get(target)
+            if adapter is None:
+                return None
+            self.adapters = {name: other for name, other in self.adapters.items() if name != target}
+            self._rebuild_dispatch()
+            self._retire(adapter)
+        self._detach_events(target, adapter)
+        self.observe_cache.invalidate(target)
+        logging.info(f"Removed adapter for target '{target}'")
+        if drain_timeout is not None:
+            self.drain_adapter(adapter, drain_timeout)
+        return adapter
+
+    def _retire(self, adapter):
+        """Stops new commands from starting on a removed adapter."""
+        with self._in_flight_condition:
+            self._retired.add(id(adapter))
+
+    def _acquire(self, adapter):
+        """
+        Counts a command as running on adapter. Returns False if the adapter was
+        removed after the command was prepared; the command must not run then.
+        """
+        key = id(adapter)
+        with self._in_flight_condition:
+            if key in self._retired:
+                return False
+            self._in_flight[key] = self._in_flight.get(key, 0) + 1
+            return True
+
+    def _release(self, adapter):
+        key = id(adapter)
+        with self._in_flight_condition:
+            count = self._in_flight[key] - 1
+            if count:
+                self._in_flight[key] = count
+            else:
+                del self._in_flight[key]
+                self._in_flight_condition.notify_all()
+
+    def _removed_error(self, target):
+        error = Error(ErrorCode.ADAPTER_EXECUTION_FAILED, f"Adapter for target '{target}' was removed before the command started")
+        logging.warning(error.to_dict())
+        return error
+
+    def drain_adapter(self, adapter, timeout=None):
+        """
+        Waits until no commands are running on a removed adapter. Returns True once
+        it is idle, or False if commands were still running after timeout seconds.
+        """
+        key = id(adapter)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._in_flight_condition:
+            while key in self._in_flight:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._in_flight_condition.wait(remaining)
+            return True
+
+    def _cleanup_adapter(self, target, adapter):
+        self._detach_events(target, adapter)
+        if hasattr(adapter, 'cleanup') and callable(adapter.cleanup):
+            try:
+                adapter.cleanup()
+                logging.info(f"Cleaned up adapter '{target}'.")
+            except Exception as e:
+                error = Error(ErrorCode.ADAPTER_EXECUTION_FAILED, f"Error during cleanup of adapter '{target}': {e}")
+                logging.error(error.to_dict())
+
+    def reload_config(self, adapter_config_path=None, drain_timeout=30.0):
+        """
+        Re-reads the adapters configuration and applies the difference without
+        touching unaffected targets. Adapters whose "module" or "params" changed are
+        constructed anew, then swapped in together with the added ones in one step;
+        commands keep flowing to every other target meanwhile. Replaced and removed
+        adapters are drained (up to drain_timeout seconds) and cleaned up afterwards.
+        Other settings (cache_ttl, max_concurrency, sampling) take effect without
+        rebuilding the adapter. An adapter that fails to construct is reported and
+        its target keeps the old adapter.
+        Returns {"added", "removed", "replaced", "updated", "failed"} target lists,
+        or None if the file could not be read.
+        """
+        path = adapter_config_path or self.config_path
+        with self._reload_lock:
+            try:
+                config = self._read_config(path)
+            except (OSError, ValueError) as e:
+                logging.error(f"Config reload failed, keeping the current configuration: {e}")
+                return None
+            if self.targets is not None:
+                config = {target: info for target, info in config.items() if target in self.targets}
+            old = self.config
+            report = {"added": [], "removed": [], "replaced": [], "updated": [], "failed": []}
+            rebuild = {}
+            for target, info in config.items():
+                previous = old.get(target)
+                if previous == info:
+                    continue
+                if is_group(info):
+                    # Groups have no adapter; only an adapter the group replaces is retired below.
+                    if previous is None:
+                        report["added"].append(target)
+                    else:
+                        report["updated" if is_group(previous) else "replaced"].append(target)
+                    continue
+                if previous is None:
+                    kind = "added"
+                elif previous.get("module") != info.get("module") or previous.get("params", {}) != info.get("params", {}):
+                    kind = "replaced"
+                else:
+                    report["updated"].append(target)
+                    continue
+                rebuild[target] = kind
+            report["removed"] = [target for target in old if target not in config]
+
+            # Construct outside the adapters lock; routing continues meanwhile.
+            constructed, classes, deferred = {}, {}, {}
+            for target, kind in rebuild.items():
+                adapter_class = self._resolve_adapter_class(target, config[target])
+                params = config[target].get("params", {})
+                if adapter_class is not None and self.init_mode == "lazy":
+                    deferred[target] = (adapter_class, params)
+                    self.init_report[target] = {"status": "deferred", "seconds": 0.0, "error": None}
+                else:
+                    adapter = None
+                    if adapter_class is not None:
+                        adapter = self._construct_adapter(target, adapter_class, params)
+                    if adapter is None:
+                        report["failed"].append(target)
+                        # Keep the old entry so the next reload retries the target.
+                        if target in old:
+                            config[target] = old[target]
+                        else:
+                            del config[target]
+                        continue
+                    constructed[target] = adapter
+                classes[target] = adapter_class
+                report[kind].append(target)
+
+            with self._adapters_lock:
+                retired = {}
+                adapters = dict(self.adapters)
+                for target in report["removed"] + report["replaced"]:
+                    adapter = adapters.pop(target, None)
+                    if adapter is not None:
+                        retired[target] = adapter
+                        self._retire(adapter)
+                    self.adapter_classes.pop(target, None)
+                    self._deferred.pop(target, None)
+                adapters.update(constructed)
+                self.adapter_classes.update(classes)
+                for target, spec in deferred.items():
+                    self._deferred_locks.setdefault(target, Lock())
+                    self._deferred[target] = spec
+                self.adapters = adapters
+                self.config = config
+                self.groups = load_groups(config)
+                self._rebuild_dispatch()
+                self.validator.rebuild(self.adapter_classes)
+                self.observe_cache.ttls = {
+                    target: info["cache_ttl"] for target, info in config.items() if "cache_ttl" in info
+                }
+
+            for target, adapter in retired.items():
+                self._detach_events(target, adapter)
+            for target, adapter in constructed.items():
+                self._attach_events(target, adapter)
+            for target in report["removed"] + report["replaced"] + report["updated"]:
+                self.observe_cache.invalidate(target)
+            for target in report["removed"] + report["replaced"]:
+                self.circuit_breaker.reset(target)
+            if self.sampler is not None:
+                self.sampler.reconcile(config, reset=set(report["replaced"]))
+
+            deadline = time.monotonic() + drain_timeout
+            for target, adapter in retired.items():
+                if not self.drain_adapter(adapter, max(deadline - time.monotonic(), 0)):
+                    logging.warning(f"Adapter '{target}' still had commands running after {drain_timeout}s; cleaning up anyway")
+                self._cleanup_adapter(target, adapter)
+                with self._in_flight_condition:
+                    self._retired.discard(id(adapter))
+
+            if any(report.values()):
+                logging.info(f"Reloaded {path}: {report}")
+                for listener in self.reload_listeners:
+                    listener(report)
+            return report
+
+    def _rebuild_dispatch(self):
+        """
+        Compiles the dispatch index from the registered adapters' handlers and swaps
+        it in one step. Adapters that implement execute themselves have no entries
+        and are routed through get_adapter instead.
+        """
+        dispatch = {}
+        for target, adapter in self.adapters.items():
+            handlers = getattr(adapter, "handlers", None)
+            if handlers is None:
+                continue
+            for (action, property), handler in handlers().items():
+                dispatch[(action, target, property)] = (adapter, handler)
+        self.dispatch = dispatch
+
+    def get_adapter(self, target):
+        """
+        Returns the adapter for target, constructing it first if its initialization
+        was deferred (lazy mode). Returns None if there is no usable adapter.
+        """
+        adapter = self.adapters.get(target)
+        if adapter is not None or target not in self._deferred_locks:
+            return adapter
+        with self._deferred_locks[target]:
+            adapter = self.adapters.get(target)
+            if adapter is None and target in self._deferred:
+                adapter_class, params = self._deferred.pop(target)
+                adapter = self._construct_adapter(target, adapter_class, params)
+                if adapter is not None:
+                    self._register_adapter(target, adapter)
+            return adapter
+
+    def get_init_report(self):
+        """
+        Returns per-adapter initialization results:
+        {target: {"status", "seconds", "error"}} where status is "loaded", "failed",
+        "pending" (still initializing in the background) or "deferred" (lazy mode).
+        """
+        return {target: dict(entry) for target, entry in self.init_report.items()}
+
+    def decode_command(self, command):
+        """
+        Returns a command given as str or bytes decoded with the router's codec.
+        Parsed commands (dicts and Command objects) are returned unchanged.
+        Raises codec.DecodeError for malformed input.
+        """
+        if isinstance(command, (str, bytes, bytearray, memoryview)):
+            return self.codec.decode(command)
+        return command
+
+    def _metric_labels(self, command):
+        """Returns (target, action) metric labels for a parsed command."""
+        if not isinstance(command, (dict, Command)):
+            return "unknown", "unknown"
+        target = command.get("target")
+        action = command.get("action")
+        if not isinstance(target, str) or (target not in self.adapter_classes and target not in self.groups):
+            target = "unknown"
+        if not isinstance(action, str) or action not in ACTION_LABELS:
+            action = "unknown"
+        return target, action
+
+    def _record_response(self, response):
+        """Counts error responses by error code and returns the response unchanged."""
+        if isinstance(response, dict) and "error" in response:
+            try:
+                self.errors_total.labels(str(response["error"]["code"])).inc()
+            except (KeyError, TypeError):
+                pass
+        return response
+
     def _validate_command_schema(self, command):
         """
         Validates the command against its schema.
         Returns an object with is_valid and errors attributes.
         """
-        validator = get_validator(command)
-        if not validator:
-            return ValidatorResult(False, ["No schema defined for this command."])
-        errors = sorted(validator.iter_errors(command), key=lambda e: e.path)
-        if errors:
-            error_messages = [error.message for error in errors]
-            return ValidatorResult(False, error_messages)
-        return ValidatorResult(True, [])
-
-    def route_command(self, command_string):
-        """Routes the command to the appropriate adapter."""
-        try:
-            command = json.loads(command_string)
-            # Add schema validation
-            validation_result = self._validate_command_schema(command)
-            if not validation_result.is_valid:
-                return Error(ErrorCode.INVALID_COMMAND, "; ".join(validation_result.errors)).to_dict()
+        return self.validator.validate(command)
+
+    def _prepare_command(self, command, labels=None):
+        """
+        Validates a parsed command, runs the middleware chain and resolves the adapter.
+        Returns a (command, target, adapter, handler, chain) tuple, or a response dict
+        if the command cannot be routed or was answered by a middleware. handler is
+        the bound method registered for the command, or the adapter's execute.
+        :param labels: The command's _metric_labels, if the caller already has them.
+        """
+        if not isinstance(command, (dict, Command)):
+            return Error(ErrorCode.INVALID_COMMAND, "Command must be a JSON object").to_dict()
 
-            # Execute middleware chain
-            command = self._execute_middleware_chain(command)
+        # Add schema validation
+        start = time.perf_counter()
+        validation_result = self._validate_command_schema(command)
+        validated = time.perf_counter()
+        if labels is None:
+            labels = self._metric_labels(command)
+        self.stage_seconds.labels("validate", *labels).observe(validated - start)
+        if not validation_result.is_valid:
+            return Error(ErrorCode.INVALID_COMMAND, "; ".join(validation_result.errors)).to_dict()
 
-            action = command.get("action")
-            target = command.get("target")
+        # Execute middleware chain
+        command, chain, response = self._execute_middleware_chain(command)
+        self.stage_seconds.labels("middleware", *labels).observe(time.perf_counter() - validated)
+        if response is not None:
+            return self._handle_result(response)
 
-            # Validate action
+        action = command.get("action")
+        target = command.get("target")
+
+        try:
+            adapter, handler = self.dispatch[(action, target, command.get("property"))]
+        except (KeyError, TypeError):
+            # Not in the dispatch index: an adapter without handlers, one not yet
+            # constructed (lazy mode), or a command no adapter handles.
             try:
-                action_enum = Action(action)
+                Action(action)
             except ValueError:
                 error = Error(ErrorCode.UNKNOWN_ACTION, f"Invalid action: {action}")
                 logging.warning(error.to_dict())
                 return error.to_dict()
 
-            adapter = self.adapters.get(target)
-            if adapter:
-                logging.info(f"Routing command to adapter '{target}': {command}")
-                result = adapter.execute(command)
-                if isinstance(result, Error):
-                    # Adapter returned an Error instance
-                    standardized_error = Error(
-                        code=result.code,
-                        message=result.message
-                    )
-                    logging.error(standardized_error.to_dict())
-                    return standardized_error.to_dict()
-                else:
-                    logging.info(f"Adapter response: {result}")
-                    return result
-            else:
+            adapter = self.get_adapter(target)
+            if not adapter:
                 error = Error(ErrorCode.UNKNOWN_TARGET, f"No adapter found for target: {target}")
                 logging.warning(error.to_dict())
                 return error.to_dict()
+            handler = adapter.execute
+        if not self.circuit_breaker.allow(target):
+            # The device failed its health checks; fail fast instead of waiting on it.
+            error = Error(ErrorCode.ADAPTER_EXECUTION_FAILED, f"Adapter '{target}' is unavailable (circuit open)")
+            logging.warning(error.to_dict())
+            return error.to_dict()
+        return command, target, adapter, handler, chain
+
+    def _group_for(self, command):
+        """Returns the TargetGroup a parsed command is addressed to, or None."""
+        if not self.groups or not isinstance(command, (dict, Command)):
+            return None
+        target = command.get("target")
+        return self.groups.get(target) if isinstance(target, str) else None
+
+    def _prepare_group_command(self, command):
+        """
+        Runs a group command's own middleware chain, once for the whole group.
+        Returns (command, chain), or a response dict if the command was rejected or answered.
+        """
+        try:
+            Action(command.get("action"))
+        except ValueError:
+            error = Error(ErrorCode.UNKNOWN_ACTION, f"Invalid action: {command.get('action')}")
+            logging.warning(error.to_dict())
+            return error.to_dict()
+        command, chain, response = self._execute_middleware_chain(command)
+        if response is not None:
+            return self._handle_result(response)
+        return command, chain
 
-        except json.JSONDecodeError:
+    def _member_command(self, command, member):
+        member_command = command.to_dict() if isinstance(command, Command) else dict(command)
+        member_command["target"] = member
+        return member_command
+
+    def _route_member(self, command, member, deadline=None):
+        """
+        Routes one member's copy of a group command: validation, the member's own
+        middleware and execution, without the per-command log lines. The command
+        takes a slot in the member's execution lane, like queued commands do;
+        returns None if no slot came free before deadline (a time.monotonic() value).
+        """
+        try:
+            prepared = self._prepare_command(self._member_command(command, member))
+            if isinstance(prepared, dict):
+                return self._record_response(prepared)
+            member_command, target, adapter, handler, chain = prepared
+            lanes = self.lanes
+            timeout = max(0.0, deadline - time.monotonic()) if deadline is not None else None
+            if lanes is not None and not lanes.enter(target, timeout):
+                return None
+            try:
+                result = self._execute_adapter(target, adapter, member_command, handler)
+            finally:
+                if lanes is not None:
+                    lanes.leave(target)
+            return self._record_response(
+                self._handle_result(result, log_response=False, command=member_command, chain=chain)
+            )
+        except Exception as e:
+            error = Error(ErrorCode.INTERNAL_ERROR, f"An unexpected error occurred on '{member}': {e}")
+            logging.exception(error.to_dict())
+            return self._record_response(error.to_dict())
+
+    def _fan_out_executor(self):
+        if self._group_executor is None:
+            with self._adapters_lock:
+                if self._group_executor is None:
+                    self._group_executor = ThreadPoolExecutor(
+                        max_workers=self.group_workers, thread_name_prefix="GroupFanOut"
+                    )
+        return self._group_executor
+
+    def _route_group(self, group, command):
+        """
+        Sends a command to every member of a group, at most group.max_parallel at
+        a time, and aggregates the responses (see target_groups.aggregate). Members
+        without a response after group.timeout seconds are reported as
+        COMMAND_EXPIRED, and members not started by then are not sent the command.
+        """
+        prepared = self._prepare_group_command(command)
+        if isinstance(prepared, dict):
+            return prepared
+        command, chain = prepared
+        log_command("Fanning out to %d members of group '%s': %s", len(group.members), group.name, command)
+        return self._group_response(group, command, chain, self._fan_out(group, command))
+
+    def _fan_out(self, group, command):
+        """
+        Routes a copy of command to each member of group on the group executor and
+        returns their responses in member order, with None for members that did
+        not answer within group.timeout.
+        """
+        members = group.members
+        responses = [None] * len(members)
+        indices = iter(range(len(members)))
+        indices_lock = Lock()
+        expired = Event()
+        deadline = time.monotonic() + group.timeout
+
+        def work():
+            # Each worker takes the next member until none are left, so
+            # max_parallel workers bound the group's concurrency.
+            while not expired.is_set():
+                with indices_lock:
+                    index = next(indices, None)
+                if index is None:
+                    return
+                responses[index] = self._route_member(command, members[index], deadline)
+
+        if members:
+            executor = self._fan_out_executor()
+            futures = [executor.submit(work) for _ in range(min(group.max_parallel, len(members)))]
+            _, not_done = wait(futures, timeout=group.timeout)
+            if not_done:
+                expired.set()
+        return list(responses)
+
+    def _group_response(self, group, command, chain, responses):
+        result = aggregate(group, responses)
+        response = self._handle_result(result, log_response=False, command=command, chain=chain)
+        if not isinstance(result, Error):
+            log_command("Group '%s' completed: %d succeeded, %d failed", group.name, result["succeeded"], result["failed"])
+        return response
+
+    def _is_fan_out(self, command):
+        """Returns True for commands answered by several adapters: AGGREGATE queries and group targets."""
+        if not isinstance(command, (dict, Command)):
+            return False
+        return command.get("action") == "AGGREGATE" or self._group_for(command) is not None
+
+    def _route_fan_out(self, command):
+        if command.get("action") == "AGGREGATE":
+            return self._route_aggregate(command)
+        return self._route_group(self._group_for(command), command)
+
+    def _prepare_aggregate(self, command):
+        """
+        Checks an AGGREGATE command and runs its middleware chain. Returns
+        (command, chain, group, stats), or a response dict.
+        """
+        group = members_of(self.groups, command.get("target"))
+        try:
+            stats = parse_aggregate(command)
+            if group is None:
+                raise ValueError("AGGREGATE target must be a target, a group or a list of them")
+            if command.get("window") is not None and self.sampler is None:
+                raise ValueError("Window queries require sampling to be started")
+        except ValueError as e:
+            error = Error(ErrorCode.INVALID_COMMAND, str(e))
+            logging.warning(error.to_dict())
+            return error.to_dict()
+        target = command.get("target")
+        chain = self.middleware.chain("AGGREGATE", target if isinstance(target, str) else None)
+        command, response = chain.run_before(command)
+        if response is not None:
+            return self._handle_result(response)
+        return command, chain, group, stats
+
+    def _route_aggregate(self, command):
+        """
+        Answers an AGGREGATE command: reads the property from every target
+        concurrently (or, with a "window", takes the targets' recent samples from
+        the sampling engine) and computes the requested statistics over them.
+        """
+        prepared = self._prepare_aggregate(command)
+        if isinstance(prepared, dict):
+            return prepared
+        command, chain, group, stats = prepared
+        property, window = command.get("property"), command.get("window")
+        if window is None:
+            readings = self._fan_out(group, {"action": "OBSERVE", "property": property})
+        else:
+            readings = self._sampled_windows(group, property, window)
+        return self._aggregate_response(group, command, chain, stats, readings)
+
+    def _sampled_windows(self, group, property, window):
+        """Returns each member's samples from the last window seconds, or an error dict."""
+        readings = []
+        for member in group.members:
+            values = self.sampler.window_values(member, property, window)
+            readings.append(values.to_dict() if isinstance(values, Error) else values)
+        return readings
+
+    def _aggregate_response(self, group, command, chain, stats, readings):
+        """
+        Computes the statistics over the members' readings: OBSERVE responses, or
+        sample arrays for windowed queries. Failed members are listed under "errors".
+        """
+        property = command.get("property")
+        result = aggregate_readings(group, property, stats, readings, command.get("window"))
+        if not isinstance(result, Error):
+            log_command("Aggregated %s over %d targets (%d failed)", property, result["targets"], len(result["errors"]))
+        return self._handle_result(result, log_response=False, command=command, chain=chain)
+
+    def start_sampling(self, max_workers=4):
+        """
+        Starts polling the targets and properties declared under "sampling" in
+        adapters_config.json. OBSERVE commands for sampled properties are then
+        answered from the latest sample, and OBSERVE commands with a "window" (in
+        seconds) return min/max/mean over the recent samples.
+        """
+        if self.sampler is None:
+            self.sampler = SamplingEngine(self, max_workers=max_workers)
+            self.sampler.add_from_config(self.config)
+            self.sampler.start()
+        return self.sampler
+
+    def read_for_sampling(self, target, property, callback):
+        """
+        Reads (target, property) for the sampling engine and passes the result to
+        callback(result), possibly on the completion timer thread. The read skips the
+        observe cache and the samples themselves, but like a routed command it is
+        not started while the target's circuit is open or its adapter is being
+        removed, and it takes a slot in the target's execution lane. Returns False,
+        without calling callback, when the read was not started.
+        """
+        adapter = self.get_adapter(target)
+        if adapter is None or not self.circuit_breaker.allow(target):
+            return False
+        lanes = self.lanes
+        if lanes is not None and not lanes.try_enter(target):
+            return False
+        if not self._acquire(adapter):
+            if lanes is not None:
+                lanes.leave(target)
+            return False
+
+        def finish(result):
+            self._release(adapter)
+            if lanes is not None:
+                lanes.leave(target)
+            callback(result)
+
+        command = {"action": "OBSERVE", "target": target, "property": property}
+        try:
+            if adapter.begin_execute is not None:
+                operation = adapter.begin_execute(command)
+                if not isinstance(operation, Error):
+                    self.completion_timer.schedule(operation, finish)
+                    return True
+                result = operation
+            else:
+                result = adapter.execute(command)
+        except Exception as e:
+            result = Error(ErrorCode.ADAPTER_EXECUTION_FAILED, f"Error sampling '{target}': {e}")
+            logging.error(result.to_dict())
+        finish(result)
+        return True
+
+    def stop_sampling(self):
+        """Stops the background sampling engine."""
+        if self.sampler is not None:
+            self.sampler.stop()
+            self.sampler = None
+
+    def _sampled_result(self, target, command):
+        """
+        Answers an OBSERVE from the sampling engine. Returns None when the command
+        has to go to the adapter.
+        """
+        if "window" in command:
+            if self.sampler is None:
+                return Error(ErrorCode.INVALID_COMMAND, "Window queries require sampling to be started")
+            return self.sampler.query_window(target, command.get("property"), command["window"])
+        if self.sampler is not None:
+            return self.sampler.latest(target, command.get("property"))
+        return None
+
+    def _observe(self, target, command, handler):
+        """Answers an OBSERVE from the sampling engine or through the observe cache."""
+        result = self._sampled_result(target, command)
+        if result is not None:
+            return result
+        return self.observe_cache.get_or_load(target, command.get("property"), lambda: handler(command))
+
+    def _execute_adapter(self, target, adapter, command, handler=None):
+        """
+        Executes a prepared command on its adapter. OBSERVE reads are answered from
+        fresh samples when sampling is running, and otherwise go through the observe
+        cache so identical concurrent reads share one hardware access; any other
+        action invalidates the target's cached reads.
+        :param handler: The command's handler from _prepare_command (default: adapter.execute).
+        """
+        if handler is None:
+            handler = adapter.execute
+        if not self._acquire(adapter):
+            return self._removed_error(target)
+        try:
+            if command.get("action") == "OBSERVE":
+                return self._observe(target, command, handler)
+            result = handler(command)
+            self.observe_cache.invalidate(target)
+            return result
+        finally:
+            self._release(adapter)
+
+    def _handle_result(self, result, log_response=True, command=None, chain=None):
+        """
+        Converts an adapter result into the response returned to the caller, first
+        passing it through the after/on_error hooks of the command's middleware chain.
+        """
+        if chain is not None:
+            result = chain.run_after(command, result)
+        if isinstance(result, Error):
+            # Adapter returned an Error instance
+            standardized_error = Error(
+                code=result.code,
+                message=result.message
+            )
+            logging.error(standardized_error.to_dict())
+            return standardized_error.to_dict()
+        else:
+            if log_response:
+                log_command("Adapter response: %s", result)
+            return result
+
+    def route_command(self, command):
+        """
+        Routes the command to the appropriate adapter.
+        :param command: A JSON string or bytes (decoded with the router's codec), a
+                        parsed dict, or a Command. Parsed commands are not re-serialized.
+        """
+        try:
+            start = time.perf_counter()
+            command = self.decode_command(command)
+            labels = self._metric_labels(command)
+            self.stage_seconds.labels("parse", *labels).observe(time.perf_counter() - start)
+            if self._is_fan_out(command):
+                start = time.perf_counter()
+                response = self._route_fan_out(command)
+                self.stage_seconds.labels("execute", *labels).observe(time.perf_counter() - start)
+                return self._record_response(response)
+            prepared = self._prepare_command(command, labels)
+            if isinstance(prepared, dict):
+                return self._record_response(prepared)
+            if prepared[0] is not command:
+                # A middleware replaced the command.
+                labels = self._metric_labels(prepared[0])
+            command, target, adapter, handler, chain = prepared
+
+            log_command("Routing command to adapter '%s': %s", target, command)
+            start = time.perf_counter()
+            result = self._execute_adapter(target, adapter, command, handler)
+            self.stage_seconds.labels("execute", *labels).observe(time.perf_counter() - start)
+            return self._record_response(self._handle_result(result, command=command, chain=chain))
+
+        except DecodeError:
             error = Error(ErrorCode.INVALID_COMMAND, "Invalid JSON command")
             logging.error(error.to_dict())
-            return error.to_dict()
+            return self._record_response(error.to_dict())
         except Exception as e:
             error = Error(ErrorCode.INTERNAL_ERROR, f"An unexpected error occurred: {e}")
             logging.exception(error.to_dict())
+            return self._record_response(error.to_dict())
+
+    def _parse_batch(self, commands):
+        """
+        Parses a batch given as an encoded array. Returns the list of commands,
+        or an error dict if the batch is malformed.
+        """
+        if isinstance(commands, (str, bytes, bytearray, memoryview)):
+            try:
+                commands = self.codec.decode(commands)
+            except DecodeError:
+                error = Error(ErrorCode.INVALID_COMMAND, "Invalid JSON batch")
+                logging.error(error.to_dict())
+                return error.to_dict()
+        if not isinstance(commands, list):
+            error = Error(ErrorCode.INVALID_COMMAND, "Batch must be a list of commands")
+            logging.error(error.to_dict())
             return error.to_dict()
+        return commands
 
-    def cleanup_all(self):
-        """Cleans up all adapters that have a cleanup method."""
-        for target, adapter in self.adapters.items():
-            if hasattr(adapter, 'cleanup') and callable(adapter.cleanup):
+    def _group_batch(self, commands):
+        """
+        Validates and prepares a batch of commands, grouping them by target.
+        Returns (responses, steps) where responses already holds the errors for
+        commands that could not be routed. steps lists, in input order, dicts
+        mapping each target to an (adapter, indices, commands, chains, handlers)
+        tuple for the commands between two fan-outs, and the (index, command) of
+        each AGGREGATE query or command to a group target. Running the steps in
+        order keeps fan-outs ordered with the commands around them.
+        """
+        responses = [None] * len(commands)
+        groups = {}
+        steps = [groups]
+        for index, command in enumerate(commands):
+            if isinstance(command, (str, bytes, bytearray, memoryview)):
                 try:
-                    adapter.cleanup()
-                    logging.info(f"Cleaned up adapter '{target}'.")
-                except Exception as e:
-                    error = Error(ErrorCode.ADAPTER_EXECUTION_FAILED, f"Error during cleanup of adapter '{target}': {e}")
+                    command = self.codec.decode(command)
+                except DecodeError:
+                    error = Error(ErrorCode.INVALID_COMMAND, "Invalid JSON command")
                     logging.error(error.to_dict())
+                    responses[index] = error.to_dict()
+                    continue
+            if self._is_fan_out(command):
+                groups = {}
+                steps.extend(((index, command), groups))
+                continue
+            prepared = self._prepare_command(command)
+            if isinstance(prepared, dict):
+                responses[index] = prepared
+                continue
+            command, target, adapter, handler, chain = prepared
+            group = groups.get(target)
+            if group is None:
+                group = groups[target] = (adapter, [], [], [], [])
+            group[1].append(index)
+            group[2].append(command)
+            group[3].append(chain)
+            group[4].append(handler)
+        return responses, [step for step in steps if step]
+
+    def _collect_batch_results(self, target, responses, group, results):
+        """Stores the results of one target group into the batch responses."""
+        _, indices, commands, chains, _ = group
+        if len(results) != len(indices):
+            error = Error(
+                ErrorCode.ADAPTER_EXECUTION_FAILED,
+                f"Adapter '{target}' returned {len(results)} results for {len(indices)} commands"
+            )
+            logging.error(error.to_dict())
+            results = [error] * len(indices)
+        for index, result, command, chain in zip(indices, results, commands, chains):
+            responses[index] = self._handle_result(result, log_response=False, command=command, chain=chain)
+        log_command("Adapter '%s' completed batch of %d commands", target, len(indices))
+
+    def _batch_runs(self, commands, handlers):
+        """
+        Splits one target's batched commands into runs of consecutive OBSERVE and
+        non-OBSERVE commands. Yields (is_observe, commands, handlers) in order.
+        """
+        start = 0
+        for end in range(1, len(commands) + 1):
+            observe = commands[start].get("action") == "OBSERVE"
+            if end == len(commands) or (commands[end].get("action") == "OBSERVE") != observe:
+                yield observe, commands[start:end], handlers[start:end]
+                start = end
+
+    def _batch_error(self, target, e):
+        error = Error(ErrorCode.ADAPTER_EXECUTION_FAILED, f"Error executing batch on adapter '{target}': {e}")
+        logging.exception(error.to_dict())
+        return error
+
+    def _execute_batch(self, target, adapter, commands, handlers):
+        """
+        Executes one target's batched commands in order and returns their results.
+        Consecutive non-OBSERVE commands go to the adapter's execute_batch together
+        and invalidate the target's cached reads. OBSERVEs are answered as in
+        _execute_adapter, from samples (including "window" queries) or through the
+        observe cache, so they share cached and in-flight reads.
+        """
+        if not self._acquire(adapter):
+            return [self._removed_error(target)] * len(commands)
+        try:
+            results = []
+            for observe, run, run_handlers in self._batch_runs(commands, handlers):
+                if observe:
+                    for command, handler in zip(run, run_handlers):
+                        try:
+                            results.append(self._observe(target, command, handler))
+                        except Exception as e:
+                            results.append(self._batch_error(target, e))
+                    continue
+                try:
+                    run_results = adapter.execute_batch(run)
+                except Exception as e:
+                    run_results = [self._batch_error(target, e)] * len(run)
+                if len(run_results) != len(run):
+                    # Let _collect_batch_results report the mismatch.
+                    return run_results
+                results.extend(run_results)
+                self.observe_cache.invalidate(target)
+            return results
+        finally:
+            self._release(adapter)
+
+    def route_batch(self, commands):
+        """
+        Routes a batch of commands, handing each adapter its whole group at once.
+        AGGREGATE queries and commands to group targets run in input order: the
+        commands before one are executed before it, and those after it, after.
+        :param commands: An encoded array, or a list of encoded commands, dicts or Commands.
+        Returns a list of responses in the same order as the input commands.
+        """
+        try:
+            commands = self._parse_batch(commands)
+            if isinstance(commands, dict):
+                return self._record_response(commands)
+            responses, steps = self._group_batch(commands)
+            for step in steps:
+                if isinstance(step, tuple):
+                    index, command = step
+                    responses[index] = self._route_fan_out(command)
+                    continue
+                for target, group in step.items():
+                    adapter, _, group_commands, _, handlers = group
+                    log_command("Routing batch of %d commands to adapter '%s'", len(group_commands), target)
+                    results = self._execute_batch(target, adapter, group_commands, handlers)
+                    self._collect_batch_results(target, responses, group, results)
+            for response in responses:
+                self._record_response(response)
+            return responses
 
-class ValidatorResult:
-    def __init__(self, is_valid, errors):
-        self.is_valid = is_valid
-        self.errors = errors
+        except Exception as e:
+            error = Error(ErrorCode.INTERNAL_ERROR, f"An unexpected error occurred: {e}")
+            logging.exception(error.to_dict())
+            return self._record_response(error.to_dict())
+
+    def _execute_adapter_deferred(self, target, adapter, command, callback, handler=None):
+        """
+        Executes a prepared command, completing split-phase operations on the
+        completion timer. callback(result) is called exactly once.
+        """
+        if adapter.begin_execute is None or "window" in command:
+            callback(self._execute_adapter(target, adapter, command, handler))
+            return
+        if not self._acquire(adapter):
+            callback(self._removed_error(target))
+            return
+        finish = callback
+
+        def callback(result):
+            self._release(adapter)
+            finish(result)
+
+        def start(done):
+            try:
+                operation = adapter.begin_execute(command)
+            except Exception as e:
+                operation = Error(ErrorCode.ADAPTER_EXECUTION_FAILED, f"Error starting command on adapter '{target}': {e}")
+                logging.exception(operation.to_dict())
+            if isinstance(operation, Error):
+                done(operation)
+            else:
+                self.completion_timer.schedule(operation, done)
+
+        if command.get("action") == "OBSERVE":
+            result = self._sampled_result(target, command)
+            if result is not None:
+                callback(result)
+                return
+            self.observe_cache.get_or_load_deferred(target, command.get("property"), start, callback)
+        else:
+            def done(result):
+                self.observe_cache.invalidate(target)
+                callback(result)
+            start(done)
+
+    def route_command_deferred(self, command, callback):
+        """
+        Routes the command like route_command, but passes the response to
+        callback(response) instead of returning it. Adapters that support split-phase
+        execution are started on this thread and completed on the completion timer,
+        so the calling thread is released during the device's wait time.
+        """
+        try:
+            start = time.perf_counter()
+            command = self.decode_command(command)
+            labels = self._metric_labels(command)
+            self.stage_seconds.labels("parse", *labels).observe(time.perf_counter() - start)
+            if self._is_fan_out(command):
+                # The fan-out itself runs on the group executor; this thread waits for it.
+                callback(self._record_response(self._route_fan_out(command)))
+                return
+            prepared = self._prepare_command(command, labels)
+            if isinstance(prepared, dict):
+                callback(self._record_response(prepared))
+                return
+            if prepared[0] is not command:
+                labels = self._metric_labels(prepared[0])
+            command, target, adapter, handler, chain = prepared
+
+            log_command("Routing command to adapter '%s': %s", target, command)
+            execute = self.stage_seconds.labels("execute", *labels)
+            start = time.perf_counter()
+
+            def complete(result):
+                execute.observe(time.perf_counter() - start)
+                callback(self._record_response(self._handle_result(result, command=command, chain=chain)))
+
+            self._execute_adapter_deferred(target, adapter, command, complete, handler)
+
+        except DecodeError:
+            error = Error(ErrorCode.INVALID_COMMAND, "Invalid JSON command")
+            logging.error(error.to_dict())
+            callback(self._record_response(error.to_dict()))
+        except Exception as e:
+            error = Error(ErrorCode.INTERNAL_ERROR, f"An unexpected error occurred: {e}")
+            logging.exception(error.to_dict())
+            callback(self._record_response(error.to_dict()))
+
+    def cleanup_all(self):
+        """Cleans up all adapters that have a cleanup method."""
+        self.stop_sampling()
+        self.completion_timer.stop()
+        if self._group_executor is not None:
+            self._group_executor.shutdown(wait=False)
+        for target, adapter in self.adapters.items():
+            self._cleanup_adapter(target, adapter)
+        self.events.close()
@@ -7,6 +7,9 @@ class ErrorCode(Enum):
     ADAPTER_INITIALIZATION_FAILED = 1004
     ADAPTER_EXECUTION_FAILED = 1005
     INTERNAL_ERROR = 1006
+    COMMAND_EXPIRED = 1007
+    QUEUE_FULL = 1008
+    JOURNAL_WRITE_FAILED = 1009
 
 class Error:
     def __init__(self, code: ErrorCode, message: str):
@@ -0,0 +1,200 @@
+import logging
+import time
+from collections import deque
+from itertools import count
+from queue import SimpleQueue
+from threading import Condition, Lock, Thread, current_thread
+from metrics import get_registry
+
+class DeviceEvent:
+    """A value pushed by an adapter, e.g. a GPIO edge."""
+    __slots__ = ("target", "property", "value", "timestamp", "seq")
+
+    def __init__(self, target, property, value, timestamp, seq):
+        self.target = target
+        self.property = property
+        self.value = value
+        self.timestamp = timestamp
+        self.seq = seq
+
+    def to_dict(self):
+        return {
+            "target": self.target,
+            "property": self.property,
+            "value": self.value,
+            "timestamp": self.timestamp,
+            "seq": self.seq
+        }
+
+    def __repr__(self):
+        return f"DeviceEvent({self.to_dict()!r})"
+
+class Subscription:
+    """
+    One subscriber's bounded buffer. When it is full the oldest event is dropped,
+    so a slow subscriber loses events instead of slowing the publisher down.
+    Events are read with get, or delivered to the callback given to subscribe.
+    """
+
+    def __init__(self, bus, target, property, max_buffer, callback):
+        self.bus = bus
+        self.target = target
+        self.property = property
+        self.callback = callback
+        self.dropped = 0
+        self.closed = False
+        self._events = deque()
+        self._max_buffer = max_buffer
+        self._condition = Condition(Lock())
+        self._scheduled = False
+
+    def _offer(self, event):
+        """Buffers an event without blocking. Returns True if one had to be dropped."""
+        with self._condition:
+            if self.closed:
+                return False
+            dropped = len(self._events) >= self._max_buffer
+            if dropped:
+                self._events.popleft()
+                self.dropped += 1
+            self._events.append(event)
+            if self.callback is None:
+                self._condition.notify()
+                return dropped
+            if self._scheduled:
+                return dropped
+            self._scheduled = True
+        self.bus._ready.put(self)
+        return dropped
+
+    def get(self, timeout=None):
+        """Returns the next event, or None on timeout or once the subscription is closed."""
+        with self._condition:
+            if not self._events and not self.closed:
+                self._condition.wait(timeout)
+            return self._events.popleft() if self._events else None
+
+    def drain(self):
+        """Returns every buffered event without waiting."""
+        with self._condition:
+            events = list(self._events)
+            self._events.clear()
+            return events
+
+    def _take_for_callback(self):
+        with self._condition:
+            events = list(self._events)
+            self._events.clear()
+            self._scheduled = False
+            return events
+
+    def close(self):
+        """Unsubscribes; a blocked get returns None."""
+        self.bus.unsubscribe(self)
+
+    def __len__(self):
+        with self._condition:
+            return len(self._events)
+
+class EventBus:
+    def __init__(self, metrics=None):
+        """
+        Fans out adapter events to subscribers by target and property. publish never
+        blocks on subscribers: each one has its own bounded buffer, and callbacks
+        run on the bus's dispatcher thread rather than the publishing thread (for
+        GPIO, the library's interrupt thread).
+        :param metrics: MetricsRegistry to record into (default: the process-wide registry).
+        """
+        # {(target, property): tuple of subscriptions}; None matches anything.
+        # Replaced as a whole on (un)subscribe so publish reads it without a lock.
+        self._subscriptions = {}
+        self._lock = Lock()
+        self._seq = count(1)
+        self._ready = SimpleQueue()
+        self._dispatcher = None
+        metrics = metrics if metrics is not None else get_registry()
+        self.published_total = metrics.counter(
+            "prism_events_published_total", "Events published by adapters.", ("target",)
+        )
+        self.dropped_total = metrics.counter(
+            "prism_events_dropped_total", "Events dropped from full subscriber buffers.", ("target",)
+        )
+
+    def subscribe(self, target=None, property=None, callback=None, max_buffer=256):
+        """
+        Subscribes to events for a target and property; None matches any value.
+        :param callback: Called with each DeviceEvent on the dispatcher thread. Without
+                         a callback, read events with Subscription.get.
+        :param max_buffer: Events buffered for this subscriber before the oldest is dropped.
+        """
+        subscription = Subscription(self, target, property, max_buffer, callback)
+        with self._lock:
+            key = (target, property)
+            subscriptions = dict(self._subscriptions)
+            subscriptions[key] = subscriptions.get(key, ()) + (subscription,)
+            self._subscriptions = subscriptions
+            if callback is not None and self._dispatcher is None:
+                self._dispatcher = Thread(target=self._dispatch, args=(self._ready,), daemon=True,
+                                          name="EventDispatcher")
+                self._dispatcher.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            key = (subscription.target, subscription.property)
+            remaining = tuple(s for s in self._subscriptions.get(key, ()) if s is not subscription)
+            subscriptions = dict(self._subscriptions)
+            if remaining:
+                subscriptions[key] = remaining
+            else:
+                subscriptions.pop(key, None)
+            self._subscriptions = subscriptions
+        with subscription._condition:
+            subscription.closed = True
+            subscription._condition.notify_all()
+
+    def publish(self, target, property, value, timestamp=None):
+        """Delivers an event to every matching subscriber's buffer. Never blocks."""
+        event = DeviceEvent(target, property, value, timestamp if timestamp is not None else time.time(),
+                            next(self._seq))
+        self.published_total.labels(target).inc()
+        subscriptions = self._subscriptions
+        if not subscriptions:
+            return event
+        for key in ((target, property), (target, None), (None, property), (None, None)):
+            for subscription in subscriptions.get(key, ()):
+                if subscription._offer(event):
+                    self.dropped_total.labels(target).inc()
+        return event
+
+    def subscriber_count(self):
+        return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def close(self):
+        """
+        Closes every subscription and stops the dispatcher thread once it has
+        finished the callback it is running. A later subscribe starts a new one.
+        """
+        with self._lock:
+            subscriptions = [s for group in self._subscriptions.values() for s in group]
+            dispatcher, self._dispatcher = self._dispatcher, None
+            ready, self._ready = self._ready, SimpleQueue()
+        for subscription in subscriptions:
+            self.unsubscribe(subscription)
+        if dispatcher is not None:
+            ready.put(None)
+            if dispatcher is not current_thread():
+                dispatcher.join()
+
+    def _dispatch(self, ready):
+        while True:
+            subscription = ready.get()
+            if subscription is None:
+                return
+            for event in subscription._take_for_callback():
+                if subscription.closed:
+                    break
+                try:
+                    subscription.callback(event)
+                except Exception:
+                    logging.exception(f"Event subscriber for {subscription.target}/{subscription.property} failed")
@@ -1,10 +1,11 @@
-import json
 import time
+from commands import Command
 from core import CommandRouter
 from errors import Error  # Ensure Error is imported
 from middleware.logging_middleware import LoggingMiddleware
 from health_monitor import AdapterHealthCheck
 from command_queue import CommandQueue
+from config_watcher import ConfigWatcher
 
 # Initialize the Command Router with the adapters configuration
 router = CommandRouter('adapters_config.json')
@@ -15,48 +16,42 @@ router.add_middleware(logging_middleware)
 
 # Initialize Health Monitoring
 health_monitor = AdapterHealthCheck(interval=60)  # Check every 60 seconds
-health_monitor.start_monitoring(router.adapters)
+health_monitor.start_monitoring(router.adapters, router.circuit_breaker)
+router.reload_listeners.append(lambda report: health_monitor.update_adapters(router.adapters))
 
 # Initialize Command Queue
-command_queue = CommandQueue(router, worker_count=3)
+# ACTUATE commands are journaled and replayed if the process dies before running them
+command_queue = CommandQueue(router, worker_count=3, journal='journal')
 command_queue.start()
 
+# Apply edits to adapters_config.json without restarting
+config_watcher = ConfigWatcher(router)
+config_watcher.start()
+
+# Motion is pushed on GPIO edges instead of being polled with OBSERVE
+router.subscribe("motion_sensor_1", "motion_detected",
+                 callback=lambda event: print(f"Motion: {event.value}"))
+
 # Register cleanup function to be called on exit
 import atexit
-atexit.register(lambda: [command_queue.stop(), health_monitor.stop_monitoring(), router.cleanup_all()])
+atexit.register(lambda: [config_watcher.stop(), command_queue.stop(), health_monitor.stop_monitoring(), router.cleanup_all()])
 
-# Define commands
-read_motion_command = json.dumps({
-    "action": "OBSERVE",
-    "target": "motion_sensor_1",
-    "property": "motion_detected"
-})
+# Define commands. The router accepts JSON strings, dicts or Command objects;
+# parsed commands are routed as they are, without a round trip through JSON.
+read_motion_command = Command("OBSERVE", "motion_sensor_1", "motion_detected")
 
-actuate_light_on_command = json.dumps({
-    "action": "ACTUATE",
-    "target": "living_room_light",
-    "property": "state",
-    "value": "ON"
-})
+actuate_light_on_command = Command("ACTUATE", "living_room_light", "state", "ON")
 
-actuate_light_off_command = json.dumps({
+actuate_light_off_command = {
     "action": "ACTUATE",
     "target": "living_room_light",
     "property": "state",
     "value": "OFF"
-})
+}
 
-read_temp_command = json.dumps({
-    "action": "OBSERVE",
-    "target": "temperature_sensor_1",
-    "property": "current_temperature"
-})
+read_temp_command = Command("OBSERVE", "temperature_sensor_1", "current_temperature")
 
-read_humidity_command = json.dumps({
-    "action": "OBSERVE",
-    "target": "humidity_sensor_1",
-    "property": "current_humidity"
-})
+read_humidity_command = Command("OBSERVE", "humidity_sensor_1", "current_humidity")
 
 # Enqueue commands for processing
 commands = [
@@ -77,6 +72,7 @@ try:
 except KeyboardInterrupt:
     print("\nShutting down gracefully.")
 finally:
+    config_watcher.stop()
     command_queue.stop()
     health_monitor.stop_monitoring()
     router.cleanup_all()
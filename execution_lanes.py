@@ -0,0 +1,154 @@
+import time
+from collections import deque
+from threading import Condition, Lock
+
+class ExecutionLane:
+    """Per-target execution slot counter with a queue of commands waiting for a slot."""
+
+    def __init__(self, target, max_concurrency=None):
+        self.target = target
+        self.max_concurrency = max_concurrency
+        self.active = 0
+        self.pending = deque()
+
+class ExecutionLanes:
+    def __init__(self, router, default_max_concurrency=None, requeue=None):
+        """
+        Initializes the per-target execution lanes.
+        :param router: CommandRouter whose adapters and config define the lanes.
+        :param default_max_concurrency: Limit for targets whose adapter and config
+                                        declare none. None means unlimited.
+        :param requeue: Called with each parked command woken by leave, to hand it
+                        back to the scheduler.
+        """
+        self.router = router
+        self.default_max_concurrency = default_max_concurrency
+        self.requeue = requeue
+        self.lanes = {}
+        self._lock = Lock()
+        # Notified whenever a slot is freed, for callers blocked in enter.
+        self._freed = Condition(self._lock)
+
+    def _max_concurrency(self, target):
+        """
+        Resolves a target's concurrency limit: "max_concurrency" in
+        adapters_config.json wins over the adapter's MAX_CONCURRENCY.
+        """
+        limit = self.router.config.get(target, {}).get("max_concurrency")
+        if limit is None:
+            adapter_class = self.router.adapter_classes.get(target)
+            limit = getattr(adapter_class, "MAX_CONCURRENCY", None)
+        if limit is None:
+            limit = self.default_max_concurrency
+        return limit
+
+    def _lane(self, target):
+        """
+        Returns target's lane, creating it on first use. Returns None for targets
+        the router has no adapter for, so unknown targets do not grow the lane map;
+        the router rejects their commands anyway.
+        """
+        lane = self.lanes.get(target)
+        if lane is None and target in self.router.adapter_classes:
+            lane = self.lanes[target] = ExecutionLane(target, self._max_concurrency(target))
+        return lane
+
+    def try_acquire(self, target, item):
+        """
+        Takes an execution slot for target. Returns True if the caller may run the
+        item now; otherwise the item is parked in the lane and False is returned.
+        """
+        with self._lock:
+            lane = self._lane(target)
+            if lane is None:
+                return True
+            if lane.max_concurrency is None or lane.active < lane.max_concurrency:
+                lane.active += 1
+                return True
+            lane.pending.append(item)
+            return False
+
+    def release(self, target, handoff=True):
+        """
+        Releases an execution slot for target. Returns (next, parked). With handoff,
+        next is the oldest parked command and the slot passes straight to it for the
+        caller to run. Every other parked command is returned in parked, for the
+        caller to hand back to the scheduler, which orders them by priority, aging
+        and deadline again. Without handoff the slot is freed and next is None.
+        """
+        with self._lock:
+            lane = self.lanes.get(target)
+            if lane is None:
+                return None, []
+            parked = list(lane.pending)
+            lane.pending.clear()
+            if handoff and parked:
+                return parked[0], parked[1:]
+            if lane.active:
+                lane.active -= 1
+                self._freed.notify_all()
+            return None, parked
+
+    def enter(self, target, timeout=None):
+        """
+        Takes an execution slot for work outside the queue, such as a group
+        member's command, without parking anything. Waits up to timeout seconds
+        (None waits indefinitely) for a slot to come free; returns False if none did.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._lock:
+            while True:
+                lane = self._lane(target)
+                if lane is None:
+                    return True
+                if lane.max_concurrency is None or lane.active < lane.max_concurrency:
+                    lane.active += 1
+                    return True
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._freed.wait(remaining)
+
+    def try_enter(self, target):
+        """Takes an execution slot like enter, without waiting. Returns False if the lane is full."""
+        return self.enter(target, timeout=0)
+
+    def leave(self, target):
+        """Releases a slot taken with enter or try_enter, handing parked commands back to the scheduler."""
+        _, parked = self.release(target, handoff=False)
+        for item in parked:
+            self.requeue(item)
+
+    def get_depths(self):
+        """Returns {target: {"active", "pending", "max_concurrency"}} for every lane."""
+        with self._lock:
+            return {
+                target: {
+                    "active": lane.active,
+                    "pending": len(lane.pending),
+                    "max_concurrency": lane.max_concurrency
+                }
+                for target, lane in self.lanes.items()
+            }
+
+    def refresh(self, targets):
+        """
+        Re-resolves the concurrency limit of the given targets' lanes, e.g. after
+        their config changed, and drops the lanes of targets that were removed.
+        Returns the commands parked in those lanes, for the caller to hand back to
+        the scheduler; they acquire a slot again under the new limit.
+        """
+        parked = []
+        with self._lock:
+            for target in targets:
+                lane = self.lanes.get(target)
+                if lane is None:
+                    continue
+                parked.extend(lane.pending)
+                lane.pending.clear()
+                if target in self.router.adapter_classes:
+                    lane.max_concurrency = self._max_concurrency(target)
+                else:
+                    del self.lanes[target]
+            self._freed.notify_all()
+        return parked
@@ -0,0 +1,125 @@
+"""
+In-process stand-in for RPi.GPIO, used when the real library is not available.
+
+Implements the subset of the RPi.GPIO API the adapters use. Input levels are
+set with simulate_input(pin, value), which fires edge callbacks registered with
+add_event_detect on a background thread, honouring bouncetime like the real
+library does.
+"""
+import time
+import traceback
+from queue import SimpleQueue
+from threading import Lock, Thread
+
+BCM = 11
+BOARD = 10
+IN = 1
+OUT = 0
+LOW = 0
+HIGH = 1
+PUD_OFF = 20
+PUD_DOWN = 21
+PUD_UP = 22
+RISING = 31
+FALLING = 32
+BOTH = 33
+
+_lock = Lock()
+_mode = None
+_levels = {}
+_detectors = {}
+_callbacks = SimpleQueue()
+_thread = None
+
+class _Detector:
+    __slots__ = ("edge", "callbacks", "bouncetime", "last_fired")
+
+    def __init__(self, edge, bouncetime):
+        self.edge = edge
+        self.callbacks = []
+        self.bouncetime = bouncetime
+        self.last_fired = None
+
+def setmode(mode):
+    global _mode
+    _mode = mode
+
+def getmode():
+    return _mode
+
+def setwarnings(flag):
+    pass
+
+def setup(pin, direction, pull_up_down=PUD_OFF, initial=None):
+    with _lock:
+        if initial is not None:
+            _levels[pin] = initial
+        else:
+            _levels.setdefault(pin, HIGH if pull_up_down == PUD_UP else LOW)
+
+def input(pin):
+    with _lock:
+        if pin not in _levels:
+            raise RuntimeError(f"You must setup() GPIO channel {pin} first")
+        return _levels[pin]
+
+def output(pin, value):
+    simulate_input(pin, value)
+
+def add_event_detect(pin, edge, callback=None, bouncetime=None):
+    global _thread
+    with _lock:
+        if pin in _detectors:
+            raise RuntimeError(f"Conflicting edge detection already enabled for GPIO channel {pin}")
+        detector = _detectors[pin] = _Detector(edge, bouncetime)
+        if callback is not None:
+            detector.callbacks.append(callback)
+        if _thread is None:
+            _thread = Thread(target=_run_callbacks, daemon=True, name="FakeGPIO")
+            _thread.start()
+
+def add_event_callback(pin, callback):
+    with _lock:
+        if pin not in _detectors:
+            raise RuntimeError("Add event detection using add_event_detect first before adding a callback")
+        _detectors[pin].callbacks.append(callback)
+
+def remove_event_detect(pin):
+    with _lock:
+        _detectors.pop(pin, None)
+
+def cleanup(pin=None):
+    with _lock:
+        pins = list(_levels) if pin is None else [pin]
+        for channel in pins:
+            _levels.pop(channel, None)
+            _detectors.pop(channel, None)
+
+def simulate_input(pin, value):
+    """Drives an input pin to value, firing edge callbacks if the level changed."""
+    value = HIGH if value else LOW
+    with _lock:
+        previous = _levels.get(pin, LOW)
+        _levels[pin] = value
+        detector = _detectors.get(pin)
+        if detector is None or previous == value:
+            return
+        if detector.edge == RISING and value != HIGH or detector.edge == FALLING and value != LOW:
+            return
+        now = time.monotonic()
+        if (detector.bouncetime and detector.last_fired is not None
+                and (now - detector.last_fired) * 1000 < detector.bouncetime):
+            return
+        detector.last_fired = now
+        callbacks = list(detector.callbacks)
+    for callback in callbacks:
+        _callbacks.put((callback, pin))
+
+def _run_callbacks():
+    while True:
+        callback, pin = _callbacks.get()
+        try:
+            callback(pin)
+        except Exception:
+            # RPi.GPIO prints callback exceptions and keeps going.
+            traceback.print_exc()
@@ -1,39 +1,196 @@
 import time
 import logging
-from threading import Thread
+from concurrent.futures import ThreadPoolExecutor
+from threading import Condition, Thread
+from errors import Error
+from metrics import get_registry
+
+class _CheckState:
+    """Scheduling state for one adapter's health checks."""
+    __slots__ = ("name", "adapter", "interval", "due", "future", "started", "deadline", "timed_out")
+
+    def __init__(self, name, adapter, interval):
+        self.name = name
+        self.adapter = adapter
+        self.interval = interval
+        self.due = time.monotonic()
+        self.future = None
+        self.started = None
+        self.deadline = None
+        self.timed_out = False
 
 class AdapterHealthCheck:
-    def __init__(self, interval=60):  # Check every minute
+    def __init__(self, interval=60, timeout=5.0, max_interval=None, failure_interval=5.0,
+                 backoff=2.0, max_workers=8, metrics=None):
+        """
+        Initializes the health monitor. Checks run concurrently on a thread pool,
+        so one slow device does not delay the others.
+        :param interval: Seconds between checks of a device that just recovered or started.
+        :param timeout: Seconds a check may take before the device counts as unhealthy.
+        :param max_interval: Upper bound for the interval of a healthy device, which is
+                             multiplied by backoff after every healthy check
+                             (default: 4 * interval).
+        :param failure_interval: Seconds between checks of an unhealthy device.
+        :param max_workers: Threads running health checks.
+        :param metrics: MetricsRegistry to record into (default: the process-wide registry).
+        """
         self.interval = interval
+        self.timeout = timeout
+        self.max_interval = max_interval if max_interval is not None else interval * 4
+        self.failure_interval = failure_interval
+        self.backoff = backoff
+        self.max_workers = max_workers
         self.status = {}
         self.adapters = {}
+        self.circuit_breaker = None
         self.running = False
+        self.worker = None
+        self._states = {}
+        self._condition = Condition()
+        self._executor = None
+        metrics = metrics if metrics is not None else get_registry()
+        self.check_seconds = metrics.histogram(
+            "prism_health_check_seconds", "Duration of adapter health checks.", ("adapter",)
+        )
+        self.check_failures = metrics.counter(
+            "prism_health_check_failures_total", "Adapter health checks that failed or timed out.", ("adapter",)
+        )
 
-    def start_monitoring(self, adapters):
+    def start_monitoring(self, adapters, circuit_breaker=None):
         """
         Starts the health monitoring in a separate thread.
+        :param circuit_breaker: Optional CircuitBreaker (e.g. router.circuit_breaker)
+                                fed with every check result.
         """
         self.adapters = adapters
+        self.circuit_breaker = circuit_breaker
+        self._states = {name: _CheckState(name, adapter, self.interval) for name, adapter in adapters.items()}
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="HealthCheck")
         self.running = True
-        self.worker = Thread(target=self._monitor_loop, daemon=True)
+        self.worker = Thread(target=self._monitor_loop, daemon=True, name="HealthMonitor")
         self.worker.start()
         logging.info("Adapter health monitoring started.")
 
+    def update_adapters(self, adapters):
+        """
+        Switches to a new set of adapters, e.g. after CommandRouter.reload_config:
+        router.reload_listeners.append(lambda report: monitor.update_adapters(router.adapters)).
+        Targets whose adapter object is unchanged keep their schedule and status.
+        """
+        with self._condition:
+            states = {}
+            for name, adapter in adapters.items():
+                state = self._states.get(name)
+                if state is None or state.adapter is not adapter:
+                    # A check still running on a replaced adapter is ignored by _complete.
+                    state = _CheckState(name, adapter, self.interval)
+                    self.status.pop(name, None)
+                states[name] = state
+            for name in self._states.keys() - states.keys():
+                self.status.pop(name, None)
+            self.adapters = adapters
+            self._states = states
+            self._condition.notify()
+
     def stop_monitoring(self):
         """
         Stops the health monitoring.
         """
-        self.running = False
+        with self._condition:
+            self.running = False
+            self._condition.notify()
+        if self.worker is not None:
+            self.worker.join()
+            self.worker = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
         logging.info("Adapter health monitoring stopped.")
 
     def _monitor_loop(self):
-        while self.running:
-            for name, adapter in self.adapters.items():
-                try:
-                    health = adapter.health_check()
-                    self.status[name] = health
-                    logging.info(f"Health Check - {name}: {health}")
-                except Exception as e:
-                    self.status[name] = {"status": "error", "error": str(e)}
-                    logging.error(f"Health Check - {name}: Error during health check: {e}")
-            time.sleep(self.interval)
+        with self._condition:
+            while self.running:
+                now = time.monotonic()
+                wake = now + self.max_interval
+                for state in self._states.values():
+                    if state.future is not None:
+                        if now >= state.deadline:
+                            self._expire(state, now)
+                        wake = min(wake, state.deadline)
+                        continue
+                    if now >= state.due:
+                        self._submit(state, now)
+                        wake = min(wake, state.deadline)
+                    else:
+                        wake = min(wake, state.due)
+                self._condition.wait(max(wake - time.monotonic(), 0))
+
+    def _submit(self, state, now):
+        """Starts a check on the executor. Caller must hold the condition."""
+        state.started = now
+        state.deadline = now + self.timeout
+        state.timed_out = False
+        future = self._executor.submit(state.adapter.health_check)
+        state.future = future
+        future.add_done_callback(lambda future, state=state: self._complete(state, future))
+
+    def _expire(self, state, now):
+        """
+        Records a check that overran its timeout, and another failure every
+        failure_interval while it stays hung, so a hung device still opens its
+        circuit. The check keeps its thread until it returns; no second check is
+        started on the device meanwhile. Caller must hold the condition.
+        """
+        if state.timed_out:
+            error = f"Health check still running after {now - state.started:.1f}s"
+        else:
+            error = f"Health check timed out after {self.timeout}s"
+        self._record(state, {"status": "timeout", "error": error}, now - state.started)
+        # Keep the stale future so the late result is ignored and no second check starts.
+        state.timed_out = True
+        state.deadline = now + self.failure_interval
+
+    def _complete(self, state, future):
+        with self._condition:
+            if state.future is not future:
+                return
+            state.future = None
+            if self._states.get(state.name) is not state:
+                # The adapter was replaced or removed while this check ran.
+                return
+            if state.timed_out:
+                # Already recorded as timed out; the next check is already scheduled.
+                self._condition.notify()
+                return
+            try:
+                health = future.result()
+            except Exception as e:
+                health = {"status": "error", "error": str(e)}
+            if isinstance(health, Error):
+                health = {"status": "error", "error": health.message}
+            self._record(state, health, time.monotonic() - state.started)
+            self._condition.notify()
+
+    def _record(self, state, health, elapsed):
+        """Stores a check result and schedules the next check. Caller must hold the condition."""
+        name = state.name
+        self.check_seconds.labels(name).observe(elapsed)
+        healthy = isinstance(health, dict) and health.get("status") == "healthy"
+        if healthy:
+            previous = self.status.get(name)
+            if isinstance(previous, dict) and previous.get("status") == "healthy":
+                # Back off while the device stays healthy.
+                state.interval = min(state.interval * self.backoff, self.max_interval)
+            else:
+                state.interval = self.interval
+            logging.info("Health Check - %s: %s", name, health)
+        else:
+            self.check_failures.labels(name).inc()
+            state.interval = self.failure_interval
+            logging.error("Health Check - %s: %s", name, health)
+        state.due = time.monotonic() + state.interval
+        self.status[name] = health
+        if self.circuit_breaker is not None:
+            if healthy:
+                self.circuit_breaker.record_success(name)
+            else:
+                self.circuit_breaker.record_failure(name, health.get("error") if isinstance(health, dict) else health)
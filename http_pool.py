@@ -0,0 +1,187 @@
+import asyncio
+import json
+import logging
+from threading import Lock
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 10.0
+
+class HTTPResponse:
+    """Minimal response returned by HTTPSessionPool.request_async."""
+
+    def __init__(self, status_code, content, url):
+        self.status_code = status_code
+        self.content = content
+        self.url = url
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}")
+
+class HTTPSessionPool:
+    def __init__(self, connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                 pool_maxsize=10, pool_block=True):
+        """
+        Initializes the HTTP connection pool.
+        :param connect_timeout: Default seconds to wait for a TCP connection.
+        :param read_timeout: Default seconds to wait for the response.
+        :param pool_maxsize: Maximum keep-alive connections kept per endpoint.
+        :param pool_block: If True, callers wait for a free connection once the pool
+                           is exhausted instead of opening extra connections.
+        """
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self._sessions = {}
+        self._async_sessions = {}  # {event loop: (aiohttp session, closer task)}
+        self._lock = Lock()
+
+    def _endpoint(self, url):
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def session(self, url):
+        """Returns the pooled keep-alive session for the endpoint serving url."""
+        endpoint = self._endpoint(url)
+        session = self._sessions.get(endpoint)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(endpoint)
+                if session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize,
+                                          pool_block=self.pool_block)
+                    session.mount(endpoint, adapter)
+                    self._sessions[endpoint] = session
+                    logging.info(f"Created HTTP session pool for {endpoint}")
+        return session
+
+    def _timeout(self, timeout):
+        if timeout is None:
+            return (self.connect_timeout, self.read_timeout)
+        return timeout
+
+    def request(self, method, url, timeout=None, **kwargs):
+        """
+        Sends a request over the endpoint's pooled session.
+        :param timeout: (connect, read) seconds, a single number, or None for the pool defaults.
+        """
+        return self.session(url).request(method, url, timeout=self._timeout(timeout), **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def _async_session(self):
+        """
+        Returns the aiohttp session for the running event loop. Each session has a
+        closer task on its loop: asyncio.run cancels the loop's remaining tasks
+        before closing it, and the closer then closes the session.
+        """
+        loop = asyncio.get_running_loop()
+        entry = self._async_sessions.get(loop)
+        if entry is not None and not entry[0].closed:
+            return entry[0]
+        # Drop sessions of loops that were closed without cancelling their tasks
+        for stale in [stale for stale in self._async_sessions if stale.is_closed()]:
+            del self._async_sessions[stale]
+        connector = aiohttp.TCPConnector(limit_per_host=self.pool_maxsize)
+        session = aiohttp.ClientSession(connector=connector)
+        closer = loop.create_task(self._close_on_shutdown(loop, session))
+        self._async_sessions[loop] = (session, closer)
+        return session
+
+    async def _close_on_shutdown(self, loop, session):
+        """Waits until cancelled at loop shutdown (or by aclose), then closes session."""
+        try:
+            await loop.create_future()
+        finally:
+            entry = self._async_sessions.get(loop)
+            if entry is not None and entry[0] is session:
+                del self._async_sessions[loop]
+            await session.close()
+
+    async def request_async(self, method, url, timeout=None, **kwargs):
+        """
+        Awaitable variant of request returning an HTTPResponse. Uses aiohttp when it
+        is installed; otherwise the blocking request runs in the loop's executor.
+        """
+        timeout = self._timeout(timeout)
+        if not AIOHTTP_AVAILABLE:
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(
+                None, lambda: self.request(method, url, timeout=timeout, **kwargs)
+            )
+            return HTTPResponse(response.status_code, response.content, url)
+
+        if isinstance(timeout, tuple):
+            client_timeout = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+        else:
+            client_timeout = aiohttp.ClientTimeout(total=timeout)
+        async with self._async_session().request(method, url, timeout=client_timeout, **kwargs) as response:
+            content = await response.read()
+            return HTTPResponse(response.status, content, url)
+
+    async def get_async(self, url, **kwargs):
+        return await self.request_async("GET", url, **kwargs)
+
+    async def post_async(self, url, **kwargs):
+        return await self.request_async("POST", url, **kwargs)
+
+    async def aclose(self):
+        """Closes the aiohttp session bound to the running event loop."""
+        entry = self._async_sessions.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            session, closer = entry
+            closer.cancel()
+            await session.close()
+
+    def close(self):
+        """Closes every pooled session."""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+_default_pool = None
+_default_pool_lock = Lock()
+
+def get_http_pool():
+    """Returns the process-wide HTTPSessionPool shared by HTTP-based adapters."""
+    global _default_pool
+    if _default_pool is None:
+        with _default_pool_lock:
+            if _default_pool is None:
+                _default_pool = HTTPSessionPool()
+    return _default_pool
+
+def configure_http_pool(**kwargs):
+    """
+    Replaces the shared pool with one built from kwargs (see HTTPSessionPool).
+    Call before adapters are loaded so they all pick up the new settings.
+    """
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is not None:
+            _default_pool.close()
+        _default_pool = HTTPSessionPool(**kwargs)
+    return _default_pool
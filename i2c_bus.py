@@ -0,0 +1,56 @@
+import logging
+from threading import Lock
+import smbus2
+
+class SharedI2CBus:
+    """
+    An SMBus shared by every adapter on the same bus number. Each transaction
+    holds the bus lock only for the transfer itself, so sensors on one bus can
+    have their conversions in flight at the same time.
+    """
+
+    def __init__(self, bus_number, smbus_factory=None):
+        self.bus_number = bus_number
+        self.bus = (smbus_factory or smbus2.SMBus)(bus_number)
+        self.lock = Lock()
+        self.users = 0
+
+    def write_byte(self, address, value):
+        with self.lock:
+            self.bus.write_byte(address, value)
+
+    def read_byte(self, address):
+        with self.lock:
+            return self.bus.read_byte(address)
+
+    def read_i2c_block_data(self, address, register, length):
+        with self.lock:
+            return self.bus.read_i2c_block_data(address, register, length)
+
+_buses = {}
+_buses_lock = Lock()
+
+def open_bus(bus_number, smbus_factory=None):
+    """
+    Returns the SharedI2CBus for bus_number, opening it on first use.
+    :param smbus_factory: Callable creating the underlying SMBus, e.g. a fake in
+                          tests. Defaults to smbus2.SMBus.
+    """
+    with _buses_lock:
+        shared = _buses.get(bus_number)
+        if shared is None:
+            shared = _buses[bus_number] = SharedI2CBus(bus_number, smbus_factory)
+            logging.info(f"Opened I2C bus {bus_number}")
+        shared.users += 1
+        return shared
+
+def close_bus(shared):
+    """Releases one user of a shared bus, closing it when the last user is gone."""
+    with _buses_lock:
+        shared.users -= 1
+        if shared.users > 0:
+            return
+        if _buses.get(shared.bus_number) is shared:
+            del _buses[shared.bus_number]
+    shared.bus.close()
+    logging.info(f"Closed I2C bus {shared.bus_number}")
@@ -0,0 +1,262 @@
+"""
+Write-ahead journal for queued commands.
+
+Commands are appended to segment files in a directory as framed records:
+
+    length (u32) | crc32 (u32) | type (u8) | seq (u64) | payload
+
+An APPEND record carries a JSON-encoded command and a COMPLETE record marks the
+command with that sequence number as finished. Appends are written and fsynced
+by a single writer thread in batches (group commit): every caller waiting on a
+batch is released by the same fsync, so throughput grows with the number of
+concurrent producers rather than being capped at one command per fsync.
+
+Records are only ever appended. When the active segment grows past
+segment_bytes, the journal starts a new segment holding just the commands that
+are still pending, then deletes the old segments (compaction). On open, the
+segments are replayed in order, a torn record at the end of a segment (from a
+crash mid-write) is ignored, and the pending commands are returned for
+re-enqueueing. Completions are not fsynced, so after a crash a command that
+had already run may be replayed: delivery is at least once.
+"""
+import logging
+import os
+import struct
+import time
+import zlib
+from threading import Condition, Lock, Thread
+from codec import get_codec
+from metrics import get_registry
+
+APPEND = 1
+COMPLETE = 2
+
+_HEADER = struct.Struct("<IIBQ")
+_PREFIX = "journal-"
+_SUFFIX = ".log"
+# Segments only grow, so fdatasync (which still flushes the file size) is enough.
+_sync = getattr(os, "fdatasync", os.fsync)
+
+def _frame(record_type, seq, payload=b""):
+    body = struct.pack("<BQ", record_type, seq) + payload
+    return struct.pack("<II", len(body), zlib.crc32(body)) + body
+
+def _read_records(path):
+    """Yields (type, seq, payload) for each intact record in a segment, stopping at a torn one."""
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = 0
+    while offset + _HEADER.size <= len(data):
+        length, crc = struct.unpack_from("<II", data, offset)
+        start, end = offset + 8, offset + 8 + length
+        if length < 9 or end > len(data) or zlib.crc32(data[start:end]) != crc:
+            logging.warning(f"Journal segment {path} has a torn record at byte {offset}; ignoring the rest")
+            return
+        record_type, seq = struct.unpack_from("<BQ", data, start)
+        yield record_type, seq, data[start + 9:end]
+        offset = end
+    if offset != len(data):
+        logging.warning(f"Journal segment {path} ends with a partial record header; ignoring it")
+
+class JournalClosed(RuntimeError):
+    pass
+
+class CommandJournal:
+    def __init__(self, directory, segment_bytes=16 * 1024 * 1024, commit_delay=0.0, fsync=True, metrics=None):
+        """
+        Initializes the journal. Call open() to replay it before appending.
+        :param directory: Directory holding the segment files; created if missing.
+        :param segment_bytes: Size after which the active segment is compacted into a new one.
+        :param commit_delay: Seconds the writer waits after the first record of a batch
+                             for more to arrive before fsyncing. 0 commits whatever has
+                             accumulated while the previous fsync ran.
+        :param fsync: If False, batches are written but not fsynced (for testing and
+                      benchmarking; not crash-safe).
+        :param metrics: MetricsRegistry to record into (default: the process-wide registry).
+        """
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.commit_delay = commit_delay
+        self.fsync = fsync
+        self._lock = Lock()
+        # The writer waits on _wakeup for records; appenders wait on _durable for their fsync.
+        self._wakeup = Condition(self._lock)
+        self._durable = Condition(self._lock)
+        self._pending = {}  # {seq: APPEND record} for commands not yet completed
+        self._buffer = []
+        self._buffer_last_seq = 0
+        self._next_seq = 1
+        self._durable_seq = 0
+        self._file = None
+        self._segment_path = None
+        self._segment_size = 0
+        self._generation = 0
+        self._writer = None
+        self._closed = True
+        self._error = None
+        self._codec = get_codec("json")
+        metrics = metrics if metrics is not None else get_registry()
+        self.commit_seconds = metrics.histogram(
+            "prism_journal_commit_seconds", "Time to write and fsync one batch of journal records."
+        )
+        self.batch_records = metrics.histogram(
+            "prism_journal_batch_records", "Commands made durable by one journal fsync.",
+            buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096)
+        )
+        metrics.gauge(
+            "prism_journal_pending", "Journaled commands not yet completed."
+        ).set_function(lambda: len(self._pending))
+
+    def _segments(self):
+        names = sorted(name for name in os.listdir(self.directory)
+                       if name.startswith(_PREFIX) and name.endswith(_SUFFIX))
+        return [os.path.join(self.directory, name) for name in names]
+
+    def open(self):
+        """
+        Replays the journal and starts the writer. Returns [(seq, command)] for the
+        commands that were appended but never completed, in append order.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        last_seq = 0
+        for path in self._segments():
+            self._generation = int(os.path.basename(path)[len(_PREFIX):-len(_SUFFIX)])
+            for record_type, seq, payload in _read_records(path):
+                last_seq = max(last_seq, seq)
+                if record_type == APPEND:
+                    self._pending[seq] = _frame(APPEND, seq, payload)
+                elif record_type == COMPLETE:
+                    self._pending.pop(seq, None)
+        self._durable_seq = self._buffer_last_seq = last_seq
+        self._next_seq = last_seq + 1
+        # Start a fresh segment with only the pending commands; this also drops any torn tail.
+        self._roll()
+        self._closed = False
+        self._writer = Thread(target=self._run, daemon=True, name="JournalWriter")
+        self._writer.start()
+        recovered = [(seq, self._codec.decode(record[_HEADER.size:])) for seq, record in sorted(self._pending.items())]
+        if recovered:
+            logging.info(f"Recovered {len(recovered)} pending commands from journal {self.directory}")
+        return recovered
+
+    def append(self, command, wait=True):
+        """
+        Appends a command (a dict or Command) and returns its sequence number. With
+        wait, returns only once the record has been fsynced.
+        """
+        return self.append_many([command], wait)[0]
+
+    def append_many(self, commands, wait=True):
+        """Appends several commands, waiting for a single commit. Returns their sequence numbers."""
+        if not commands:
+            return []
+        payloads = [self._codec.encode(command.to_dict() if hasattr(command, "to_dict") else command)
+                    for command in commands]
+        with self._lock:
+            if self._closed:
+                raise JournalClosed("Journal is closed")
+            seqs = []
+            for payload in payloads:
+                seq = self._next_seq
+                self._next_seq += 1
+                record = self._pending[seq] = _frame(APPEND, seq, payload)
+                self._buffer.append(record)
+                seqs.append(seq)
+            self._buffer_last_seq = seq
+            self._wakeup.notify()
+            if wait:
+                while self._durable_seq < seq and self._error is None:
+                    self._durable.wait()
+                if self._durable_seq < seq:
+                    raise self._error
+        return seqs
+
+    def complete(self, seq):
+        """Marks a command as finished so it is not replayed. Does not wait for disk."""
+        with self._lock:
+            if self._pending.pop(seq, None) is None or self._closed:
+                return
+            self._buffer.append(_frame(COMPLETE, seq))
+            self._wakeup.notify()
+
+    def pending_count(self):
+        return len(self._pending)
+
+    def close(self):
+        """Commits everything buffered and stops the writer."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify()
+        self._writer.join()
+        self._file.close()
+        self._file = None
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._buffer and not self._closed:
+                    self._wakeup.wait()
+                if not self._buffer:
+                    return
+            if self.commit_delay:
+                time.sleep(self.commit_delay)
+            with self._lock:
+                records, self._buffer = self._buffer, []
+                last_seq = self._buffer_last_seq
+            appends = last_seq - self._durable_seq
+            start = time.perf_counter()
+            try:
+                self._file.write(b"".join(records))
+                self._segment_size += sum(len(record) for record in records)
+                if appends and self.fsync:
+                    _sync(self._file.fileno())
+                if self._segment_size >= self.segment_bytes:
+                    with self._lock:
+                        self._roll(last_seq)
+            except OSError as e:
+                logging.error(f"Journal write to {self._segment_path} failed: {e}")
+                with self._lock:
+                    self._error = e
+                    self._durable.notify_all()
+                return
+            if appends:
+                self.commit_seconds.observe(time.perf_counter() - start)
+                self.batch_records.observe(appends)
+                with self._lock:
+                    self._durable_seq = last_seq
+                    self._durable.notify_all()
+
+    def _roll(self, upto=None):
+        """
+        Writes the pending commands (up to seq upto; later ones are still in the
+        buffer) to a new segment, fsyncs it, then deletes the older segments.
+        Called with the lock held, or before the writer starts.
+        """
+        old_segments = self._segments()
+        self._generation += 1
+        path = os.path.join(self.directory, f"{_PREFIX}{self._generation:012d}{_SUFFIX}")
+        live = [record for seq, record in self._pending.items() if upto is None or seq <= upto]
+        new_file = open(path, "ab", buffering=0)
+        new_file.write(b"".join(live))
+        if self.fsync:
+            _sync(new_file.fileno())
+            self._sync_directory()
+        if self._file is not None:
+            self._file.close()
+        self._file, self._segment_path = new_file, path
+        self._segment_size = sum(len(record) for record in live)
+        for old in old_segments:
+            os.unlink(old)
+
+    def _sync_directory(self):
+        """Makes a new segment's directory entry durable before the old segments are deleted."""
+        try:
+            fd = os.open(self.directory, os.O_RDONLY)
+        except OSError:
+            return  # Not supported on this platform (e.g. Windows)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
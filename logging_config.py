@@ -0,0 +1,213 @@
+import atexit
+import json
+import logging
+import time
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from threading import Event, Lock, Thread
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_listener = None
+_sampler = None
+_srcfile = logging._srcfile
+
+# Argument types that are copied when a record is queued, so later changes do not show up.
+_MUTABLE_ARGS = (dict, list, set, bytearray)
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that hands records to the listener unformatted, so message
+    formatting happens on the background writer thread instead of the caller's.
+    Mutable arguments are shallow-copied when the record is queued, since the
+    caller may change them after logging.
+    """
+
+    def prepare(self, record):
+        args = record.args
+        if isinstance(args, tuple):
+            for arg in args:
+                if isinstance(arg, _MUTABLE_ARGS):
+                    record.args = tuple([arg.copy() if isinstance(arg, _MUTABLE_ARGS) else arg for arg in args])
+                    break
+        elif isinstance(args, _MUTABLE_ARGS):
+            # logging.info("%(target)s", mapping) stores the mapping itself as args
+            record.args = args.copy()
+        return record
+
+class CommandLogSampler:
+    def __init__(self, max_per_second=None, sample_every=None):
+        """
+        Rate-limits and samples per-command log lines. Lines are grouped by their
+        unformatted message template, so every "Routing command ..." line counts
+        against the same budget regardless of its arguments.
+        :param max_per_second: Lines per template logged each second before sampling starts.
+        :param sample_every: Once over the limit, log 1 in every N lines (None drops them all).
+        """
+        self.max_per_second = max_per_second
+        self.sample_every = sample_every
+        self.suppressed = 0
+        self._windows = {}
+        self._lock = Lock()
+
+    def allow(self, template):
+        now = int(time.monotonic())
+        with self._lock:
+            window = self._windows.get(template)
+            if window is None or window[0] != now:
+                window = self._windows[template] = [now, 0]
+            window[1] += 1
+            seen = window[1]
+        if self.max_per_second is None:
+            over = seen
+        elif seen <= self.max_per_second:
+            return True
+        else:
+            over = seen - self.max_per_second
+        if self.sample_every and over % self.sample_every == 0:
+            return True
+        with self._lock:
+            self.suppressed += 1
+        return False
+
+def log_command(msg, *args):
+    """
+    Logs a per-command INFO line with lazy %-style arguments. When sampling is
+    configured, suppressed lines return before a LogRecord is even created.
+    """
+    if _sampler is not None and not _sampler.allow(msg):
+        return
+    logging.info(msg, *args)
+
+class JsonLinesHandler(logging.Handler):
+    def __init__(self, path, batch_size=256, flush_interval=1.0):
+        """
+        Writes one JSON object per record, buffering lines and writing them in
+        batches of batch_size or every flush_interval seconds, whichever comes first.
+        A background thread writes the buffer when no further record arrives.
+        """
+        super().__init__()
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._stream = open(path, "a", encoding="utf-8")
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._closed = Event()
+        self._flusher = Thread(target=self._flush_periodically, daemon=True, name="JsonLinesFlush")
+        self._flusher.start()
+
+    def emit(self, record):
+        try:
+            entry = {
+                "ts": record.created,
+                "level": record.levelname,
+                "logger": record.name,
+                "thread": record.threadName,
+                "msg": record.getMessage()
+            }
+            if record.exc_info:
+                entry["exc"] = logging.Formatter().formatException(record.exc_info)
+            line = json.dumps(entry, default=str)
+        except Exception:
+            self.handleError(record)
+            return
+        with self.lock:
+            self._buffer.append(line)
+            if len(self._buffer) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._write()
+
+    def _write(self):
+        if self._buffer:
+            self._stream.write("\n".join(self._buffer) + "\n")
+            self._stream.flush()
+            self._buffer.clear()
+        self._last_flush = time.monotonic()
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            with self.lock:
+                if self._buffer:
+                    self._write()
+
+    def flush(self):
+        with self.lock:
+            if not self._stream.closed:
+                self._write()
+
+    def close(self):
+        self._closed.set()
+        self._flusher.join()
+        with self.lock:
+            if not self._stream.closed:
+                self._write()
+                self._stream.close()
+        super().close()
+
+def configure_logging(async_mode=False, log_file="prism.log", level=logging.INFO, max_per_second=None,
+                      sample_every=None, jsonl_path=None, jsonl_batch_size=256, jsonl_flush_interval=1.0,
+                      console=True, caller_info=True, force=True):
+    """
+    Configures PRISM logging.
+    :param async_mode: If True, callers only enqueue records; a background thread
+                       formats them and writes them to the handlers.
+    :param log_file: Plain-text log file, or None to log to the console only.
+    :param max_per_second: Per-template limit for per-command lines (see CommandLogSampler).
+    :param sample_every: Log 1 in N per-command lines once over the limit.
+    :param jsonl_path: Optional JSON-lines sink written in batches.
+    :param console: If True, also log to stderr.
+    :param caller_info: If False, skip the stack walk logging does for every record
+                        to find the caller's file and line (LOG_FORMAT does not use them).
+    :param force: If False, leave logging untouched when the root logger already
+                  has handlers.
+    """
+    global _listener, _sampler
+    root = logging.getLogger()
+    if root.handlers and not force:
+        return None
+
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = []
+    if log_file:
+        handlers.append(logging.FileHandler(log_file))
+    if console:
+        handlers.append(logging.StreamHandler())
+    if jsonl_path:
+        handlers.append(JsonLinesHandler(jsonl_path, jsonl_batch_size, jsonl_flush_interval))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    _sampler = None
+    if max_per_second is not None or sample_every is not None:
+        _sampler = CommandLogSampler(max_per_second, sample_every)
+
+    if async_mode:
+        queue_handler = DeferredQueueHandler(SimpleQueue())
+        _listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        root.addHandler(queue_handler)
+    else:
+        for handler in handlers:
+            root.addHandler(handler)
+    root.setLevel(level)
+    # Documented logging optimization: no _srcfile means no findCaller per record.
+    logging._srcfile = _srcfile if caller_info else None
+    return _sampler
+
+def shutdown_logging():
+    """Stops the background writer, flushing every queued record."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+atexit.register(shutdown_logging)
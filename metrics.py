@@ -0,0 +1,314 @@
+import logging
+import math
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread, current_thread, local
+
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class _ShardedValues:
+    """
+    A list of numbers sharded per thread. Writers only touch their own thread's
+    shard, so updates take no lock; readers sum every shard. Shards of threads
+    that have exited are folded into one retired total, so short-lived threads
+    do not grow the list.
+    """
+
+    def __init__(self, size):
+        self._size = size
+        self._local = local()
+        self._shards = []
+        self._retired = [0] * size
+        self._lock = Lock()
+
+    def shard(self):
+        try:
+            return self._local.values
+        except AttributeError:
+            values = [0] * self._size
+            with self._lock:
+                self._prune()
+                self._shards.append((current_thread(), values))
+            self._local.values = values
+            return values
+
+    def _prune(self):
+        """Folds the shards of exited threads into the retired total. Called with the lock held."""
+        live = []
+        for thread, values in self._shards:
+            if thread.is_alive():
+                live.append((thread, values))
+                continue
+            for index, value in enumerate(values):
+                self._retired[index] += value
+        self._shards = live
+
+    def totals(self):
+        with self._lock:
+            self._prune()
+            shards = [values for _, values in self._shards]
+            totals = list(self._retired)
+        for values in shards:
+            for index, value in enumerate(values):
+                totals[index] += value
+        return totals
+
+class _CounterChild:
+    __slots__ = ("_values",)
+
+    def __init__(self):
+        self._values = _ShardedValues(1)
+
+    def inc(self, amount=1):
+        self._values.shard()[0] += amount
+
+    def value(self):
+        return self._values.totals()[0]
+
+class _GaugeChild:
+    __slots__ = ("_value", "_function", "_lock")
+
+    def __init__(self):
+        self._value = 0
+        self._function = None
+        self._lock = Lock()
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self._value -= amount
+
+    def set_function(self, function):
+        """Reports function() as the gauge's value each time metrics are collected."""
+        self._function = function
+
+    def value(self):
+        function = self._function
+        if function is not None:
+            return function()
+        return self._value
+
+class _HistogramChild:
+    __slots__ = ("_bounds", "_values")
+
+    def __init__(self, bounds):
+        self._bounds = bounds
+        # One slot per bucket plus +Inf, then the sum and the count.
+        self._values = _ShardedValues(len(bounds) + 3)
+
+    def observe(self, value):
+        values = self._values.shard()
+        values[bisect_left(self._bounds, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    def value(self):
+        totals = self._values.totals()
+        buckets = {}
+        cumulative = 0
+        for bound, count in zip(self._bounds + (math.inf,), totals):
+            cumulative += count
+            buckets[bound] = cumulative
+        return {"buckets": buckets, "sum": totals[-2], "count": totals[-1]}
+
+class Metric:
+    """A named metric family; labels(...) returns the child for one label combination."""
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = Lock()
+        if not self.labelnames:
+            self._unlabelled = self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child()
+        return child
+
+    def samples(self):
+        """Returns [(labels dict, value)] for every label combination seen so far."""
+        with self._lock:
+            children = list(self._children.items())
+        return [(dict(zip(self.labelnames, values)), child.value()) for values, child in children]
+
+class Counter(Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._unlabelled.inc(amount)
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._unlabelled.set(value)
+
+    def set_function(self, function):
+        self._unlabelled.set_function(function)
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._unlabelled.observe(value)
+
+def _format_value(value):
+    return "+Inf" if value == math.inf else str(value)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+class MetricsRegistry:
+    def __init__(self):
+        """Holds metric families by name and renders them for the metrics endpoint."""
+        self._metrics = {}
+        self._lock = Lock()
+
+    def _get_or_create(self, cls, name, help, labelnames, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(name)
+                if metric is None:
+                    metric = self._metrics[name] = cls(name, help, labelnames, **kwargs)
+        if not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+            raise ValueError(f"Metric '{name}' is already registered as a {metric.type} with labels {metric.labelnames}")
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        """Returns the counter registered under name, creating it if needed."""
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def gauge(self, name, help, labelnames=()):
+        """Returns the gauge registered under name, creating it if needed."""
+        return self._get_or_create(Gauge, name, help, labelnames)
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """Returns the histogram registered under name, creating it if needed."""
+        return self._get_or_create(Histogram, name, help, labelnames, buckets=buckets)
+
+    def snapshot(self):
+        """
+        Returns the current value of every metric:
+        {name: {"type", "help", "samples": [{"labels", "value"}]}}. Histogram values
+        are {"buckets": {upper_bound: cumulative_count}, "sum", "count"}.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            metric.name: {
+                "type": metric.type,
+                "help": metric.help,
+                "samples": [{"labels": labels, "value": value} for labels, value in metric.samples()]
+            }
+            for metric in metrics
+        }
+
+    def exposition(self):
+        """Renders every metric in the Prometheus text exposition format."""
+        lines = []
+        for name, family in sorted(self.snapshot().items()):
+            lines.append(f"# HELP {name} {family['help']}")
+            lines.append(f"# TYPE {name} {family['type']}")
+            for sample in family["samples"]:
+                labels, value = sample["labels"], sample["value"]
+                if family["type"] != "histogram":
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                for bound, count in value["buckets"].items():
+                    bucket_labels = {**labels, "le": _format_value(float(bound))}
+                    lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value['sum'])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = None
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.exposition().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class MetricsServer:
+    def __init__(self, registry=None, host="127.0.0.1", port=9108):
+        """
+        Serves the registry at http://host:port/metrics from a background thread.
+        :param port: TCP port, or 0 to pick a free one (see the port attribute).
+        """
+        self.registry = registry if registry is not None else get_registry()
+        handler = type("MetricsHandler", (_MetricsHandler,), {"registry": self.registry})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self.host, self.port = self._server.server_address[:2]
+        self._thread = None
+
+    def start(self):
+        self._thread = Thread(target=self._server.serve_forever, daemon=True, name="MetricsServer")
+        self._thread.start()
+        logging.info(f"Serving metrics at http://{self.host}:{self.port}/metrics")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+_default_registry = MetricsRegistry()
+
+def get_registry():
+    """Returns the process-wide MetricsRegistry used by the router, queue and health checks."""
+    return _default_registry
+
+def start_metrics_server(host="127.0.0.1", port=9108, registry=None):
+    """Starts a MetricsServer for the registry (default: the process-wide one)."""
+    return MetricsServer(registry, host, port).start()
@@ -1 +1,2 @@
 # middleware/__init__.py created.
+from middleware.middleware import Middleware, ShortCircuit
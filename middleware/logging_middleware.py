@@ -1,7 +1,7 @@
-import logging
 from middleware import Middleware
+from logging_config import log_command
 
 class LoggingMiddleware(Middleware):
     def process(self, command):
-        logging.info(f"Middleware Logging: Processing command: {command}")
+        log_command("Middleware Logging: Processing command: %s", command)
         return command  # Return the command unmodified
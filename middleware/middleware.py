@@ -1,7 +1,45 @@
+class ShortCircuit:
+    """
+    Returned from Middleware.before to answer a command without calling its
+    adapter. response is a result dict or an Error.
+    """
+    __slots__ = ("response",)
+
+    def __init__(self, response):
+        self.response = response
+
 class Middleware:
+    """
+    Base class for middleware. Override any of the hooks below; hooks that are
+    not overridden cost nothing at routing time.
+
+    Set `actions` or `targets` (or pass them to CommandRouter.add_middleware) to
+    run the middleware only for those actions or targets.
+    """
+    actions = None
+    targets = None
+
     def process(self, command):
         """
         Process the command and return the modified command.
-        This method should be overridden by all middleware implementations.
+        Original single-hook interface; it is run as the before hook.
         """
         raise NotImplementedError("Middleware must implement the process method.")
+
+    def before(self, command):
+        """
+        Runs before the adapter. Returns the (possibly modified) command, an Error
+        to reject it, or ShortCircuit(response) to answer it without the adapter.
+        """
+        return command
+
+    def after(self, command, response):
+        """Runs after a successful response and returns the (possibly modified) response."""
+        return response
+
+    def on_error(self, command, error):
+        """
+        Runs when the response is an Error. Returns a replacement response, or
+        None to keep the error.
+        """
+        return None
@@ -0,0 +1,164 @@
+import time
+from itertools import count
+from threading import Lock
+from errors import Error
+from middleware.middleware import Middleware, ShortCircuit
+
+HOOKS = ("before", "after", "on_error")
+
+def _overrides(middleware, name):
+    return getattr(type(middleware), name, None) is not getattr(Middleware, name)
+
+class _Entry:
+    """A registered middleware with its scope, resolved hooks and timing counters."""
+    __slots__ = ("middleware", "name", "actions", "targets", "position",
+                 "before", "after", "on_error", "calls", "seconds", "lock")
+
+    def __init__(self, middleware, actions=None, targets=None):
+        self.middleware = middleware
+        self.name = middleware.__class__.__name__
+        actions = middleware.actions if actions is None else actions
+        targets = middleware.targets if targets is None else targets
+        self.actions = None if actions is None else frozenset(actions)
+        self.targets = None if targets is None else frozenset(targets)
+        # Registration order; positions only ever grow, so removals need no renumbering.
+        self.position = 0
+        if _overrides(middleware, "before"):
+            self.before = middleware.before
+        elif _overrides(middleware, "process"):
+            self.before = middleware.process
+        else:
+            self.before = None
+        self.after = middleware.after if _overrides(middleware, "after") else None
+        self.on_error = middleware.on_error if _overrides(middleware, "on_error") else None
+        self.calls = dict.fromkeys(HOOKS, 0)
+        self.seconds = dict.fromkeys(HOOKS, 0.0)
+        self.lock = Lock()
+
+    def applies_to(self, action, target):
+        return ((self.actions is None or action in self.actions)
+                and (self.targets is None or target in self.targets))
+
+    def record(self, hook, elapsed):
+        with self.lock:
+            self.calls[hook] += 1
+            self.seconds[hook] += elapsed
+
+class CompiledChain:
+    """The middleware hooks that apply to one (action, target) pair, in call order."""
+    __slots__ = ("before", "after")
+
+    def __init__(self, entries):
+        self.before = tuple(entry for entry in entries if entry.before is not None)
+        # After and error hooks unwind in reverse registration order.
+        self.after = tuple(entry for entry in reversed(entries)
+                           if entry.after is not None or entry.on_error is not None)
+
+    def run_before(self, command):
+        """
+        Runs the before hooks. Returns (command, None) when the command should go
+        on to its adapter, or (command, response) when a middleware rejected it
+        with an Error or answered it with ShortCircuit. In that case the after
+        hooks of the middleware registered ahead of it have already been applied.
+        """
+        for entry in self.before:
+            start = time.perf_counter()
+            result = entry.before(command)
+            entry.record("before", time.perf_counter() - start)
+            if isinstance(result, ShortCircuit):
+                return command, self.run_after(command, result.response, entry.position)
+            if isinstance(result, Error):
+                return command, self.run_after(command, result, entry.position)
+            command = result
+        return command, None
+
+    def run_after(self, command, result, before_position=None):
+        """
+        Passes a result through the after hooks, or through the on_error hooks
+        while the result is an Error. When before_position is given, only
+        middleware registered ahead of that position take part.
+        """
+        for entry in self.after:
+            if before_position is not None and entry.position >= before_position:
+                continue
+            if isinstance(result, Error):
+                if entry.on_error is None:
+                    continue
+                start = time.perf_counter()
+                replacement = entry.on_error(command, result)
+                entry.record("on_error", time.perf_counter() - start)
+                if replacement is not None:
+                    result = replacement
+            elif entry.after is not None:
+                start = time.perf_counter()
+                result = entry.after(command, result)
+                entry.record("after", time.perf_counter() - start)
+        return result
+
+EMPTY_CHAIN = CompiledChain(())
+
+class MiddlewarePipeline:
+    def __init__(self):
+        """
+        Holds the router's middleware. The hooks that apply to each (action, target)
+        pair are compiled into a CompiledChain the first time that pair is routed,
+        and every compiled chain is discarded whenever the middleware list changes.
+        """
+        self._lock = Lock()
+        self._positions = count()
+        # (entries, compiled chains) are swapped together so a chain is never
+        # compiled from one middleware list and cached against another.
+        self._state = ((), {})
+
+    def __iter__(self):
+        return iter([entry.middleware for entry in self._state[0]])
+
+    def __len__(self):
+        return len(self._state[0])
+
+    def add(self, middleware, actions=None, targets=None):
+        """
+        Appends a middleware. actions and targets restrict it to those actions or
+        targets, defaulting to the middleware's own actions/targets attributes.
+        """
+        entry = _Entry(middleware, actions, targets)
+        with self._lock:
+            entry.position = next(self._positions)
+            self._state = (self._state[0] + (entry,), {})
+
+    def remove(self, middleware):
+        """Removes a middleware. Returns True if it was registered."""
+        with self._lock:
+            entries = tuple(entry for entry in self._state[0] if entry.middleware is not middleware)
+            if len(entries) == len(self._state[0]):
+                return False
+            self._state = (entries, {})
+            return True
+
+    def chain(self, action, target):
+        """Returns the compiled chain for an (action, target) pair."""
+        entries, chains = self._state
+        if not entries:
+            return EMPTY_CHAIN
+        key = (action, target)
+        chain = chains.get(key)
+        if chain is None:
+            chain = chains[key] = CompiledChain([entry for entry in entries if entry.applies_to(action, target)])
+        return chain
+
+    def stats(self):
+        """
+        Returns per-middleware timing counters in registration order:
+        [{"name", "before", "after", "on_error"}] where each hook maps to
+        {"calls", "seconds", "mean"}.
+        """
+        result = []
+        for entry in self._state[0]:
+            with entry.lock:
+                stats = {"name": entry.name}
+                for hook in HOOKS:
+                    calls = entry.calls[hook]
+                    seconds = entry.seconds[hook]
+                    stats[hook] = {"calls": calls, "seconds": seconds, "mean": seconds / calls if calls else 0.0}
+            result.append(stats)
+        return result
@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from threading import Event, Lock
+from errors import Error, ErrorCode
+
+class _InflightRead:
+    """A hardware read shared by every caller that asked for the same key."""
+    __slots__ = ("event", "result", "exception")
+
+    def __init__(self):
+        self.event = Event()
+        self.result = None
+        self.exception = None
+
+def _retrieve_exception(task):
+    """Marks a shared load's exception as retrieved when every caller was cancelled."""
+    if not task.cancelled():
+        task.exception()
+
+class ObserveCache:
+    def __init__(self, ttls=None, default_ttl=0, max_entries=1024):
+        """
+        Initializes the OBSERVE result cache.
+        :param ttls: Dict mapping target names to cache TTLs in seconds.
+        :param default_ttl: TTL used for targets without an entry in ttls. A TTL of 0
+                            disables caching but still coalesces concurrent reads.
+        :param max_entries: Maximum number of cached (target, property) results
+                            before least recently used entries are evicted.
+        """
+        self.ttls = dict(ttls or {})
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._inflight_async = {}
+        self._inflight_deferred = {}
+        self._generations = {}
+        self._lock = Lock()
+
+    def ttl_for(self, target):
+        """Returns the cache TTL for a target."""
+        return self.ttls.get(target, self.default_ttl)
+
+    def _lookup(self, key):
+        """Returns a fresh cached result for key, or None. Caller must hold the lock."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def _store(self, key, generation, result):
+        """Caches a result unless the target was invalidated while it was being read."""
+        if isinstance(result, Error):
+            return
+        ttl = self.ttl_for(key[0])
+        if ttl <= 0:
+            return
+        with self._lock:
+            if self._generations.get(key[0], 0) != generation:
+                return
+            self._entries[key] = (time.monotonic() + ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, target, property, loader):
+        """
+        Returns the cached result for (target, property), or calls loader to read it.
+        Concurrent callers for the same key wait for a single loader call.
+        """
+        key = (target, property)
+        leader = False
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                return entry[1]
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                self.coalesced += 1
+            else:
+                inflight = self._inflight[key] = _InflightRead()
+                generation = self._generations.get(target, 0)
+                self.misses += 1
+                leader = True
+
+        if not leader:
+            inflight.event.wait()
+            if inflight.exception is not None:
+                raise inflight.exception
+            return inflight.result
+
+        try:
+            inflight.result = loader()
+            self._store(key, generation, inflight.result)
+            return inflight.result
+        except Exception as e:
+            inflight.exception = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            inflight.event.set()
+
+    async def get_or_load_async(self, target, property, loader):
+        """
+        Awaitable variant of get_or_load. loader is a zero-argument callable
+        returning an awaitable; concurrent callers for the same key share it.
+        The load runs in its own task, so cancelling any caller, including the
+        one that started it, leaves it running for the others.
+        """
+        key = (target, property)
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                return entry[1]
+            task = self._inflight_async.get(key)
+            if task is not None:
+                self.coalesced += 1
+            else:
+                generation = self._generations.get(target, 0)
+                self.misses += 1
+                task = self._inflight_async[key] = asyncio.get_running_loop().create_task(
+                    self._load_async(key, generation, loader)
+                )
+                task.add_done_callback(_retrieve_exception)
+        return await asyncio.shield(task)
+
+    async def _load_async(self, key, generation, loader):
+        try:
+            result = await loader()
+            self._store(key, generation, result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight_async.pop(key, None)
+
+    def get_or_load_deferred(self, target, property, start, callback):
+        """
+        Callback-based variant of get_or_load for split-phase reads. start is called
+        with a done(result) function and must arrange for it to be called once;
+        callback(result) is then called for every caller that asked for the key.
+        """
+        key = (target, property)
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None:
+                callbacks = self._inflight_deferred.get(key)
+                if callbacks is not None:
+                    self.coalesced += 1
+                    callbacks.append(callback)
+                    return
+                self._inflight_deferred[key] = [callback]
+                generation = self._generations.get(target, 0)
+                self.misses += 1
+        if entry is not None:
+            callback(entry[1])
+            return
+
+        def done(result):
+            self._store(key, generation, result)
+            with self._lock:
+                callbacks = self._inflight_deferred.pop(key, [])
+            for waiting in callbacks:
+                try:
+                    waiting(result)
+                except Exception as e:
+                    # One failing caller must not keep the result from the others.
+                    error = Error(ErrorCode.INTERNAL_ERROR, f"OBSERVE callback for '{target}' failed: {e}")
+                    logging.exception(error.to_dict())
+
+        start(done)
+
+    def invalidate(self, target):
+        """Drops every cached result for a target, e.g. after it was actuated."""
+        with self._lock:
+            self._generations[target] = self._generations.get(target, 0) + 1
+            for key in [key for key in self._entries if key[0] == target]:
+                del self._entries[key]
+
+    def clear(self):
+        """Drops every cached result."""
+        with self._lock:
+            for target in {key[0] for key in self._entries}:
+                self._generations[target] = self._generations.get(target, 0) + 1
+            self._entries.clear()
+
+    def stats(self):
+        """Returns the cache hit/miss counters."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "entries": len(self._entries)
+            }
@@ -0,0 +1,485 @@
+import json
+import logging
+import multiprocessing
+import re
+import zlib
+from collections import deque
+from concurrent.futures import Future
+from threading import Condition, Thread
+from codec import DecodeError, get_codec
+from commands import Command
+from errors import Error, ErrorCode
+from scheduler import DEFAULT_ACTION_PRIORITIES, PRIORITY_NORMAL
+from aggregation import parse_aggregate
+from target_groups import aggregate, aggregate_readings, is_group, load_groups, members_of
+
+def shard_for(target, process_count):
+    """Returns the worker process that owns a target. Stable across runs and hosts."""
+    if not isinstance(target, str):
+        return 0
+    return zlib.crc32(target.encode("utf-8")) % process_count
+
+_TARGET = re.compile(r'"target"\s*:\s*"([^"\\]*)"')
+_TARGET_BYTES = re.compile(rb'"target"\s*:\s*"([^"\\]*)"')
+
+def _peek_target(command):
+    """
+    Returns the target of a JSON-encoded command by scanning the text, without
+    decoding it, or None when that is not certain: the key appears more than
+    once, the target is escaped or not a string, or the command may be an
+    AGGREGATE query (whose target can be a list).
+    """
+    if isinstance(command, str):
+        key, pattern, aggregate = '"target"', _TARGET, '"AGGREGATE"'
+    else:
+        key, pattern, aggregate = b'"target"', _TARGET_BYTES, b'"AGGREGATE"'
+    if command.count(key) != 1 or aggregate in command:
+        return None
+    match = pattern.search(command)
+    if match is None:
+        return None
+    target = match.group(1)
+    return target if isinstance(target, str) else target.decode("utf-8", errors="replace")
+
+class _Outbox:
+    """
+    Sends messages over a multiprocessing connection from a background thread.
+    Messages queued while a send is in progress go out together as one list, so
+    the per-message cost of pickling and the pipe write is amortized under load.
+    """
+
+    def __init__(self, conn, name):
+        self.conn = conn
+        self._messages = deque()
+        self._condition = Condition()
+        self._closed = False
+        self._thread = Thread(target=self._run, daemon=True, name=name)
+        self._thread.start()
+
+    def put(self, message):
+        with self._condition:
+            self._messages.append(message)
+            if len(self._messages) == 1:
+                self._condition.notify()
+
+    def close(self):
+        """Sends everything still queued, then the end-of-stream marker (None)."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._messages and not self._closed:
+                    self._condition.wait()
+                messages = list(self._messages)
+                self._messages.clear()
+                closed = self._closed
+            try:
+                if messages:
+                    self.conn.send(messages)
+                if closed:
+                    self.conn.send(None)
+                    return
+            except (OSError, ValueError):
+                logging.error(f"{self._thread.name}: connection closed, dropping {len(messages)} messages")
+                return
+
+def _worker_main(conn, config_path, targets, router_options, queue_options, logging_options):
+    """
+    Entry point of a worker process: builds a router holding only this shard's
+    adapters, runs a CommandQueue on it and streams (seq, response) back.
+    """
+    from logging_config import configure_logging
+    if logging_options is not None:
+        configure_logging(**logging_options)
+    # Imported here so the parent process never constructs adapters itself.
+    from core import CommandRouter
+    from command_queue import CommandQueue
+
+    router = CommandRouter(config_path, targets=targets, **router_options)
+    queue = CommandQueue(router, **queue_options)
+    outbox = _Outbox(conn, "ResponseSender")
+
+    queue.start()
+    try:
+        while True:
+            messages = conn.recv()
+            if messages is None:
+                break
+            for kind, seq, command, priority, timeout in messages:
+                callback = lambda response, seq=seq: outbox.put((seq, response))
+                if kind == "batch":
+                    queue.enqueue_batch(command, priority, timeout, callback=callback)
+                else:
+                    queue.enqueue_command(command, priority, timeout, callback=callback)
+    except EOFError:
+        pass
+    finally:
+        # Orderly shutdown: finish queued work, release devices, then tell the parent.
+        queue.queue.join()
+        queue.stop()
+        router.cleanup_all()
+        outbox.close()
+        conn.close()
+
+class _Shard:
+    __slots__ = ("index", "targets", "process", "conn", "outbox", "receiver", "in_flight")
+
+    def __init__(self, index, targets):
+        self.index = index
+        self.targets = targets
+        self.process = None
+        self.conn = None
+        self.outbox = None
+        self.receiver = None
+        self.in_flight = 0
+
+class _PendingBatch:
+    """Reassembles a batch that was split across worker processes."""
+    __slots__ = ("responses", "remaining", "callback")
+
+    def __init__(self, size, parts, callback):
+        self.responses = [None] * size
+        self.remaining = parts
+        self.callback = callback
+
+class ProcessCommandQueue:
+    def __init__(self, adapter_config_path, process_count=None, threads_per_process=2,
+                 router_options=None, queue_options=None, logging_options=None, start_method="spawn"):
+        """
+        Command queue that routes commands in worker processes, so parsing,
+        validation and response handling are not limited by one interpreter's GIL.
+        Targets are sharded across processes by CRC32 of their name, so every
+        adapter (and the GPIO pin or SMBus handle it holds) lives in exactly one process.
+        Commands to group targets and AGGREGATE queries are expanded here: each
+        member's command goes to the process that owns the member, and the
+        responses are combined as CommandRouter does. Group-level and AGGREGATE
+        middleware does not run in this mode, and AGGREGATE "window" queries are
+        rejected because worker processes do not sample.
+        :param adapter_config_path: Path to the adapters configuration file.
+        :param process_count: Worker processes (default: CPU count).
+        :param threads_per_process: worker_count of the CommandQueue in each process.
+        :param router_options: Keyword arguments for each process's CommandRouter.
+        :param queue_options: Other keyword arguments for each process's CommandQueue
+                              (scheduler, split_phase, ...).
+        :param logging_options: Keyword arguments for configure_logging in each process.
+        :param start_method: multiprocessing start method for the workers.
+        """
+        self.config_path = adapter_config_path
+        self.process_count = process_count or multiprocessing.cpu_count()
+        self.router_options = dict(router_options or {})
+        self.queue_options = dict(queue_options or {}, worker_count=threads_per_process)
+        self.logging_options = logging_options
+        self.scheduler = self.queue_options.get("scheduler", "fifo")
+        action_priorities = self.queue_options.get("action_priorities")
+        self.action_priorities = dict(DEFAULT_ACTION_PRIORITIES if action_priorities is None else action_priorities)
+        self.context = multiprocessing.get_context(start_method)
+        with open(adapter_config_path, 'r') as f:
+            config = json.load(f)
+        self.groups = load_groups(config)
+        codec = self.router_options.get("codec", "json")
+        self.codec = get_codec(codec) if isinstance(codec, str) else codec
+        self.shards = [_Shard(index, []) for index in range(self.process_count)]
+        for target, info in config.items():
+            if not is_group(info):
+                self.shards[shard_for(target, self.process_count)].targets.append(target)
+        self.running = False
+        self._seq = 0
+        self._pending = {}
+        self._condition = Condition()
+
+    def start(self):
+        """Starts one worker process, and a thread reading its responses, per shard."""
+        self.running = True
+        for shard in self.shards:
+            parent_conn, child_conn = self.context.Pipe()
+            shard.conn = parent_conn
+            shard.process = self.context.Process(
+                target=_worker_main,
+                args=(child_conn, self.config_path, shard.targets, self.router_options, self.queue_options,
+                      self.logging_options),
+                name=f"CommandWorker-{shard.index}",
+                daemon=True
+            )
+            shard.process.start()
+            child_conn.close()
+            shard.outbox = _Outbox(parent_conn, f"CommandWorker-{shard.index}-sender")
+            shard.receiver = Thread(target=self._receive, args=(shard,), daemon=True,
+                                    name=f"CommandWorker-{shard.index}-responses")
+            shard.receiver.start()
+            logging.info(f"Started {shard.process.name} (pid {shard.process.pid}) for targets {shard.targets}")
+
+    def stop(self):
+        """
+        Stops the worker processes. Each process finishes its queued commands and
+        calls cleanup_all on its router before exiting.
+        """
+        self.running = False
+        for shard in self.shards:
+            shard.outbox.close()
+        for shard in self.shards:
+            shard.receiver.join()
+            shard.process.join()
+            shard.conn.close()
+            logging.info(f"Stopped {shard.process.name}")
+
+    def join(self):
+        """Blocks until every enqueued command has been answered."""
+        with self._condition:
+            while self._pending:
+                self._condition.wait()
+
+    def _register(self, shard, callback):
+        with self._condition:
+            self._seq += 1
+            seq = self._seq
+            self._pending[seq] = (shard, callback)
+            shard.in_flight += 1
+        return seq
+
+    def _send(self, shard, message):
+        shard.outbox.put(message)
+
+    def enqueue_command(self, command_string, priority=None, timeout=None, callback=None):
+        """
+        Sends a command to the process that owns its target. Returns a
+        concurrent.futures.Future that resolves to the command's response (also
+        passed to handle_response).
+        :param priority: Priority class overriding the action's default.
+        :param timeout: Seconds after which the command is dropped if not started.
+        :param callback: Called with the response instead of handle_response.
+        """
+        future = Future()
+        target, command = self._classify(command_string)
+        expanded = self._expand(command)
+        if expanded is not None:
+            combine, members = expanded
+            if priority is None and members:
+                # The members go out as a batch, which the workers do not prioritize by action
+                priority = self._default_priority(members[0].get("action"))
+            self._dispatch([(member["target"], member) for member in members], priority, timeout,
+                           lambda responses: self._deliver(combine(responses), callback, future))
+            return future
+        shard = self.shards[shard_for(target, self.process_count)]
+        seq = self._register(shard, lambda response: self._deliver(response, callback, future))
+        self._send(shard, ("command", seq, command, priority, timeout))
+        return future
+
+    def _classify(self, command):
+        """
+        Returns (target, command) for sharding. JSON text is only scanned for its
+        target and is decoded by the worker process, unless it may be an AGGREGATE
+        query or address a group: those, and commands in other codecs, are decoded
+        here with the router's codec and the decoded command is sent on instead.
+        Undecodable input is sent to the first process, whose router reports it.
+        """
+        if isinstance(command, (dict, Command)):
+            return command.get("target"), command
+        if self.codec.name == "json" and isinstance(command, (str, bytes)):
+            target = _peek_target(command)
+            if target is not None and target not in self.groups:
+                return target, command
+        try:
+            decoded = self.codec.decode(command)
+        except DecodeError:
+            return None, command
+        if not isinstance(decoded, dict):
+            return None, command
+        return decoded.get("target"), decoded
+
+    def _default_priority(self, action):
+        """Returns the priority class the workers' CommandQueue gives a command with this action."""
+        if self.scheduler != "priority":
+            return PRIORITY_NORMAL
+        return self.action_priorities.get(action, PRIORITY_NORMAL)
+
+    def _expand(self, command):
+        """
+        Returns (combine, member commands) for a command answered by several
+        targets, where combine(responses) builds its response from the members'
+        responses, or None for a command that goes to a single target.
+        """
+        if not isinstance(command, (dict, Command)):
+            return None
+        if command.get("action") == "AGGREGATE":
+            return self._expand_aggregate(command)
+        target = command.get("target")
+        group = self.groups.get(target) if isinstance(target, str) else None
+        if group is None:
+            return None
+        command = command.to_dict() if isinstance(command, Command) else command
+        members = [dict(command, target=member) for member in group.members]
+        return lambda responses: self._response(aggregate(group, responses)), members
+
+    def _expand_aggregate(self, command):
+        group = members_of(self.groups, command.get("target"))
+        try:
+            stats = parse_aggregate(command)
+            if group is None:
+                raise ValueError("AGGREGATE target must be a target, a group or a list of them")
+            if command.get("window") is not None:
+                raise ValueError("Window queries are not supported by ProcessCommandQueue")
+        except ValueError as e:
+            error = Error(ErrorCode.INVALID_COMMAND, str(e))
+            logging.warning(error.to_dict())
+            return lambda responses: error.to_dict(), []
+        property = command.get("property")
+        members = [{"action": "OBSERVE", "target": member, "property": property} for member in group.members]
+        return lambda responses: self._response(aggregate_readings(group, property, stats, responses)), members
+
+    def _response(self, result):
+        if isinstance(result, Error):
+            logging.error(result.to_dict())
+            return result.to_dict()
+        return result
+
+    def _deliver(self, response, callback, future):
+        """
+        Resolves the command's future and passes the response to callback or
+        handle_response. A callback that raises is logged and does not stop the
+        receiver thread it runs on.
+        """
+        future.set_result(response)
+        try:
+            if callback is not None:
+                callback(response)
+            else:
+                self.handle_response(response)
+        except Exception as e:
+            error = Error(ErrorCode.INTERNAL_ERROR, f"Response callback failed: {e}")
+            logging.exception(error.to_dict())
+
+    def enqueue_batch(self, command_strings, priority=PRIORITY_NORMAL, timeout=None, callback=None):
+        """
+        Enqueues a batch. Commands are split by owning process and the responses
+        are reassembled in input order. Commands to group targets and AGGREGATE
+        queries are expanded into their members' commands. Returns a Future
+        resolving to the list of responses.
+        :param callback: Called once with the list of responses instead of handle_response.
+        """
+        future = Future()
+        if priority is None:
+            priority = PRIORITY_NORMAL
+        commands, slots = [], []
+        for command in command_strings:
+            target, command = self._classify(command)
+            expanded = self._expand(command)
+            if expanded is None:
+                slots.append((None, len(commands), 1))
+                commands.append((target, command))
+            else:
+                combine, members = expanded
+                slots.append((combine, len(commands), len(members)))
+                commands.extend((member["target"], member) for member in members)
+
+        def complete(responses):
+            self._deliver_batch([
+                responses[start] if combine is None else combine(responses[start:start + size])
+                for combine, start, size in slots
+            ], callback, future)
+
+        self._dispatch(commands, priority, timeout, complete)
+        return future
+
+    def _dispatch(self, commands, priority, timeout, callback):
+        """
+        Sends (target, command) pairs to their owning processes as one batch part
+        per process and calls callback once with every response, in input order.
+        """
+        parts = {}
+        for index, (target, command) in enumerate(commands):
+            shard = self.shards[shard_for(target, self.process_count)]
+            parts.setdefault(shard.index, ([], []))
+            parts[shard.index][0].append(index)
+            parts[shard.index][1].append(command)
+        batch = _PendingBatch(len(commands), len(parts), callback)
+        if not parts:
+            callback([])
+            return
+        for shard_index, (indices, commands) in parts.items():
+            shard = self.shards[shard_index]
+            part_callback = lambda responses, indices=indices: self._complete_part(batch, indices, responses)
+            seq = self._register(shard, part_callback)
+            self._send(shard, ("batch", seq, commands, priority, timeout))
+
+    def _complete_part(self, batch, indices, responses):
+        if isinstance(responses, dict):
+            # The whole part failed (e.g. it expired); every command gets the error.
+            responses = [responses] * len(indices)
+        with self._condition:
+            # Parts complete on different receiver threads.
+            for index, response in zip(indices, responses):
+                batch.responses[index] = response
+            batch.remaining -= 1
+            if batch.remaining:
+                return
+        batch.callback(batch.responses)
+
+    def _deliver_batch(self, responses, callback, future):
+        future.set_result(responses)
+        try:
+            if callback is not None:
+                callback(responses)
+            else:
+                for response in responses:
+                    self.handle_response(response)
+        except Exception as e:
+            error = Error(ErrorCode.INTERNAL_ERROR, f"Response callback failed: {e}")
+            logging.exception(error.to_dict())
+
+    def _receive(self, shard):
+        """Reads lists of (seq, response) pairs from a worker process until it exits."""
+        while True:
+            try:
+                messages = shard.conn.recv()
+            except (EOFError, OSError):
+                messages = None
+            if messages is None:
+                break
+            with self._condition:
+                callbacks = [self._pending.pop(seq)[1] for seq, _ in messages]
+            try:
+                for (_, response), callback in zip(messages, callbacks):
+                    callback(response)
+            finally:
+                with self._condition:
+                    shard.in_flight -= len(messages)
+                    self._condition.notify_all()
+        self._fail_pending(shard)
+
+    def _fail_pending(self, shard):
+        """Answers commands still outstanding on a worker process that has exited."""
+        with self._condition:
+            lost = [(seq, callback) for seq, (owner, callback) in self._pending.items() if owner is shard]
+            for seq, _ in lost:
+                del self._pending[seq]
+            shard.in_flight = 0
+            self._condition.notify_all()
+        for _, callback in lost:
+            error = Error(ErrorCode.INTERNAL_ERROR, f"Worker process {shard.index} exited before responding")
+            logging.error(error.to_dict())
+            callback(error.to_dict())
+
+    def get_stats(self):
+        """Returns the pid, owned targets and commands in flight for each worker process."""
+        with self._condition:
+            return [
+                {
+                    "process": shard.index,
+                    "pid": shard.process.pid if shard.process is not None else None,
+                    "targets": list(shard.targets),
+                    "in_flight": shard.in_flight
+                }
+                for shard in self.shards
+            ]
+
+    def handle_response(self, response):
+        """Handles the response from a worker process."""
+        if isinstance(response, dict) and "error" in response:
+            error = response["error"]
+            print(f"Error {error['code']}: {error['message']}")
+        else:
+            print(response)
@@ -0,0 +1,246 @@
+import heapq
+import logging
+from bisect import bisect_left
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from threading import Condition, Lock, Thread
+from errors import Error, ErrorCode
+
+DEFAULT_CAPACITY = 3600
+
+class RingBuffer:
+    """Fixed-capacity time series of (time.monotonic() timestamp, value) pairs stored as float64 arrays."""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.timestamps = array('d', bytes(8 * capacity))
+        self.values = array('d', bytes(8 * capacity))
+        self.size = 0
+        self._next = 0
+        self._lock = Lock()
+
+    def __len__(self):
+        return self.size
+
+    def append(self, timestamp, value):
+        with self._lock:
+            self.timestamps[self._next] = timestamp
+            self.values[self._next] = value
+            self._next = (self._next + 1) % self.capacity
+            if self.size < self.capacity:
+                self.size += 1
+
+    def latest(self):
+        """Returns the most recent (timestamp, value), or None if empty."""
+        with self._lock:
+            if not self.size:
+                return None
+            index = self._next - 1
+            return self.timestamps[index], self.values[index]
+
+    def window(self, seconds, now=None):
+        """Returns the values sampled in the last `seconds`, oldest first."""
+        cutoff = (time.monotonic() if now is None else now) - seconds
+        values = []
+        with self._lock:
+            index = self._next
+            for _ in range(self.size):
+                index = (index - 1) % self.capacity
+                if self.timestamps[index] < cutoff:
+                    break
+                values.append(self.values[index])
+        values.reverse()
+        return values
+
+    def since(self, cutoff):
+        """
+        Returns the values sampled at or after cutoff, oldest first, as an
+        array('d'). Copies the buffer with array slicing rather than per sample,
+        for aggregating many series.
+        """
+        with self._lock:
+            if self.size < self.capacity:
+                timestamps, values = self.timestamps[:self.size], self.values[:self.size]
+            else:
+                timestamps = self.timestamps[self._next:] + self.timestamps[:self._next]
+                values = self.values[self._next:] + self.values[:self._next]
+        return values[bisect_left(timestamps, cutoff):]
+
+def summarize(values):
+    """Returns count/min/max/mean/latest for a list of samples."""
+    if not values:
+        return {"count": 0, "min": None, "max": None, "mean": None, "latest": None}
+    return {
+        "count": len(values),
+        "min": min(values),
+        "max": max(values),
+        "mean": sum(values) / len(values),
+        "latest": values[-1]
+    }
+
+class SampledSeries:
+    """A (target, property) pair polled at a fixed interval."""
+
+    def __init__(self, target, property, interval, capacity=DEFAULT_CAPACITY):
+        self.target = target
+        self.property = property
+        self.interval = interval
+        self.buffer = RingBuffer(capacity)
+        self.latest_result = None
+        self.latest_time = None
+        self.in_flight = False
+        self.errors = 0
+        self.skipped = 0
+
+    def record(self, result):
+        self.in_flight = False
+        if isinstance(result, Error) or not isinstance(result, dict) or self.property not in result:
+            self.errors += 1
+            return
+        now = time.monotonic()
+        try:
+            self.buffer.append(now, float(result[self.property]))
+        except (TypeError, ValueError):
+            self.errors += 1
+            return
+        self.latest_result = result
+        self.latest_time = now
+
+class SamplingEngine:
+    def __init__(self, router, max_workers=4, staleness_factor=2.0):
+        """
+        Initializes the background sampling engine.
+        :param router: CommandRouter whose adapters are polled.
+        :param max_workers: Threads used to run adapter reads. Split-phase adapters
+                            only occupy a thread while starting their read.
+        :param staleness_factor: An OBSERVE is answered from the latest sample only if
+                                 it is younger than interval * staleness_factor.
+        """
+        self.router = router
+        self.staleness_factor = staleness_factor
+        self.series = {}
+        self.running = False
+        self._heap = []
+        self._seq = count()
+        self._condition = Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="Sampler")
+        self._thread = None
+
+    def add(self, target, property, interval, capacity=DEFAULT_CAPACITY):
+        """Registers a (target, property) pair to be sampled every `interval` seconds."""
+        series = SampledSeries(target, property, interval, capacity)
+        with self._condition:
+            self.series[(target, property)] = series
+            heapq.heappush(self._heap, (time.monotonic(), next(self._seq), series))
+            self._condition.notify()
+        logging.info(f"Sampling '{target}' {property} every {interval}s")
+        return series
+
+    def add_from_config(self, config):
+        """
+        Registers every series declared in an adapters configuration, e.g.
+        "sampling": {"current_humidity": {"interval": 1.0, "capacity": 3600}}.
+        """
+        for target, adapter_info in config.items():
+            for property, options in adapter_info.get("sampling", {}).items():
+                self.add(target, property, options.get("interval", 1.0), options.get("capacity", DEFAULT_CAPACITY))
+
+    def reconcile(self, config, reset=()):
+        """
+        Brings the sampled series in line with a reloaded configuration. Series that
+        are no longer declared are dropped, new ones are added, and series whose
+        interval or capacity changed, or whose target is in reset (e.g. a replaced
+        adapter), start over with an empty buffer.
+        """
+        wanted = {
+            (target, property): options
+            for target, adapter_info in config.items()
+            for property, options in adapter_info.get("sampling", {}).items()
+        }
+        with self._condition:
+            for key, series in list(self.series.items()):
+                options = wanted.get(key)
+                if (options is None or key[0] in reset
+                        or options.get("interval", 1.0) != series.interval
+                        or options.get("capacity", DEFAULT_CAPACITY) != series.buffer.capacity):
+                    # _run drops heap entries whose series is no longer registered.
+                    del self.series[key]
+            missing = [key for key in wanted if key not in self.series]
+        for target, property in missing:
+            options = wanted[(target, property)]
+            self.add(target, property, options.get("interval", 1.0), options.get("capacity", DEFAULT_CAPACITY))
+
+    def start(self):
+        self.running = True
+        self._thread = Thread(target=self._run, daemon=True, name="SamplingEngine")
+        self._thread.start()
+        logging.info("Sampling engine started.")
+
+    def stop(self):
+        with self._condition:
+            self.running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._executor.shutdown(wait=False)
+        logging.info("Sampling engine stopped.")
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self.running:
+                    if self._heap:
+                        delay = self._heap[0][0] - time.monotonic()
+                        if delay <= 0:
+                            break
+                        self._condition.wait(delay)
+                    else:
+                        self._condition.wait()
+                if not self.running:
+                    return
+                due, _, series = heapq.heappop(self._heap)
+                if self.series.get((series.target, series.property)) is not series:
+                    continue
+                heapq.heappush(self._heap, (max(due + series.interval, time.monotonic()), next(self._seq), series))
+            if series.in_flight:
+                # The previous read has not finished yet; skip this tick.
+                continue
+            series.in_flight = True
+            self._executor.submit(self._sample, series)
+
+    def _sample(self, series):
+        # The router's cache and the samples themselves must not answer the
+        # sampler's own reads, but the circuit breaker, lanes and draining apply.
+        if not self.router.read_for_sampling(series.target, series.property, series.record):
+            # Skipped this tick: the target is unknown, its circuit is open, its lane
+            # is full or its adapter is being removed.
+            series.in_flight = False
+            series.skipped += 1
+
+    def latest(self, target, property):
+        """Returns the latest sampled result if it is fresh enough, else None."""
+        series = self.series.get((target, property))
+        if series is None or series.latest_time is None:
+            return None
+        if time.monotonic() - series.latest_time > series.interval * self.staleness_factor:
+            return None
+        return dict(series.latest_result)
+
+    def query_window(self, target, property, seconds):
+        """Returns summary statistics over the last `seconds` of samples, or an Error."""
+        series = self.series.get((target, property))
+        if series is None:
+            return Error(ErrorCode.INVALID_COMMAND, f"'{target}' {property} is not sampled")
+        summary = summarize(series.buffer.window(seconds))
+        summary["window"] = seconds
+        return {property: summary}
+
+    def window_values(self, target, property, seconds):
+        """Returns the samples of the last `seconds` as an array('d'), or an Error if the series is not sampled."""
+        series = self.series.get((target, property))
+        if series is None:
+            return Error(ErrorCode.INVALID_COMMAND, f"'{target}' {property} is not sampled")
+        return series.buffer.since(time.monotonic() - seconds)
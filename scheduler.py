@@ -0,0 +1,328 @@
+import time
+from collections import deque
+from itertools import count
+from threading import Condition, Lock
+
+# Priority classes; lower values are served first.
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 10
+
+DEFAULT_ACTION_PRIORITIES = {
+    "ACTUATE": PRIORITY_HIGH,
+    "OBSERVE": PRIORITY_LOW,
+}
+
+# What put does when the scheduler already holds max_depth commands.
+OVERFLOW_BLOCK = "block"                # wait for a worker to free a slot
+OVERFLOW_REJECT = "reject"              # refuse the new command
+OVERFLOW_DROP_OLDEST_OBSERVE = "drop_oldest_observe"  # evict the oldest queued OBSERVE
+OVERFLOW_COALESCE = "coalesce"          # merge into a pending command for the same target/property
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_REJECT, OVERFLOW_DROP_OLDEST_OBSERVE, OVERFLOW_COALESCE)
+
+# Outcomes of put.
+ACCEPTED = "accepted"
+COALESCED = "coalesced"
+REJECTED = "rejected"
+
+class QueuedCommand:
+    """
+    A command waiting in a scheduler, with its scheduling metadata. callback, if
+    set, receives the command's response instead of CommandQueue.handle_response.
+    key is the command's (action, target, property), or None for batches and
+    commands that could not be parsed. followers are later commands coalesced
+    into this one, which receive the same response. journal_seqs are the command's
+    sequence numbers in the CommandQueue's journal, completed once it is answered.
+    """
+    __slots__ = ("command", "priority", "deadline", "enqueued_at", "seq", "callback", "key", "future", "followers",
+                 "journal_seqs")
+
+    def __init__(self, command, priority=PRIORITY_NORMAL, deadline=None, callback=None, key=None, future=None):
+        self.command = command
+        self.priority = priority
+        self.deadline = deadline
+        self.enqueued_at = time.monotonic()
+        self.seq = None
+        self.callback = callback
+        self.key = key
+        self.future = future
+        self.followers = None
+        self.journal_seqs = None
+
+    def is_expired(self, now):
+        return self.deadline is not None and now >= self.deadline
+
+class _ClassStats:
+    __slots__ = ("dequeued", "expired", "total_wait", "max_wait", "rejected", "dropped", "coalesced")
+
+    def __init__(self):
+        self.dequeued = 0
+        self.expired = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.rejected = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+def _is_observe(item):
+    return item.key is not None and item.key[0] == "OBSERVE"
+
+class _Scheduler:
+    def __init__(self, on_expired=None, max_depth=None, overflow=OVERFLOW_BLOCK, on_dropped=None):
+        """
+        :param on_expired: Called with each QueuedCommand dropped because its
+                           deadline passed before a worker picked it up.
+        :param max_depth: Maximum number of queued commands, or None for unbounded.
+        :param overflow: One of OVERFLOW_POLICIES, applied when put finds the
+                         scheduler full. With OVERFLOW_COALESCE, commands are merged
+                         into a pending command with the same key even below max_depth.
+        :param on_dropped: Called with each QueuedCommand evicted by
+                           OVERFLOW_DROP_OLDEST_OBSERVE.
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.on_expired = on_expired
+        self.on_dropped = on_dropped
+        self.max_depth = max_depth
+        self.overflow = overflow
+        self.closed = False
+        lock = Lock()
+        self._condition = Condition(lock)
+        self._not_full = Condition(lock)
+        self._seq = count()
+        self._unfinished = 0
+        self._stats = {}
+        self._pending_keys = {}
+
+    def _full(self):
+        return self.max_depth is not None and len(self) >= self.max_depth
+
+    def put(self, item, force=False):
+        """
+        Adds a QueuedCommand to the scheduler, applying the overflow policy.
+        Returns ACCEPTED, COALESCED (the item will receive the response of the
+        pending command it was merged into) or REJECTED.
+        :param force: Accept the item even when the scheduler is full, e.g. for
+                      replayed journal entries that must not be rejected.
+        """
+        dropped = None
+        with self._condition:
+            if self.overflow == OVERFLOW_COALESCE and item.key is not None:
+                pending = self._pending_keys.get(item.key)
+                if pending is not None:
+                    # The newest command wins, e.g. the latest ACTUATE value.
+                    pending.command = item.command
+                    if pending.followers is None:
+                        pending.followers = []
+                    pending.followers.append(item)
+                    self._class_stats(item.priority).coalesced += 1
+                    return COALESCED
+            if not force and self._full():
+                if self.overflow == OVERFLOW_BLOCK:
+                    while self._full() and not self.closed:
+                        self._not_full.wait()
+                elif self.overflow == OVERFLOW_DROP_OLDEST_OBSERVE:
+                    dropped = self._remove_first(_is_observe)
+                    if dropped is not None:
+                        self._forget(dropped)
+                        self._unfinished -= 1
+                        self._class_stats(dropped.priority).dropped += 1
+                if self.closed or self._full():
+                    self._class_stats(item.priority).rejected += 1
+                    return REJECTED
+            item.seq = next(self._seq)
+            self._push(item)
+            if self.overflow == OVERFLOW_COALESCE and item.key is not None:
+                self._pending_keys[item.key] = item
+            self._unfinished += 1
+            self._condition.notify()
+        if dropped is not None and self.on_dropped is not None:
+            self.on_dropped(dropped)
+        return ACCEPTED
+
+    def _forget(self, item):
+        """Removes an item leaving the queue from the coalescing index."""
+        if item.key is not None and self._pending_keys.get(item.key) is item:
+            del self._pending_keys[item.key]
+
+    def requeue(self, item):
+        """Returns a command taken from the scheduler with get back to it, unprocessed."""
+        with self._condition:
+            self._push(item)
+            self._condition.notify()
+
+    def get(self):
+        """
+        Blocks until a command is available and returns it, dropping commands
+        whose deadline has passed. Returns None once the scheduler is closed.
+        """
+        while True:
+            expired = []
+            try:
+                with self._condition:
+                    while True:
+                        while not self.closed and not len(self) and not expired:
+                            self._condition.wait()
+                        if self.closed:
+                            return None
+                        if not len(self):
+                            # Only expired commands so far: report them before waiting again
+                            break
+                        now = time.monotonic()
+                        item = self._pop(now)
+                        self._forget(item)
+                        self._not_full.notify()
+                        stats = self._class_stats(item.priority)
+                        if item.is_expired(now):
+                            stats.expired += 1
+                            self._unfinished -= 1
+                            if self._unfinished <= 0:
+                                self._condition.notify_all()
+                            expired.append(item)
+                            continue
+                        wait = now - item.enqueued_at
+                        stats.dequeued += 1
+                        stats.total_wait += wait
+                        if wait > stats.max_wait:
+                            stats.max_wait = wait
+                        return item
+            finally:
+                if self.on_expired is not None:
+                    for item in expired:
+                        self.on_expired(item)
+
+    def task_done(self):
+        """Marks a command returned by get as processed."""
+        with self._condition:
+            self._unfinished -= 1
+            if self._unfinished <= 0:
+                self._condition.notify_all()
+
+    def join(self):
+        """Blocks until every queued command has been processed."""
+        with self._condition:
+            while self._unfinished > 0 and not self.closed:
+                self._condition.wait()
+
+    def close(self):
+        """Wakes every blocked get and put call; get then returns None and put rejects."""
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+            self._not_full.notify_all()
+
+    def qsize(self):
+        with self._condition:
+            return len(self)
+
+    def _class_stats(self, priority):
+        stats = self._stats.get(priority)
+        if stats is None:
+            stats = self._stats[priority] = _ClassStats()
+        return stats
+
+    def get_stats(self):
+        """
+        Returns queue-wait statistics per priority class: {priority: {"depth",
+        "dequeued", "expired", "rejected", "dropped", "coalesced", "mean_wait", "max_wait"}}.
+        """
+        with self._condition:
+            depths = self._depths()
+            result = {}
+            for priority in set(self._stats) | set(depths):
+                stats = self._class_stats(priority)
+                result[priority] = {
+                    "depth": depths.get(priority, 0),
+                    "dequeued": stats.dequeued,
+                    "expired": stats.expired,
+                    "rejected": stats.rejected,
+                    "dropped": stats.dropped,
+                    "coalesced": stats.coalesced,
+                    "mean_wait": stats.total_wait / stats.dequeued if stats.dequeued else 0.0,
+                    "max_wait": stats.max_wait
+                }
+            return result
+
+class FifoScheduler(_Scheduler):
+    """Serves commands strictly in arrival order."""
+
+    def __init__(self, on_expired=None, **kwargs):
+        super().__init__(on_expired, **kwargs)
+        self._items = deque()
+
+    def __len__(self):
+        return len(self._items)
+
+    def _push(self, item):
+        self._items.append(item)
+
+    def _pop(self, now):
+        return self._items.popleft()
+
+    def _remove_first(self, predicate):
+        for index, item in enumerate(self._items):
+            if predicate(item):
+                del self._items[index]
+                return item
+        return None
+
+    def _depths(self):
+        depths = {}
+        for item in self._items:
+            depths[item.priority] = depths.get(item.priority, 0) + 1
+        return depths
+
+class PriorityScheduler(_Scheduler):
+    """
+    Serves the most urgent priority class first, FIFO within a class. Waiting
+    commands age: every second in the queue lowers a command's effective
+    priority value by aging_rate, so low-priority work is never starved.
+    """
+
+    def __init__(self, aging_rate=1.0, on_expired=None, **kwargs):
+        super().__init__(on_expired, **kwargs)
+        self.aging_rate = aging_rate
+        self._classes = {}
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _push(self, item):
+        items = self._classes.get(item.priority)
+        if items is None:
+            items = self._classes[item.priority] = deque()
+        items.append(item)
+        self._size += 1
+
+    def _pop(self, now):
+        best = None
+        best_score = None
+        for items in self._classes.values():
+            if not items:
+                continue
+            head = items[0]
+            score = (head.priority - self.aging_rate * (now - head.enqueued_at), head.seq)
+            if best_score is None or score < best_score:
+                best, best_score = items, score
+        self._size -= 1
+        return best.popleft()
+
+    def _remove_first(self, predicate):
+        """Removes the longest-queued item matching predicate, across all classes."""
+        best = None
+        for items in self._classes.values():
+            for index, item in enumerate(items):
+                if predicate(item):
+                    if best is None or item.seq < best[2].seq:
+                        best = (items, index, item)
+                    break
+        if best is None:
+            return None
+        items, index, item = best
+        del items[index]
+        self._size -= 1
+        return item
+
+    def _depths(self):
+        return {priority: len(items) for priority, items in self._classes.items() if items}
@@ -0,0 +1,256 @@
+"""
+Network ingress for PRISM commands.
+
+Clients send newline-delimited JSON over TCP or a Unix socket, one command per
+line. A command may carry an "id", which is echoed in its response; responses
+are written as soon as they are ready, so many commands can be pipelined on one
+connection and matched back by id. A line of the form {"id": ..., "batch": [...]}
+is routed with route_batch_async and answered with one line.
+
+A line {"id": ..., "subscribe": {"target": ..., "property": ...}} streams
+adapter events (e.g. motion_detected on a GPIO edge) to the connection as
+{"id": ..., "event": {...}} lines until {"id": ..., "unsubscribe": <id>} is
+sent or the connection closes. Target and property may be omitted to match any.
+
+Responses are {"id": ..., "result": {...}} or {"id": ..., "error": {"code", "message"}}.
+
+    python server.py --config adapters_config.json --port 7878 --unix /run/prism.sock
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+from collections.abc import Hashable
+from async_router import AsyncCommandRouter
+from codec import DecodeError, get_codec
+from errors import Error, ErrorCode
+
+DEFAULT_PORT = 7878
+
+class CommandServer:
+    def __init__(self, router, host="127.0.0.1", port=DEFAULT_PORT, unix_path=None,
+                 max_in_flight=4096, max_in_flight_per_connection=256, max_line_bytes=65536,
+                 max_event_backlog_bytes=1048576):
+        """
+        Initializes the command server.
+        :param router: AsyncCommandRouter that executes the commands.
+        :param port: TCP port, or None to only listen on the Unix socket.
+        :param unix_path: Optional Unix socket path.
+        :param max_in_flight: Commands being routed at once across all connections.
+                              Once reached, the server stops reading from sockets, so
+                              clients are slowed down by TCP flow control.
+        :param max_in_flight_per_connection: The same limit for a single connection,
+                                             so one client cannot take every slot.
+        :param max_line_bytes: Longest accepted command line.
+        :param max_event_backlog_bytes: Unsent bytes on a connection above which
+                                        subscribed events are dropped rather than
+                                        buffered for a client that is not reading.
+        """
+        self.router = router
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        self.max_in_flight = max_in_flight
+        self.max_in_flight_per_connection = max_in_flight_per_connection
+        self.max_line_bytes = max_line_bytes
+        self.max_event_backlog_bytes = max_event_backlog_bytes
+        self.codec = get_codec("json")
+        self.servers = []
+        self.connections = 0
+        self._slots = None
+
+    async def start(self):
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        if self.port is not None:
+            server = await asyncio.start_server(self._handle_connection, self.host, self.port,
+                                                limit=self.max_line_bytes)
+            self.port = server.sockets[0].getsockname()[1]
+            self.servers.append(server)
+            logging.info(f"Listening for commands on {self.host}:{self.port}")
+        if self.unix_path is not None:
+            if os.path.exists(self.unix_path):
+                os.unlink(self.unix_path)
+            server = await asyncio.start_unix_server(self._handle_connection, self.unix_path,
+                                                     limit=self.max_line_bytes)
+            self.servers.append(server)
+            logging.info(f"Listening for commands on {self.unix_path}")
+
+    async def stop(self):
+        for server in self.servers:
+            server.close()
+            await server.wait_closed()
+        self.servers = []
+        if self.unix_path is not None and os.path.exists(self.unix_path):
+            os.unlink(self.unix_path)
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await asyncio.gather(*(server.serve_forever() for server in self.servers))
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await self.stop()
+
+    async def _handle_connection(self, reader, writer):
+        self.connections += 1
+        connection_slots = asyncio.Semaphore(self.max_in_flight_per_connection)
+        tasks = set()
+        subscriptions = {}
+        try:
+            while True:
+                # Only a line that has arrived takes a server-wide slot, so idle
+                # connections and subscribers do not hold one.
+                await connection_slots.acquire()
+                try:
+                    line = await reader.readline()
+                except (asyncio.LimitOverrunError, ValueError):
+                    connection_slots.release()
+                    error = Error(ErrorCode.INVALID_COMMAND, f"Command exceeds {self.max_line_bytes} bytes")
+                    self._write(writer, None, error.to_dict())
+                    break
+                except ConnectionError:
+                    connection_slots.release()
+                    break
+                if not line:
+                    connection_slots.release()
+                    break
+                if not line.strip():
+                    connection_slots.release()
+                    continue
+                await self._slots.acquire()
+                task = asyncio.ensure_future(self._serve_line(line, writer, connection_slots, subscriptions))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            self.connections -= 1
+            for subscription in subscriptions.values():
+                subscription.close()
+            try:
+                await writer.drain()
+            except ConnectionError:
+                pass
+            writer.close()
+
+    def _release(self, connection_slots):
+        connection_slots.release()
+        self._slots.release()
+
+    async def _serve_line(self, line, writer, connection_slots, subscriptions):
+        request_id = None
+        try:
+            try:
+                request = self.codec.decode(line)
+            except DecodeError:
+                error = Error(ErrorCode.INVALID_COMMAND, "Invalid JSON command")
+                response = error.to_dict()
+            else:
+                if isinstance(request, dict):
+                    request_id = request.pop("id", None)
+                if isinstance(request, dict) and "batch" in request:
+                    response = await self.router.route_batch_async(request["batch"])
+                elif isinstance(request, dict) and "subscribe" in request:
+                    response = self._subscribe(request_id, request["subscribe"], writer, subscriptions)
+                elif isinstance(request, dict) and "unsubscribe" in request:
+                    response = self._unsubscribe(request["unsubscribe"], subscriptions)
+                else:
+                    response = await self.router.route_parsed_async(request)
+            try:
+                self._write(writer, request_id, response)
+            except (TypeError, ValueError, OverflowError) as e:
+                # The result has values the codec cannot encode
+                error = Error(ErrorCode.INTERNAL_ERROR, f"Response could not be encoded: {e}")
+                logging.error(error.to_dict())
+                self._write(writer, request_id, error.to_dict())
+            if writer.transport.get_write_buffer_size() > 0:
+                await writer.drain()
+        except ConnectionError:
+            pass
+        except Exception as e:
+            # Answer this line and keep serving the connection's other lines
+            error = Error(ErrorCode.INTERNAL_ERROR, f"Error serving command: {e}")
+            logging.exception(error.to_dict())
+            self._write(writer, request_id, error.to_dict())
+        finally:
+            self._release(connection_slots)
+
+    def _subscribe(self, request_id, spec, writer, subscriptions):
+        if not isinstance(spec, dict):
+            return Error(ErrorCode.INVALID_COMMAND, "subscribe must be an object").to_dict()
+        if not isinstance(request_id, Hashable):
+            return Error(ErrorCode.INVALID_COMMAND, "Subscription id must be a string or number").to_dict()
+        if request_id in subscriptions:
+            return Error(ErrorCode.INVALID_COMMAND, f"Subscription {request_id!r} already exists").to_dict()
+        loop = asyncio.get_running_loop()
+
+        def deliver(event):
+            # Runs on the event bus's dispatcher thread.
+            try:
+                loop.call_soon_threadsafe(self._write_event, writer, request_id, event, subscription)
+            except RuntimeError:
+                subscription.close()
+
+        target, property = spec.get("target"), spec.get("property")
+        subscription = self.router.subscribe(target, property, callback=deliver)
+        subscriptions[request_id] = subscription
+        return {"subscribed": {"target": target, "property": property}}
+
+    def _unsubscribe(self, subscription_id, subscriptions):
+        if not isinstance(subscription_id, Hashable):
+            return Error(ErrorCode.INVALID_COMMAND, "Subscription id must be a string or number").to_dict()
+        subscription = subscriptions.pop(subscription_id, None)
+        if subscription is not None:
+            subscription.close()
+        return {"unsubscribed": subscription is not None}
+
+    def _write_event(self, writer, request_id, event, subscription):
+        if writer.is_closing():
+            subscription.close()
+            return
+        if writer.transport.get_write_buffer_size() > self.max_event_backlog_bytes:
+            subscription.dropped += 1
+            self.router.events.dropped_total.labels(event.target).inc()
+            return
+        writer.write(self.codec.encode({"id": request_id, "event": event.to_dict()}) + b"\n")
+
+    def _write(self, writer, request_id, response):
+        if writer.is_closing():
+            return
+        if isinstance(response, dict) and "error" in response:
+            message = {"id": request_id, "error": response["error"]}
+        else:
+            message = {"id": request_id, "result": response}
+        writer.write(self.codec.encode(message) + b"\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve PRISM commands over TCP and Unix sockets.")
+    parser.add_argument("--config", default="adapters_config.json")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--no-tcp", action="store_true", help="Only listen on the Unix socket.")
+    parser.add_argument("--unix", default=None, help="Unix socket path.")
+    parser.add_argument("--max-in-flight", type=int, default=4096)
+    args = parser.parse_args()
+
+    router = AsyncCommandRouter(args.config)
+    server = CommandServer(router, args.host, None if args.no_tcp else args.port, args.unix,
+                           max_in_flight=args.max_in_flight)
+
+    async def run():
+        task = asyncio.ensure_future(server.serve_forever())
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, task.cancel)
+        await task
+
+    try:
+        asyncio.run(run())
+    finally:
+        router.shutdown()
+        router.cleanup_all()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Simulated device backends for load testing without hardware.
+
+LatencyProfile draws reproducible per-operation delays, and FakeSMBus and
+FakeHTTPPool stand in for smbus2.SMBus and http_pool.HTTPSessionPool, sleeping
+for a drawn delay on every transfer or request. GPIO is simulated by fake_gpio.
+adapters.simulated_adapter puts these behind a normal adapter, configured from
+adapters_config.json.
+"""
+import math
+import random
+import time
+from threading import Lock
+from http_pool import HTTPResponse
+
+class LatencyProfile:
+    def __init__(self, distribution="fixed", seconds=0.0, low=0.0, high=0.0, median=0.0, sigma=0.5,
+                 tail_probability=0.0, tail_seconds=0.0, seed=None):
+        """
+        Initializes a latency profile.
+        :param distribution: "fixed" (always seconds), "uniform" (between low and high)
+                             or "lognormal" (around median, spread by sigma).
+        :param tail_probability: Chance that an operation also stalls for tail_seconds,
+                                 e.g. a bus retry or a GC pause on the device's server.
+        :param seed: Seed for this profile's random generator, so runs are reproducible.
+        """
+        if distribution not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        self.distribution = distribution
+        self.seconds = seconds
+        self.low = low
+        self.high = high
+        self.median = median
+        self.sigma = sigma
+        self.tail_probability = tail_probability
+        self.tail_seconds = tail_seconds
+        self._random = random.Random(seed)
+        self._lock = Lock()
+
+    @classmethod
+    def from_dict(cls, spec, seed=None):
+        """Builds a profile from a config dict such as {"distribution": "lognormal", "median": 0.002}."""
+        spec = dict(spec or {})
+        spec.setdefault("seed", seed)
+        return cls(**spec)
+
+    def sample(self):
+        """Returns the next delay in seconds."""
+        with self._lock:
+            if self.distribution == "fixed":
+                delay = self.seconds
+            elif self.distribution == "uniform":
+                delay = self._random.uniform(self.low, self.high)
+            else:
+                delay = self.median * math.exp(self._random.gauss(0.0, self.sigma)) if self.median else 0.0
+            if self.tail_probability and self._random.random() < self.tail_probability:
+                delay += self.tail_seconds
+            return delay
+
+    def chance(self, probability):
+        """Returns True with the given probability, drawn from this profile's generator."""
+        with self._lock:
+            return self._random.random() < probability
+
+    def wait(self):
+        delay = self.sample()
+        if delay > 0:
+            time.sleep(delay)
+
+class FakeSMBus:
+    """An smbus2.SMBus stand-in whose transfers take a LatencyProfile's time."""
+
+    def __init__(self, bus_number, latency=None):
+        self.bus_number = bus_number
+        self.latency = latency or LatencyProfile()
+        self.registers = {}
+
+    def write_byte(self, address, value):
+        self.latency.wait()
+        self.registers[address] = value
+
+    def read_byte(self, address):
+        self.latency.wait()
+        return self.registers.get(address, 0)
+
+    def read_i2c_block_data(self, address, register, length):
+        self.latency.wait()
+        # A mid-scale reading: 0x6666 is about 44% RH on an HTU21D.
+        return [0x66, 0x66, 0x00][:length] + [0] * max(0, length - 3)
+
+    def close(self):
+        pass
+
+class FakeHTTPPool:
+    """An HTTPSessionPool stand-in that answers every request with 200 after a LatencyProfile's time."""
+
+    def __init__(self, latency=None):
+        self.latency = latency or LatencyProfile()
+        self.requests = 0
+
+    def request(self, method, url, timeout=None, **kwargs):
+        self.latency.wait()
+        self.requests += 1
+        return HTTPResponse(200, b'{"ok": true}', url)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        pass
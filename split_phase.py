@@ -0,0 +1,95 @@
+import heapq
+import logging
+import time
+from itertools import count
+from threading import Condition, Thread
+from errors import Error, ErrorCode
+
+class PendingOperation:
+    """
+    An adapter operation that has been started and can be completed once its
+    delay has elapsed, e.g. a sensor conversion triggered over I2C.
+    """
+    __slots__ = ("ready_at", "_complete")
+
+    def __init__(self, delay, complete):
+        """
+        :param delay: Seconds until the operation can be completed.
+        :param complete: Callable returning the operation's result.
+        """
+        self.ready_at = time.monotonic() + delay
+        self._complete = complete
+
+    def remaining(self):
+        """Returns the seconds left until the operation can be completed."""
+        return max(0.0, self.ready_at - time.monotonic())
+
+    def wait(self):
+        """Blocks until the operation is ready, then completes it."""
+        time.sleep(self.remaining())
+        return self.complete()
+
+    def complete(self):
+        return self._complete()
+
+class CompletionTimer:
+    def __init__(self, name="CompletionTimer"):
+        """
+        Completes PendingOperations on a single background thread when they are due,
+        so worker threads do not sleep through conversion times.
+        """
+        self.name = name
+        self.running = False
+        self._heap = []
+        self._seq = count()
+        self._condition = Condition()
+        self._thread = None
+
+    def start(self):
+        with self._condition:
+            if self.running:
+                return
+            self.running = True
+            self._thread = Thread(target=self._run, daemon=True, name=self.name)
+            self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self.running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def schedule(self, operation, callback):
+        """Completes operation when it is ready and passes the result to callback."""
+        if not self.running:
+            self.start()
+        with self._condition:
+            heapq.heappush(self._heap, (operation.ready_at, next(self._seq), operation, callback))
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self.running:
+                    if self._heap:
+                        delay = self._heap[0][0] - time.monotonic()
+                        if delay <= 0:
+                            break
+                        self._condition.wait(delay)
+                    else:
+                        self._condition.wait()
+                if not self.running:
+                    return
+                _, _, operation, callback = heapq.heappop(self._heap)
+            try:
+                result = operation.complete()
+            except Exception as e:
+                result = Error(ErrorCode.ADAPTER_EXECUTION_FAILED, f"Error completing operation: {e}")
+                logging.error(result.to_dict())
+            try:
+                callback(result)
+            except Exception as e:
+                error = Error(ErrorCode.INTERNAL_ERROR, f"Error in completion callback: {e}")
+                logging.exception(error.to_dict())
@@ -0,0 +1,152 @@
+import logging
+from aggregation import compute_stats
+from errors import Error, ErrorCode
+
+DEFAULT_MAX_PARALLEL = 16
+DEFAULT_TIMEOUT = 10.0
+
+class TargetGroup:
+    """A named set of targets that receive the same command, e.g. every light on a floor."""
+    __slots__ = ("name", "members", "max_parallel", "timeout")
+
+    def __init__(self, name, members, max_parallel=DEFAULT_MAX_PARALLEL, timeout=DEFAULT_TIMEOUT):
+        self.name = name
+        self.members = tuple(members)
+        self.max_parallel = max(1, int(max_parallel))
+        self.timeout = timeout
+
+    def __repr__(self):
+        return f"TargetGroup({self.name!r}, {len(self.members)} members)"
+
+def is_group(info):
+    """Returns True for a group entry in adapters_config.json."""
+    return isinstance(info, dict) and "group" in info
+
+def load_groups(config):
+    """
+    Builds {name: TargetGroup} from the group entries of an adapters configuration:
+
+        "floor3_lights": {"group": ["light_301", "light_302", "floor3_hall"],
+                          "max_parallel": 32, "timeout": 5.0}
+
+    Members that are groups themselves are expanded, and a target reached twice
+    is only sent the command once. A group that contains itself is skipped.
+    """
+    entries = {name: info for name, info in config.items() if is_group(info)}
+    groups = {}
+
+    def expand(name, path):
+        members = []
+        for member in entries[name]["group"]:
+            if member in path:
+                raise ValueError(f"group '{member}' contains itself")
+            members.extend(expand(member, path + (member,)) if member in entries else [member])
+        return members
+
+    for name, info in entries.items():
+        try:
+            members = list(dict.fromkeys(expand(name, (name,))))
+        except ValueError as e:
+            error = Error(ErrorCode.ADAPTER_INITIALIZATION_FAILED, f"Invalid group '{name}': {e}")
+            logging.error(error.to_dict())
+            continue
+        groups[name] = TargetGroup(
+            name, members,
+            max_parallel=info.get("max_parallel", DEFAULT_MAX_PARALLEL),
+            timeout=info.get("timeout", DEFAULT_TIMEOUT)
+        )
+    return groups
+
+def members_of(groups, target):
+    """
+    Returns the TargetGroup covered by an AGGREGATE target: a group, a single
+    target, or a list of targets and groups. Returns None for anything else.
+    """
+    if isinstance(target, str):
+        return groups.get(target) or TargetGroup(target, [target])
+    if not isinstance(target, list) or not target or not all(isinstance(name, str) for name in target):
+        return None
+    members = []
+    for name in target:
+        group = groups.get(name)
+        members.extend(group.members if group is not None else [name])
+    return TargetGroup(",".join(target), dict.fromkeys(members))
+
+def expired_error(group, member):
+    error = Error(ErrorCode.COMMAND_EXPIRED, f"No response from '{member}' within the {group.timeout}s timeout of group '{group.name}'")
+    return error.to_dict()
+
+def all_failed(errors, description):
+    """
+    Returns the Error for a fan-out in which every member failed, given
+    {member: {"code", "message"}}: the members' common error code
+    (ADAPTER_EXECUTION_FAILED if they differ) and the first member's message.
+    """
+    codes = {error.get("code") for error in errors.values()}
+    code = ErrorCode.ADAPTER_EXECUTION_FAILED
+    if len(codes) == 1:
+        try:
+            code = ErrorCode(codes.pop())
+        except ValueError:
+            pass
+    member, error = next(iter(errors.items()))
+    return Error(code, f"All {len(errors)} members of {description} failed; '{member}': {error.get('message')}")
+
+def aggregate(group, responses):
+    """
+    Combines the members' responses (in member order; None for members that did
+    not answer in time) into the group's response:
+
+        {"group": name, "succeeded": n, "failed": m,
+         "results": {member: response}, "errors": {member: {"code", "message"}}}
+
+    Partial failures are a normal response listing each failed member's error. If
+    every member failed, an Error is returned instead, with the members' common
+    error code (ADAPTER_EXECUTION_FAILED if they differ).
+    """
+    results, errors = {}, {}
+    for member, response in zip(group.members, responses):
+        if response is None:
+            response = expired_error(group, member)
+        if isinstance(response, dict) and "error" in response:
+            errors[member] = response["error"]
+        else:
+            results[member] = response
+    if errors and not results:
+        return all_failed(errors, f"group '{group.name}'")
+    return {"group": group.name, "succeeded": len(results), "failed": len(errors), "results": results, "errors": errors}
+
+def aggregate_readings(group, property, stats, readings, window=None):
+    """
+    Computes an AGGREGATE response from the members' readings (in member order):
+    OBSERVE responses, sample arrays for windowed queries, or None for members
+    that did not answer in time:
+
+        {"aggregate": property, "targets": n, "stats": {name: value},
+         "errors": {member: {"code", "message"}}}
+
+    Failed members and non-numeric readings are listed under "errors" and left
+    out of the statistics. If every member failed, an Error is returned instead.
+    """
+    series, errors = [], {}
+    for member, reading in zip(group.members, readings):
+        if reading is None:
+            reading = expired_error(group, member)
+        if isinstance(reading, dict):
+            if "error" in reading:
+                errors[member] = reading["error"]
+                continue
+            value = reading.get(property)
+            if type(value) not in (int, float):
+                errors[member] = Error(
+                    ErrorCode.ADAPTER_EXECUTION_FAILED, f"'{member}' returned a non-numeric {property}: {value!r}"
+                ).to_dict()["error"]
+                continue
+            reading = (value,)
+        series.append(reading)
+    if errors and not series:
+        return all_failed(errors, f"AGGREGATE over '{group.name}'")
+    result = {"aggregate": property, "targets": len(series), "stats": compute_stats(series, stats), "errors": errors}
+    if window is not None:
+        result["window"] = window
+    return result
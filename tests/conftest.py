@@ -0,0 +1,39 @@
+import json
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logging_config import configure_logging
+
+# Log to stderr only, before core configures its default prism.log file.
+configure_logging(log_file=None, level=logging.WARNING)
+
+import pytest
+
+@pytest.fixture
+def write_config(tmp_path):
+    """Writes an adapters configuration dict to a file and returns its path."""
+    def write(config, name="adapters_config.json"):
+        path = tmp_path / name
+        path.write_text(json.dumps(config))
+        return str(path)
+    return write
+
+@pytest.fixture
+def make_router(write_config):
+    """Builds CommandRouters (or a subclass) from config dicts, cleaning them up afterwards."""
+    from core import CommandRouter
+    routers = []
+
+    def make(config, router_class=CommandRouter, **kwargs):
+        router = router_class(write_config(config), **kwargs)
+        routers.append(router)
+        return router
+    yield make
+    for router in routers:
+        router.cleanup_all()
+        shutdown = getattr(router, "shutdown", None)
+        if shutdown is not None:
+            shutdown()
@@ -0,0 +1,19 @@
+import time
+
+def simulated(**params):
+    """Returns a config entry for a SimulatedAdapter with no latency."""
+    return {"module": "simulated_adapter", "params": dict(params)}
+
+def counting_reads(adapter, value=0, delay=0.0):
+    """Makes a SimulatedAdapter return value from every read and count its reads in adapter.reads."""
+    adapter.reads = 0
+
+    def transfer(written=None):
+        if written is not None:
+            return written
+        adapter.reads += 1
+        if delay:
+            time.sleep(delay)
+        return value
+    adapter._transfer = transfer
+    return adapter
@@ -0,0 +1,108 @@
+import sys
+import time
+import types
+from threading import Event, Lock, Thread
+import pytest
+from adapters.simulated_adapter import SimulatedAdapter
+from errors import ErrorCode
+from helpers import simulated
+
+OBSERVE = {"action": "OBSERVE", "property": "value"}
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def observe(router, target):
+    return router.route_command(dict(OBSERVE, target=target))
+
+@pytest.fixture
+def slow_adapter(monkeypatch):
+    """
+    Registers adapters.slow_adapter, whose SlowAdapter blocks in __init__ until
+    released (or for init_seconds) and counts its constructions.
+    """
+    class SlowAdapter(SimulatedAdapter):
+        release = Event()
+        constructed = 0
+        lock = Lock()
+
+        def __init__(self, init_seconds=None, **kwargs):
+            with SlowAdapter.lock:
+                SlowAdapter.constructed += 1
+            if init_seconds is None:
+                SlowAdapter.release.wait(5)
+            else:
+                time.sleep(init_seconds)
+            super().__init__(**kwargs)
+
+    module = types.ModuleType("adapters.slow_adapter")
+    module.SlowAdapter = SlowAdapter
+    monkeypatch.setitem(sys.modules, "adapters.slow_adapter", module)
+    yield SlowAdapter
+    SlowAdapter.release.set()
+
+def slow(**params):
+    return {"module": "slow_adapter", "params": params}
+
+def test_parallel_init_runs_adapters_concurrently(make_router, slow_adapter):
+    config = {f"slow_{i}": slow(init_seconds=0.2) for i in range(4)}
+    start = time.monotonic()
+    router = make_router(config, init_mode="parallel", init_workers=4)
+    assert time.monotonic() - start < 0.6
+    assert set(router.adapters) == set(config)
+    assert all(entry["status"] == "loaded" for entry in router.get_init_report().values())
+
+def test_slow_and_failing_adapters_do_not_block_the_others(make_router, slow_adapter):
+    config = {"slow": slow(), "broken": simulated(backend="bogus"), "fast": simulated()}
+    start = time.monotonic()
+    router = make_router(config, init_mode="parallel", startup_budget=0.1)
+    assert time.monotonic() - start < 1.0
+
+    report = router.get_init_report()
+    assert report["fast"]["status"] == "loaded"
+    assert report["broken"]["status"] == "failed"
+    assert "Unknown simulated backend" in report["broken"]["error"]
+    assert report["slow"]["status"] == "pending"
+    assert observe(router, "fast") == {"value": 0}
+    assert observe(router, "slow")["error"]["code"] == ErrorCode.UNKNOWN_TARGET.value
+    assert observe(router, "broken")["error"]["code"] == ErrorCode.UNKNOWN_TARGET.value
+
+    # The slow adapter is registered once it finishes initializing.
+    slow_adapter.release.set()
+    wait_for(lambda: "slow" in router.adapters)
+    assert router.get_init_report()["slow"]["status"] == "loaded"
+    assert observe(router, "slow") == {"value": 0}
+
+def test_lazy_adapters_initialize_on_first_use(make_router, slow_adapter):
+    slow_adapter.release.set()
+    config = {"slow": slow(), "broken": simulated(backend="bogus"), "fast": simulated()}
+    router = make_router(config, init_mode="lazy")
+    assert router.adapters == {}
+    assert slow_adapter.constructed == 0
+    assert {entry["status"] for entry in router.get_init_report().values()} == {"deferred"}
+
+    assert observe(router, "slow") == {"value": 0}
+    assert observe(router, "slow") == {"value": 0}
+    assert slow_adapter.constructed == 1
+    assert set(router.adapters) == {"slow"}
+    assert router.get_init_report()["slow"]["status"] == "loaded"
+    assert router.get_init_report()["fast"]["status"] == "deferred"
+
+    assert observe(router, "broken")["error"]["code"] == ErrorCode.UNKNOWN_TARGET.value
+    assert router.get_init_report()["broken"]["status"] == "failed"
+
+def test_concurrent_first_commands_construct_a_lazy_adapter_once(make_router, slow_adapter):
+    router = make_router({"slow": slow()}, init_mode="lazy")
+    responses = []
+    threads = [Thread(target=lambda: responses.append(observe(router, "slow"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: slow_adapter.constructed == 1)
+    slow_adapter.release.set()
+    for thread in threads:
+        thread.join()
+    assert responses == [{"value": 0}] * 4
+    assert slow_adapter.constructed == 1
@@ -0,0 +1,91 @@
+import random
+import pytest
+import aggregation
+from command_queue import CommandQueue
+from errors import ErrorCode
+from helpers import counting_reads, simulated
+
+ALL_STATS = ["count", "sum", "mean", "min", "max", "std", "p0", "p50", "p95", "p99.9", "p100"]
+
+def test_numpy_and_python_stats_match():
+    pytest.importorskip("numpy")
+    generator = random.Random(7)
+    series = [[generator.gauss(45.0, 8.0) for _ in range(generator.randint(1, 60))] for _ in range(40)]
+    numpy_stats = aggregation._compute_numpy(series, ALL_STATS)
+    python_stats = aggregation._compute_python(series, ALL_STATS)
+    assert numpy_stats["count"] == python_stats["count"]
+    for name in ALL_STATS:
+        assert numpy_stats[name] == pytest.approx(python_stats[name], rel=1e-12, abs=1e-12)
+
+def test_python_stats_values():
+    stats = aggregation._compute_python([[1, 2], [3, 4]], ["count", "mean", "min", "max", "p50", "p25"])
+    assert stats == {"count": 4, "mean": 2.5, "min": 1.0, "max": 4.0, "p50": 2.5, "p25": 1.75}
+
+def test_empty_series():
+    assert aggregation.compute_stats([], ["count", "mean"]) == {"count": 0, "mean": None}
+
+@pytest.mark.parametrize("spec", ["median", "p101", [], 5, ["mean", 3]])
+def test_parse_stats_rejects(spec):
+    with pytest.raises(ValueError):
+        aggregation.parse_stats(spec)
+
+def test_parse_stats_defaults_and_dedupes():
+    assert aggregation.parse_stats(None) == ["count", "mean", "min", "max"]
+    assert aggregation.parse_stats(["p95", "p95", "mean"]) == ["p95", "mean"]
+
+def rooms(router, count):
+    for index in range(count):
+        counting_reads(router.adapters[f"room_{index}"], value=40 + index)
+
+def test_aggregate_over_group(make_router):
+    config = {f"room_{index}": simulated() for index in range(10)}
+    config["rooms"] = {"group": list(config)}
+    router = make_router(config)
+    rooms(router, 10)
+    response = router.route_command({"action": "AGGREGATE", "target": "rooms", "property": "value",
+                                     "value": ["count", "mean", "min", "max"]})
+    assert response == {"aggregate": "value", "targets": 10, "errors": {},
+                        "stats": {"count": 10, "mean": 44.5, "min": 40.0, "max": 49.0}}
+
+def test_aggregate_lists_failed_members(make_router):
+    router = make_router({"room_0": simulated(), "room_1": simulated()})
+    rooms(router, 2)
+    response = router.route_command({"action": "AGGREGATE", "target": ["room_0", "room_1", "ghost"],
+                                     "property": "value", "value": "max"})
+    assert response["stats"] == {"max": 41.0}
+    assert list(response["errors"]) == ["ghost"]
+
+def test_aggregate_all_failed_is_an_error(make_router):
+    router = make_router({"room_0": simulated()})
+    response = router.route_command({"action": "AGGREGATE", "target": "room_0", "property": "state"})
+    assert "error" in response
+
+def test_aggregate_window_requires_sampling(make_router):
+    router = make_router({"room_0": simulated()})
+    response = router.route_command({"action": "AGGREGATE", "target": "room_0", "property": "value", "window": 5})
+    assert response["error"]["message"] == "Window queries require sampling to be started"
+
+def test_aggregate_in_batch(make_router):
+    router = make_router({"room_0": simulated(), "room_1": simulated()})
+    rooms(router, 2)
+    responses = router.route_batch([
+        {"action": "AGGREGATE", "target": ["room_0", "room_1"], "property": "value", "value": "sum"},
+        {"action": "OBSERVE", "target": "room_1", "property": "value"},
+    ])
+    assert responses == [{"aggregate": "value", "targets": 2, "stats": {"sum": 81.0}, "errors": {}}, {"value": 41}]
+
+def test_aggregate_reads_take_execution_lane_slots(make_router):
+    config = {"room_0": dict(simulated(), max_concurrency=1), "room_1": simulated()}
+    config["rooms"] = {"group": list(config), "timeout": 0.1}
+    router = make_router(config)
+    CommandQueue(router)  # Gives the router its execution lanes
+    rooms(router, 2)
+    command = {"action": "AGGREGATE", "target": "rooms", "property": "value", "value": ["count"]}
+    # A queued command holds room_0's only slot for longer than the group timeout.
+    assert router.lanes.try_enter("room_0")
+    response = router.route_command(command)
+    assert response["stats"] == {"count": 1}
+    assert response["errors"]["room_0"]["code"] == ErrorCode.COMMAND_EXPIRED.value
+    assert router.adapters["room_0"].reads == 0
+    router.lanes.leave("room_0")
+    assert router.route_command(command)["stats"] == {"count": 2}
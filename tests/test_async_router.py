@@ -0,0 +1,42 @@
+import asyncio
+import json
+from async_router import AsyncCommandRouter
+from errors import ErrorCode
+from helpers import simulated
+
+def actuate(value, target="sim"):
+    return {"action": "ACTUATE", "target": target, "property": "state", "value": value}
+
+def test_route_command_async_accepts_every_command_form(make_router):
+    router = make_router({"sim": simulated()}, router_class=AsyncCommandRouter)
+
+    async def run():
+        return [
+            await router.route_command_async(json.dumps(actuate("ON"))),
+            await router.route_command_async(actuate("OFF")),
+            await router.route_command_async('{"action": "OBSERVE", "target": "sim", "property": "value"}'),
+            await router.route_command_async("not json"),
+            await router.route_command_async(actuate("ON", target="missing")),
+        ]
+
+    on, off, observed, invalid, missing = asyncio.run(run())
+    assert (on, off, observed) == ({"status": "State set to ON"}, {"status": "State set to OFF"}, {"value": 0})
+    assert invalid["error"]["code"] == ErrorCode.INVALID_COMMAND.value
+    assert "error" in missing
+    assert router.adapters["sim"].state == "OFF"
+
+def test_batched_actuations_of_an_async_adapter_run_in_order(make_router):
+    router = make_router({"sim": simulated()}, router_class=AsyncCommandRouter)
+    adapter = router.adapters["sim"]
+    applied = []
+
+    async def execute_async(command):
+        # The first command takes longest, so running them together would apply it last.
+        await asyncio.sleep(0.05 if command["value"] == "ON" else 0)
+        applied.append(command["value"])
+        return {"status": f"State set to {command['value']}"}
+    adapter.execute_async = execute_async
+
+    responses = asyncio.run(router.route_batch_async([actuate("ON"), actuate("OFF")]))
+    assert responses == [{"status": "State set to ON"}, {"status": "State set to OFF"}]
+    assert applied == ["ON", "OFF"]
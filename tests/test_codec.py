@@ -0,0 +1,94 @@
+import pickle
+import sys
+import pytest
+import codec
+from codec import (
+    DecodeError, MsgpackCodec, OrjsonCodec, StdlibJsonCodec, UjsonCodec, available_codecs, get_codec,
+    register_codec
+)
+from commands import Command
+from helpers import simulated
+
+COMMAND = {"action": "ACTUATE", "target": "sim", "property": "state", "value": "ON"}
+RESPONSE = {"value": {"mean": 21.5, "count": 3, "samples": [1, 2.5, None]}, "ok": True, "name": "héllo"}
+
+@pytest.fixture(params=[StdlibJsonCodec, OrjsonCodec, UjsonCodec, MsgpackCodec], ids=lambda cls: cls.library)
+def any_codec(request):
+    try:
+        return request.param()
+    except ImportError:
+        pytest.skip(f"{request.param.library} is not installed")
+
+@pytest.fixture
+def fresh_codecs(monkeypatch):
+    """Forgets the codecs get_codec has already picked."""
+    monkeypatch.setattr(codec, "_codecs", {})
+
+def test_round_trip(any_codec):
+    for obj in (COMMAND, RESPONSE, [COMMAND, RESPONSE]):
+        encoded = any_codec.encode(obj)
+        assert isinstance(encoded, bytes)
+        assert any_codec.decode(encoded) == obj
+        assert any_codec.decode(bytearray(encoded)) == obj
+        assert any_codec.decode(memoryview(encoded)) == obj
+
+def test_text_codecs_decode_str(any_codec):
+    if any_codec.binary:
+        with pytest.raises(DecodeError):
+            any_codec.decode('{"action": "OBSERVE"}')
+    else:
+        assert any_codec.decode(any_codec.encode(COMMAND).decode("utf-8")) == COMMAND
+
+@pytest.mark.parametrize("data", [b"{not json", b"\xc1", b""])
+def test_malformed_input_raises_decode_error(any_codec, data):
+    with pytest.raises(DecodeError):
+        any_codec.decode(data)
+
+def test_json_prefers_orjson(fresh_codecs):
+    pytest.importorskip("orjson")
+    json_codec = get_codec("json")
+    assert json_codec.library == "orjson"
+    assert get_codec("json") is json_codec
+
+def test_json_falls_back_to_the_standard_library(fresh_codecs, monkeypatch):
+    # A None entry in sys.modules makes the import raise ImportError.
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    monkeypatch.setitem(sys.modules, "ujson", None)
+    assert isinstance(get_codec("json"), StdlibJsonCodec)
+
+def test_missing_and_unknown_codecs(fresh_codecs, monkeypatch):
+    monkeypatch.setitem(sys.modules, "msgpack", None)
+    with pytest.raises(ValueError, match="install msgpack"):
+        get_codec("msgpack")
+    assert "msgpack" not in available_codecs()
+    with pytest.raises(ValueError, match="Unknown codec"):
+        get_codec("yaml")
+
+def test_registered_codecs_take_precedence(fresh_codecs):
+    custom = StdlibJsonCodec()
+    register_codec("json", custom)
+    assert get_codec("json") is custom
+    assert available_codecs()["json"] == "json"
+
+def test_router_decodes_bytes_with_its_codec(make_router, any_codec):
+    router = make_router({"sim": simulated()}, codec=any_codec)
+    assert router.route_command(any_codec.encode(COMMAND)) == {"status": "State set to ON"}
+    response = router.route_command(b"\xc1{")
+    assert response["error"]["message"] == "Invalid JSON command"
+
+def test_command_round_trip():
+    command = Command.from_dict(COMMAND)
+    assert command.to_dict() == COMMAND
+    assert command == COMMAND and command == Command.from_dict(dict(COMMAND))
+    assert pickle.loads(pickle.dumps(command)) == command
+    assert get_codec("json").decode(get_codec("json").encode(command.to_dict())) == COMMAND
+
+def test_command_fields_behave_like_a_dict():
+    command = Command.from_dict({"action": "OBSERVE", "target": "sim", "property": "value", "window": 5})
+    assert len(command) == 4 and list(command) == ["action", "target", "property", "window"]
+    assert "value" not in command and command.get("value", "absent") == "absent"
+    assert command["window"] == 5
+    with pytest.raises(KeyError):
+        command["value"]
+    with pytest.raises(TypeError):
+        Command.from_dict({"action": "OBSERVE", "target": "sim", "property": "value", "extra": 1})
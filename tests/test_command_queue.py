@@ -0,0 +1,66 @@
+import time
+import pytest
+from command_queue import CommandQueue
+from helpers import simulated
+
+@pytest.fixture
+def queue(make_router):
+    config = {"sim": dict(simulated(), max_concurrency=1)}
+    queue = CommandQueue(make_router(config), worker_count=1)
+    queue.handle_response = lambda response: None
+    queue.start()
+    yield queue
+    queue.stop()
+
+def observe(target="sim"):
+    return {"action": "OBSERVE", "target": target, "property": "value"}
+
+def test_enqueue_returns_future(queue):
+    assert queue.enqueue_command(observe()).result(1) == {"value": 0}
+    assert queue.enqueue_batch([observe(), observe()]).result(1) == [{"value": 0}, {"value": 0}]
+
+def test_raising_callback_keeps_worker_and_lane(queue):
+    def fail(response):
+        raise RuntimeError("caller bug")
+    first = queue.enqueue_command(observe(), callback=fail)
+    # The lane allows one command at a time; the next one only runs if the slot was released.
+    second = queue.enqueue_command(observe())
+    assert first.result(1) == {"value": 0}
+    assert second.result(1) == {"value": 0}
+    assert queue.workers[0].is_alive()
+    assert queue.get_lane_depths()["sim"]["active"] == 0
+
+def test_lane_parks_commands_over_the_limit(make_router):
+    router = make_router({"sim": dict(simulated(latency={"seconds": 0.02}), max_concurrency=1)})
+    queue = CommandQueue(router, worker_count=4)
+    queue.handle_response = lambda response: None
+    queue.start()
+    try:
+        futures = [queue.enqueue_command(observe()) for _ in range(6)]
+        assert [future.result(2) for future in futures] == [{"value": 0}] * 6
+    finally:
+        queue.stop()
+
+def test_parked_commands_are_rescheduled_by_priority(make_router):
+    from scheduler import PRIORITY_HIGH, PRIORITY_LOW
+    router = make_router({"sim": dict(simulated(latency={"seconds": 0.05}), max_concurrency=1)})
+    queue = CommandQueue(router, worker_count=3, scheduler="priority")
+    queue.start()
+    order = []
+    actuate = {"action": "ACTUATE", "target": "sim", "property": "state", "value": "ON"}
+    try:
+        futures = [queue.enqueue_command(actuate, callback=lambda response: order.append("first"))]
+        time.sleep(0.01)
+        for name, priority in (("low-1", PRIORITY_LOW), ("low-2", PRIORITY_LOW), ("high", PRIORITY_HIGH)):
+            futures.append(queue.enqueue_command(actuate, priority, callback=lambda response, name=name: order.append(name)))
+            time.sleep(0.005)
+        for future in futures:
+            future.result(2)
+    finally:
+        queue.stop()
+    # low-1 was handed the slot; the rest went back to the scheduler, which serves high first.
+    assert order == ["first", "low-1", "high", "low-2"]
+
+def test_enqueue_batch_accepts_a_generator(queue):
+    future = queue.enqueue_batch(observe() for _ in range(3))
+    assert future.result(1) == [{"value": 0}] * 3
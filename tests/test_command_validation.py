@@ -0,0 +1,93 @@
+import pytest
+from jsonschema import Draft7Validator
+from adapters.simulated_adapter import SimulatedAdapter
+from command_schemas import COMMAND_SCHEMAS, build_schema
+from command_validation import CommandValidator
+from commands import Command
+from errors import ErrorCode
+from helpers import simulated
+
+ADAPTERS = {"sim": SimulatedAdapter}
+
+def reference_is_valid(command):
+    """Whether any hand-written or capability schema accepts the command, via plain jsonschema."""
+    schemas = list(COMMAND_SCHEMAS.values())
+    schemas.append(build_schema("OBSERVE", "sim", "value", window=True))
+    schemas.append(build_schema("ACTUATE", "sim", "state", ["ON", "OFF"]))
+    return any(Draft7Validator(schema).is_valid(command) for schema in schemas)
+
+VALID_COMMANDS = [
+    {"action": "OBSERVE", "target": "motion_sensor_1", "property": "motion_detected"},
+    {"action": "OBSERVE", "target": "temperature_sensor_1", "property": "current_temperature"},
+    {"action": "ACTUATE", "target": "living_room_light", "property": "state", "value": "ON"},
+    {"action": "ACTUATE", "target": "living_room_light", "property": "state", "value": "OFF"},
+    {"action": "OBSERVE", "target": "sim", "property": "value"},
+    {"action": "OBSERVE", "target": "sim", "property": "value", "window": 10},
+    {"action": "OBSERVE", "target": "sim", "property": "value", "window": 0.5},
+    {"action": "ACTUATE", "target": "sim", "property": "state", "value": "OFF"},
+]
+
+INVALID_COMMANDS = [
+    # Unknown target or action, so no schema at all.
+    ({"action": "OBSERVE", "target": "nowhere", "property": "value"}, "No schema defined"),
+    ({"action": "REBOOT", "target": "sim", "property": "value"}, "No schema defined"),
+    # Unsupported property.
+    ({"action": "OBSERVE", "target": "sim", "property": "colour"}, "is not one of"),
+    # Value outside the allowed enum, missing, or given where none is allowed.
+    ({"action": "ACTUATE", "target": "sim", "property": "state", "value": "DIM"}, "is not one of"),
+    ({"action": "ACTUATE", "target": "living_room_light", "property": "state", "value": "DIM"}, "is not one of ['OFF', 'ON']"),
+    ({"action": "ACTUATE", "target": "sim", "property": "state"}, "'value' is a required property"),
+    ({"action": "ACTUATE", "target": "sim", "property": "state", "value": ["ON"]}, "is not one of"),
+    ({"action": "OBSERVE", "target": "sim", "property": "value", "value": 1}, "Additional properties"),
+    # Extra fields and bad windows.
+    ({"action": "ACTUATE", "target": "sim", "property": "state", "value": "ON", "window": 5}, "Additional properties"),
+    ({"action": "OBSERVE", "target": "motion_sensor_1", "property": "motion_detected", "window": 5}, "Additional properties"),
+    ({"action": "OBSERVE", "target": "sim", "property": "value", "window": 0}, "less than or equal to the minimum"),
+    ({"action": "OBSERVE", "target": "sim", "property": "value", "window": "10"}, "is not of type 'number'"),
+    ({"action": "OBSERVE", "target": "sim", "property": "value", "extra": True}, "Additional properties"),
+    # Unhashable or non-string fields must not break the lookup.
+    ({"action": "OBSERVE", "target": ["sim"], "property": "value"}, "No schema defined"),
+    ({"action": "OBSERVE", "target": "sim", "property": {"name": "value"}}, "is not of type 'string'"),
+]
+
+@pytest.mark.parametrize("command", VALID_COMMANDS)
+def test_valid_commands_match_jsonschema(command):
+    validator = CommandValidator(ADAPTERS)
+    assert reference_is_valid(command)
+    assert validator.validate(command).is_valid
+    assert validator.full_validate(command).is_valid
+
+@pytest.mark.parametrize("command, message", INVALID_COMMANDS)
+def test_invalid_commands_match_jsonschema(command, message):
+    validator = CommandValidator(ADAPTERS)
+    assert not reference_is_valid(command)
+    result = validator.validate(command)
+    assert not result.is_valid
+    assert result.errors == validator.full_validate(command).errors
+    assert any(message in error for error in result.errors)
+
+def test_fast_path_skips_jsonschema(monkeypatch):
+    validator = CommandValidator(ADAPTERS)
+    monkeypatch.setattr(validator, "full_validate", lambda command: pytest.fail("fell back to jsonschema"))
+    for command in VALID_COMMANDS:
+        assert validator.validate(command).is_valid
+
+def test_command_objects_validate_like_dicts():
+    validator = CommandValidator(ADAPTERS)
+    for command in VALID_COMMANDS:
+        assert validator.validate(Command.from_dict(command)).is_valid
+    invalid = Command.from_dict({"action": "ACTUATE", "target": "sim", "property": "state", "value": "DIM"})
+    assert validator.validate(invalid).errors == validator.validate(invalid.to_dict()).errors
+
+def test_rebuild_drops_removed_adapters():
+    validator = CommandValidator(ADAPTERS)
+    command = {"action": "OBSERVE", "target": "sim", "property": "value"}
+    assert validator.validate(command).is_valid
+    validator.rebuild({})
+    assert validator.validate(command).errors == ["No schema defined for this command."]
+
+def test_invalid_command_is_reported_by_the_router(make_router):
+    router = make_router({"sim": simulated()})
+    response = router.route_command({"action": "ACTUATE", "target": "sim", "property": "state", "value": "DIM"})
+    assert response["error"]["code"] == ErrorCode.INVALID_COMMAND.value
+    assert "'DIM' is not one of ['ON', 'OFF']" in response["error"]["message"]
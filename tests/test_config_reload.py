@@ -0,0 +1,106 @@
+import time
+from config_watcher import ConfigWatcher
+from errors import ErrorCode
+from helpers import simulated
+
+OBSERVE = {"action": "OBSERVE", "property": "value"}
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def observe(router, target):
+    return router.route_command(dict(OBSERVE, target=target))
+
+def test_reload_applies_only_the_difference(make_router, write_config):
+    config = {"kept": simulated(), "changed": simulated(), "gone": simulated(), "tuned": simulated()}
+    router = make_router(config)
+    kept, changed, gone = (router.adapters[target] for target in ("kept", "changed", "gone"))
+    cleaned = []
+    for adapter in (changed, gone):
+        adapter.cleanup = lambda adapter=adapter: cleaned.append(adapter)
+    reports = []
+    router.reload_listeners.append(reports.append)
+
+    write_config({
+        "kept": simulated(),
+        "changed": simulated(latency={"seconds": 0.001}),
+        "tuned": dict(simulated(), cache_ttl=5),
+        "new": simulated(),
+    })
+    report = router.reload_config(drain_timeout=1)
+    assert report == {"added": ["new"], "removed": ["gone"], "replaced": ["changed"], "updated": ["tuned"], "failed": []}
+    assert reports == [report]
+    assert router.adapters["kept"] is kept
+    assert router.adapters["changed"] is not changed
+    assert "gone" not in router.adapters
+    # Replaced and removed adapters are cleaned up once drained.
+    assert sorted(map(id, cleaned)) == sorted(map(id, (changed, gone)))
+    assert observe(router, "new") == {"value": 0}
+    assert observe(router, "gone")["error"]["code"] == ErrorCode.INVALID_COMMAND.value
+
+    # Reloading an unchanged file does nothing and notifies nobody.
+    assert not any(router.reload_config().values())
+    assert len(reports) == 1
+
+def test_unreadable_config_keeps_the_current_one(make_router, write_config):
+    router = make_router({"sim": simulated()})
+    adapter = router.adapters["sim"]
+    path = write_config({})
+    with open(path, "w") as f:
+        f.write("{not json")
+    assert router.reload_config() is None
+    assert router.adapters == {"sim": adapter}
+    assert observe(router, "sim") == {"value": 0}
+
+def test_failed_adapter_keeps_the_old_one_until_a_later_reload(make_router, write_config):
+    router = make_router({"sim": simulated()})
+    adapter = router.adapters["sim"]
+    write_config({"sim": simulated(backend="bogus"), "broken": simulated(backend="bogus")})
+    report = router.reload_config()
+    assert sorted(report["failed"]) == ["broken", "sim"]
+    assert router.adapters == {"sim": adapter}
+    assert router.get_init_report()["broken"]["status"] == "failed"
+    assert observe(router, "sim") == {"value": 0}
+
+    # The failed targets are retried by the next reload.
+    write_config({"sim": simulated(seed=1), "broken": simulated()})
+    report = router.reload_config(drain_timeout=1)
+    assert report["replaced"] == ["sim"] and report["added"] == ["broken"]
+    assert observe(router, "broken") == {"value": 0}
+
+def test_watcher_reloads_when_the_file_changes(make_router, write_config):
+    router = make_router({"sim": simulated()})
+    watcher = ConfigWatcher(router, drain_timeout=1)
+    assert watcher.check() is None
+
+    write_config({"sim": simulated(), "other": simulated()})
+    report = watcher.check()
+    assert report["added"] == ["other"]
+    assert watcher.last_report is report
+    assert watcher.check() is None
+
+def test_watcher_ignores_a_missing_or_invalid_file(make_router, write_config, tmp_path):
+    router = make_router({"sim": simulated()})
+    watcher = ConfigWatcher(router, path=str(tmp_path / "missing.json"))
+    assert watcher.check() is None
+
+    watcher = ConfigWatcher(router)
+    with open(router.config_path, "w") as f:
+        f.write("{not json")
+    assert watcher.check() is None
+    assert watcher.last_report is None
+    assert set(router.adapters) == {"sim"}
+
+def test_watcher_thread_picks_up_changes(make_router, write_config):
+    router = make_router({"sim": simulated()})
+    watcher = ConfigWatcher(router, interval=0.02, drain_timeout=1)
+    watcher.start()
+    try:
+        write_config({"sim": simulated(), "other": simulated()})
+        wait_for(lambda: "other" in router.adapters)
+    finally:
+        watcher.stop()
+    assert observe(router, "other") == {"value": 0}
@@ -0,0 +1,59 @@
+import time
+from threading import Thread
+import fake_gpio
+from events import EventBus
+from metrics import MetricsRegistry
+
+def wait_for(condition, timeout=1.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+def test_full_buffer_drops_the_oldest_events():
+    bus = EventBus(metrics=MetricsRegistry())
+    subscription = bus.subscribe("door", max_buffer=3)
+    other = bus.subscribe("window")
+    for value in range(5):
+        bus.publish("door", "open", value)
+    assert [event.value for event in subscription.drain()] == [2, 3, 4]
+    assert subscription.dropped == 2
+    assert bus.dropped_total.labels("door").value() == 2
+    assert len(other) == 0
+
+def test_close_stops_the_dispatcher_and_wakes_readers():
+    bus = EventBus(metrics=MetricsRegistry())
+    delivered = []
+    bus.subscribe("door", callback=delivered.append)
+    polled = bus.subscribe("door")
+    bus.publish("door", "open", True)
+    assert wait_for(lambda: len(delivered) == 1)
+    dispatcher = bus._dispatcher
+    results = []
+    reader = Thread(target=lambda: results.append((polled.get(), polled.get(timeout=5))))
+    reader.start()
+    bus.close()
+    reader.join(1)
+    assert not dispatcher.is_alive()
+    assert results and results[0][1] is None
+    assert bus.subscriber_count() == 0
+    # The bus can still be used afterwards.
+    bus.subscribe("door", callback=delivered.append)
+    bus.publish("door", "open", False)
+    assert wait_for(lambda: len(delivered) == 2)
+    bus.close()
+
+def test_motion_change_inside_the_debounce_window_is_reported_after_it(make_router):
+    router = make_router({"motion": {"module": "motion_sensor_adapter", "params": {"pin": 5, "debounce_ms": 100}}})
+    events = []
+    router.subscribe("motion", "motion_detected", callback=lambda event: events.append(event.value))
+    fake_gpio.simulate_input(5, 1)
+    assert wait_for(lambda: events == [True])
+    # Falls again within the window: the edge itself is debounced away.
+    fake_gpio.simulate_input(5, 0)
+    time.sleep(0.05)
+    assert events == [True]
+    assert wait_for(lambda: events == [True, False])
+    dispatcher = router.events._dispatcher
+    router.cleanup_all()
+    assert not dispatcher.is_alive()
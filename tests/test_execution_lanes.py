@@ -0,0 +1,63 @@
+import time
+from threading import Timer
+from types import SimpleNamespace
+from execution_lanes import ExecutionLanes
+
+def make_lanes(limits):
+    router = SimpleNamespace(
+        config={target: {"max_concurrency": limit} for target, limit in limits.items()},
+        adapter_classes={target: object for target in limits}
+    )
+    return router, ExecutionLanes(router)
+
+def test_unknown_targets_get_no_lane():
+    _, lanes = make_lanes({"bus": 1})
+    for index in range(100):
+        assert lanes.try_acquire(f"garbage-{index}", object())
+    assert lanes.release("garbage-0") == (None, [])
+    assert lanes.lanes == {}
+
+def test_release_hands_off_one_and_returns_the_rest():
+    _, lanes = make_lanes({"bus": 1})
+    assert lanes.try_acquire("bus", "running")
+    for name in ("a", "b", "c"):
+        assert not lanes.try_acquire("bus", name)
+    assert lanes.release("bus") == ("a", ["b", "c"])
+    # The slot passed to "a"; "b" and "c" must acquire it again.
+    assert lanes.get_depths()["bus"] == {"active": 1, "pending": 0, "max_concurrency": 1}
+    assert lanes.release("bus") == (None, [])
+    assert lanes.get_depths()["bus"]["active"] == 0
+
+def test_release_without_handoff_frees_the_slot():
+    _, lanes = make_lanes({"bus": 1})
+    lanes.try_acquire("bus", "running")
+    lanes.try_acquire("bus", "a")
+    assert lanes.release("bus", handoff=False) == (None, ["a"])
+    assert lanes.get_depths()["bus"]["active"] == 0
+
+def test_refresh_resizes_and_returns_parked_commands():
+    router, lanes = make_lanes({"bus": 1})
+    lanes.try_acquire("bus", "running")
+    lanes.try_acquire("bus", "a")
+    router.config["bus"]["max_concurrency"] = 2
+    assert lanes.refresh(["bus"]) == ["a"]
+    assert lanes.try_acquire("bus", "a")
+
+def test_refresh_drops_removed_targets():
+    router, lanes = make_lanes({"bus": 1})
+    lanes.try_acquire("bus", "running")
+    lanes.try_acquire("bus", "a")
+    del router.adapter_classes["bus"]
+    assert lanes.refresh(["bus"]) == ["a"]
+    assert "bus" not in lanes.lanes
+    assert lanes.release("bus") == (None, [])
+
+def test_enter_waits_for_a_slot_until_its_timeout():
+    _, lanes = make_lanes({"bus": 1})
+    assert lanes.enter("bus")
+    start = time.monotonic()
+    assert not lanes.enter("bus", timeout=0.05)
+    assert time.monotonic() - start >= 0.04
+    Timer(0.02, lanes.leave, ("bus",)).start()
+    assert lanes.enter("bus", timeout=1)
+    assert lanes.get_depths()["bus"]["active"] == 1
@@ -0,0 +1,102 @@
+import sys
+import types
+import pytest
+from adapters.base_adapter import BaseAdapter, handles
+from adapters.simulated_adapter import SimulatedAdapter
+from errors import Error, ErrorCode
+from helpers import simulated
+
+class Lamp(BaseAdapter):
+    def __init__(self, **kwargs):
+        self.level = 0
+
+    @handles("OBSERVE", "level")
+    def read_level(self, command):
+        return {"level": self.level}
+
+    @handles("ACTUATE", "level", values=[0, 50, 100])
+    @handles("CONFIGURE", "level", values=[0, 100])
+    def set_level(self, command):
+        self.level = command["value"]
+        return {"level": self.level}
+
+class DimmableLamp(Lamp):
+    @handles("OBSERVE", "level")
+    def read_level(self, command):
+        return {"level": self.level, "dimmed": self.level < 100}
+
+    @handles("OBSERVE", "power")
+    def read_power(self, command):
+        return {"power": self.level * 0.1}
+
+def test_handles_collects_handlers_and_capabilities():
+    assert Lamp.HANDLERS == {
+        ("OBSERVE", "level"): "read_level",
+        ("ACTUATE", "level"): "set_level",
+        ("CONFIGURE", "level"): "set_level",
+    }
+    assert Lamp.CAPABILITIES == {
+        "OBSERVE": {"level": None},
+        "ACTUATE": {"level": [0, 50, 100]},
+        "CONFIGURE": {"level": [0, 100]},
+    }
+    # Defining a subclass does not touch the base class tables.
+    assert BaseAdapter.HANDLERS == {} and BaseAdapter.CAPABILITIES is None
+
+def test_subclasses_inherit_and_override_handlers():
+    assert DimmableLamp.HANDLERS[("ACTUATE", "level")] == "set_level"
+    assert DimmableLamp.HANDLERS[("OBSERVE", "power")] == "read_power"
+    assert DimmableLamp.CAPABILITIES["OBSERVE"] == {"level": None, "power": None}
+    assert Lamp.CAPABILITIES["OBSERVE"] == {"level": None}
+    lamp = DimmableLamp()
+    assert lamp.execute({"action": "OBSERVE", "target": "lamp", "property": "level"}) == {"level": 0, "dimmed": True}
+
+def test_explicit_capabilities_are_kept():
+    class Restricted(Lamp):
+        CAPABILITIES = {"OBSERVE": {"level": None}}
+
+    assert Restricted.CAPABILITIES == {"OBSERVE": {"level": None}}
+    assert ("ACTUATE", "level") in Restricted.HANDLERS
+
+def test_handles_rejects_unknown_actions():
+    with pytest.raises(ValueError):
+        handles("TOGGLE", "state")
+
+def test_execute_dispatches_to_the_handler():
+    lamp = Lamp()
+    assert lamp.execute({"action": "ACTUATE", "target": "lamp", "property": "level", "value": 50}) == {"level": 50}
+    assert lamp.handlers()[("OBSERVE", "level")]({}) == {"level": 50}
+
+@pytest.mark.parametrize("command", [
+    {"action": "ACTUATE", "target": "lamp", "property": "colour", "value": "red"},
+    {"action": "LINK", "target": "lamp", "property": "level"},
+    {"action": "OBSERVE", "target": "lamp", "property": ["level"]},
+])
+def test_execute_reports_unhandled_commands(command):
+    result = Lamp().execute(command)
+    assert isinstance(result, Error)
+    assert result.code == ErrorCode.ADAPTER_EXECUTION_FAILED
+
+def test_router_dispatch_index_binds_each_handler(make_router):
+    router = make_router({"sim": simulated()})
+    adapter = router.adapters["sim"]
+    assert set(router.dispatch) == {("OBSERVE", "sim", "value"), ("ACTUATE", "sim", "state")}
+    assert router.dispatch[("OBSERVE", "sim", "value")] == (adapter, adapter.read_value)
+    # Indexed commands go straight to the handler, not through execute.
+    adapter.execute = lambda command: pytest.fail("routed through execute")
+    response = router.route_command({"action": "ACTUATE", "target": "sim", "property": "state", "value": "ON"})
+    assert response == {"status": "State set to ON"}
+
+def test_router_reports_commands_without_a_handler(make_router, monkeypatch):
+    class Wider(SimulatedAdapter):
+        # Declares a command it has no handler for.
+        CAPABILITIES = {"OBSERVE": {"value": None, "colour": None}}
+
+    module = types.ModuleType("adapters.wider_adapter")
+    module.WiderAdapter = Wider
+    monkeypatch.setitem(sys.modules, "adapters.wider_adapter", module)
+    router = make_router({"wide": {"module": "wider_adapter", "params": {}}})
+    assert router.route_command({"action": "OBSERVE", "target": "wide", "property": "value"}) == {"value": 0}
+    response = router.route_command({"action": "OBSERVE", "target": "wide", "property": "colour"})
+    assert response["error"]["code"] == ErrorCode.ADAPTER_EXECUTION_FAILED.value
+    assert "Unsupported action or property" in response["error"]["message"]
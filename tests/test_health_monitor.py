@@ -0,0 +1,50 @@
+import time
+from threading import Event
+from circuit_breaker import CircuitBreaker
+from health_monitor import AdapterHealthCheck
+from metrics import MetricsRegistry
+
+class Probe:
+    def __init__(self, hang=None):
+        self.hang = hang
+        self.calls = 0
+
+    def health_check(self):
+        self.calls += 1
+        if self.hang is not None:
+            self.hang.wait(5)
+        return {"status": "healthy"}
+
+def monitor(**kwargs):
+    return AdapterHealthCheck(metrics=MetricsRegistry(), **kwargs)
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_healthy_check_is_recorded():
+    health = monitor(interval=10)
+    breaker = CircuitBreaker()
+    health.start_monitoring({"sensor": Probe()}, breaker)
+    try:
+        wait_for(lambda: health.status.get("sensor") == {"status": "healthy"})
+    finally:
+        health.stop_monitoring()
+    assert breaker.allow("sensor")
+
+def test_hung_check_keeps_failing_and_opens_the_circuit():
+    hang = Event()
+    probe = Probe(hang)
+    health = monitor(interval=10, timeout=0.05, failure_interval=0.05)
+    breaker = CircuitBreaker(failure_threshold=2)
+    health.start_monitoring({"sensor": probe}, breaker)
+    try:
+        wait_for(lambda: not breaker.allow("sensor"))
+        assert health.status["sensor"]["status"] == "timeout"
+        # The hung call is never doubled up.
+        assert probe.calls == 1
+    finally:
+        hang.set()
+        health.stop_monitoring()
@@ -0,0 +1,220 @@
+import asyncio
+import json
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+import pytest
+import requests
+import http_pool
+from http_pool import HTTPResponse, HTTPSessionPool
+
+class FakeResponse:
+    status = 200
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def read(self):
+        return b'{"ok": true}'
+
+class FakeSession:
+    instances = []
+
+    def __init__(self, connector=None):
+        self.closed = False
+        FakeSession.instances.append(self)
+
+    def request(self, method, url, **kwargs):
+        assert not self.closed
+        return FakeResponse()
+
+    async def close(self):
+        self.closed = True
+
+@pytest.fixture
+def fake_aiohttp(monkeypatch):
+    """Stands in for aiohttp, which HTTPSessionPool imports optionally."""
+    FakeSession.instances = []
+    module = types.SimpleNamespace(
+        TCPConnector=lambda **kwargs: None, ClientSession=FakeSession, ClientTimeout=lambda **kwargs: None
+    )
+    monkeypatch.setattr(http_pool, "aiohttp", module, raising=False)
+    monkeypatch.setattr(http_pool, "AIOHTTP_AVAILABLE", True)
+    return FakeSession
+
+def test_session_is_closed_when_its_loop_shuts_down(fake_aiohttp):
+    pool = HTTPSessionPool()
+
+    async def fetch():
+        first = await pool.get_async("http://device/a")
+        second = await pool.get_async("http://device/b")
+        return first.json(), second.status_code
+
+    for _ in range(3):
+        assert asyncio.run(fetch()) == ({"ok": True}, 200)
+    # One session per loop, each closed by asyncio.run and forgotten.
+    assert len(fake_aiohttp.instances) == 3
+    assert all(session.closed for session in fake_aiohttp.instances)
+    assert pool._async_sessions == {}
+
+def test_aclose_closes_the_loop_session_and_a_new_one_is_opened(fake_aiohttp):
+    pool = HTTPSessionPool()
+
+    async def run():
+        await pool.get_async("http://device/a")
+        await pool.aclose()
+        assert fake_aiohttp.instances[0].closed and pool._async_sessions == {}
+        await pool.get_async("http://device/a")
+        assert len(fake_aiohttp.instances) == 2
+
+    asyncio.run(run())
+    assert fake_aiohttp.instances[1].closed
+
+def test_sessions_of_loops_closed_without_shutdown_are_dropped(fake_aiohttp):
+    pool = HTTPSessionPool()
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(pool.get_async("http://device/a"))
+    for task in asyncio.all_tasks(loop):
+        task._log_destroy_pending = False  # The closer never gets to run on this loop
+    loop.close()
+
+    async def fetch():
+        await pool.get_async("http://device/a")
+        return list(pool._async_sessions)
+
+    assert loop not in asyncio.run(fetch()) and len(fake_aiohttp.instances) == 2
+    assert pool._async_sessions == {}
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Keep-alive stub device. /slow?seconds=N waits before answering and
+    /status/N answers with that status. Records each request's client port
+    and the most requests it served at once.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._answer()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._answer(json.loads(body) if body else None)
+
+    def _answer(self, received=None):
+        server = self.server
+        with server.lock:
+            server.ports.append(self.client_address[1])
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+        try:
+            path, _, query = self.path.partition("?")
+            if path == "/slow":
+                time.sleep(float(query.partition("=")[2] or 0.5))
+            status = int(path.rsplit("/", 1)[1]) if path.startswith("/status/") else 200
+            body = json.dumps({"path": path, "received": received}).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.lock = Lock()
+    server.ports = []
+    server.active = server.peak = 0
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+def test_requests_reuse_the_endpoint_connection(stub_server):
+    pool = HTTPSessionPool()
+    try:
+        for index in range(5):
+            response = pool.get(f"{stub_server.url}/read/{index}")
+            assert response.json()["path"] == f"/read/{index}"
+        assert pool.post(f"{stub_server.url}/state", json={"state": "ON"}).json()["received"] == {"state": "ON"}
+        # Every request went over the same keep-alive connection.
+        assert len(set(stub_server.ports)) == 1 and len(stub_server.ports) == 6
+    finally:
+        pool.close()
+
+def test_one_session_per_endpoint(stub_server):
+    pool = HTTPSessionPool()
+    try:
+        session = pool.session(f"{stub_server.url}/a")
+        assert pool.session(f"{stub_server.url}/b?x=1") is session
+        assert pool.session("http://localhost:1/a") is not session
+        pool.close()
+        assert pool.session(f"{stub_server.url}/a") is not session
+    finally:
+        pool.close()
+
+def test_pool_limits_connections_per_endpoint(stub_server):
+    pool = HTTPSessionPool(pool_maxsize=2, pool_block=True)
+    try:
+        threads = [Thread(target=pool.get, args=(f"{stub_server.url}/slow?seconds=0.05",)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(stub_server.ports) == 6
+        assert stub_server.peak <= 2 and len(set(stub_server.ports)) <= 2
+    finally:
+        pool.close()
+
+def test_read_timeouts(stub_server):
+    pool = HTTPSessionPool(read_timeout=0.1)
+    try:
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            pool.get(f"{stub_server.url}/slow?seconds=0.5")
+        # A per-request timeout overrides the pool default.
+        assert pool.get(f"{stub_server.url}/slow?seconds=0.2", timeout=(1, 2)).status_code == 200
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            pool.get(f"{stub_server.url}/slow?seconds=0.5", timeout=0.1)
+    finally:
+        pool.close()
+
+def test_connect_errors_are_raised(stub_server):
+    pool = HTTPSessionPool(connect_timeout=0.2)
+    stub_server.shutdown()
+    stub_server.server_close()
+    with pytest.raises(requests.exceptions.ConnectionError):
+        pool.get(f"{stub_server.url}/read")
+    pool.close()
+
+def test_request_async_falls_back_to_the_pooled_session(stub_server, monkeypatch):
+    monkeypatch.setattr(http_pool, "AIOHTTP_AVAILABLE", False)
+    pool = HTTPSessionPool()
+
+    async def fetch():
+        ok = await pool.get_async(f"{stub_server.url}/read")
+        failed = await pool.post_async(f"{stub_server.url}/status/503", json={"state": "OFF"})
+        return ok, failed
+
+    try:
+        ok, failed = asyncio.run(fetch())
+        assert isinstance(ok, HTTPResponse) and ok.json()["path"] == "/read"
+        ok.raise_for_status()
+        assert failed.status_code == 503 and failed.json()["received"] == {"state": "OFF"}
+        with pytest.raises(requests.HTTPError):
+            failed.raise_for_status()
+        assert len(set(stub_server.ports)) == 1
+    finally:
+        pool.close()
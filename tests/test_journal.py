@@ -0,0 +1,87 @@
+import os
+from command_queue import CommandQueue
+from errors import ErrorCode
+from helpers import simulated
+from journal import CommandJournal
+from metrics import MetricsRegistry
+
+def actuate(value, target="sim"):
+    return {"action": "ACTUATE", "target": target, "property": "state", "value": value}
+
+def journal(directory):
+    return CommandJournal(str(directory), fsync=False, metrics=MetricsRegistry())
+
+def test_reopen_replays_uncompleted_commands_and_skips_a_torn_tail(tmp_path):
+    first = journal(tmp_path)
+    assert first.open() == []
+    on, off, again = first.append_many([actuate("ON"), actuate("OFF"), actuate("ON")])
+    first.complete(off)
+    first.close()
+    # A crash mid-write leaves half a record at the end of the segment.
+    (segment,) = os.listdir(tmp_path)
+    with open(tmp_path / segment, "ab") as f:
+        f.write(b"\x40\x00\x00\x00\x00\x01")
+
+    second = journal(tmp_path)
+    assert second.open() == [(on, actuate("ON")), (again, actuate("ON"))]
+    # Sequence numbers carry on past the replayed ones, and the torn bytes are gone.
+    assert second.append(actuate("OFF")) == again + 1
+    second.close()
+    third = journal(tmp_path)
+    assert [seq for seq, _ in third.open()] == [on, again, again + 1]
+    third.close()
+
+def test_queue_replays_commands_left_by_a_stopped_queue(make_router, tmp_path):
+    config = {"sim": simulated()}
+    crashed = CommandQueue(make_router(config), journal=journal(tmp_path / "journal"))
+    # Journaled but never processed: the workers were never started.
+    crashed.enqueue_command(actuate("ON"))
+    crashed.enqueue_command({"action": "OBSERVE", "target": "sim", "property": "value"})
+    crashed.stop()
+
+    router = make_router(config)
+    responses = []
+    restarted = CommandQueue(router, worker_count=1, journal=journal(tmp_path / "journal"))
+    restarted.handle_response = responses.append
+    restarted.start()
+    try:
+        restarted.queue.join()
+        # Only the ACTUATE was journaled, and it now ran.
+        assert responses == [{"status": "State set to ON"}]
+        assert router.adapters["sim"].state == "ON"
+        assert restarted.journal.pending_count() == 0
+    finally:
+        restarted.stop()
+    leftover = journal(tmp_path / "journal")
+    assert leftover.open() == []
+    leftover.close()
+
+def test_replay_is_not_rejected_by_a_full_queue(make_router, tmp_path):
+    config = {"sim": simulated()}
+    crashed = CommandQueue(make_router(config), journal=journal(tmp_path / "journal"))
+    for value in ("ON", "OFF", "ON"):
+        crashed.enqueue_command(actuate(value))
+    crashed.stop()
+
+    router = make_router(config)
+    responses = []
+    restarted = CommandQueue(router, worker_count=0, max_depth=1, overflow="reject",
+                             journal=journal(tmp_path / "journal"))
+    restarted.handle_response = responses.append
+    restarted.start()
+    # All three are queued past max_depth; new commands are still rejected.
+    assert restarted.queue.qsize() == 3
+    assert restarted.enqueue_command(actuate("OFF")).result(timeout=1)["error"]["code"] == ErrorCode.QUEUE_FULL.value
+    assert restarted.journal.pending_count() == 3
+    restarted.stop()
+    responses.clear()
+
+    replayed = CommandQueue(router, worker_count=1, journal=journal(tmp_path / "journal"))
+    replayed.handle_response = responses.append
+    replayed.start()
+    try:
+        replayed.queue.join()
+        assert responses == [{"status": f"State set to {value}"} for value in ("ON", "OFF", "ON")]
+        assert replayed.journal.pending_count() == 0
+    finally:
+        replayed.stop()
@@ -0,0 +1,71 @@
+import json
+import logging
+import time
+from queue import SimpleQueue
+from threading import Thread
+import pytest
+from logging_config import (
+    CommandLogSampler, DeferredQueueHandler, JsonLinesHandler, configure_logging, shutdown_logging
+)
+
+@pytest.fixture
+def restore_logging():
+    yield
+    configure_logging(log_file=None, level=logging.WARNING)
+
+def record(message, *args):
+    return logging.LogRecord("prism", logging.INFO, __file__, 1, message, args, None)
+
+def lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+def test_async_logging_keeps_the_arguments_as_they_were_when_logged(tmp_path, restore_logging):
+    path = tmp_path / "prism.log"
+    configure_logging(async_mode=True, log_file=str(path), console=False)
+    targets = ["light_1"]
+    for _ in range(100):
+        logging.info("Routing to %s", targets)
+    targets.append("light_2")
+    shutdown_logging()
+    logged = path.read_text().splitlines()
+    assert len(logged) == 100
+    assert all(line.endswith("Routing to ['light_1']") for line in logged)
+
+def test_jsonl_buffer_is_written_on_a_timer_and_on_close(tmp_path):
+    path = tmp_path / "prism.jsonl"
+    handler = JsonLinesHandler(str(path), batch_size=100, flush_interval=0.05)
+    handler.emit(record("value %d", 1))
+    deadline = time.monotonic() + 1
+    while not path.read_text() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert [line["msg"] for line in lines(path)] == ["value 1"]
+    handler.close()
+    assert not handler._flusher.is_alive()
+
+    idle = JsonLinesHandler(str(path), batch_size=100, flush_interval=60)
+    idle.emit(record("value %d", 2))
+    idle.close()
+    assert [line["msg"] for line in lines(path)] == ["value 1", "value 2"]
+
+def test_queued_records_keep_a_copy_of_mutable_arguments_unformatted():
+    handler = DeferredQueueHandler(SimpleQueue())
+    command = {"target": "light_1"}
+    queued = handler.prepare(record("Routing %s to %s", command, "light_1"))
+    command["target"] = "light_2"
+    # The message is still formatted later, on the listener thread.
+    assert queued.msg == "Routing %s to %s"
+    assert queued.getMessage() == "Routing {'target': 'light_1'} to light_1"
+    mapping = {"target": "light_1"}
+    queued = handler.prepare(logging.LogRecord("prism", logging.INFO, __file__, 1, "%(target)s", (mapping,), None))
+    mapping["target"] = "light_2"
+    assert queued.getMessage() == "light_1"
+
+def test_sampler_counts_every_suppressed_line():
+    sampler = CommandLogSampler(max_per_second=0)
+    threads = [Thread(target=lambda: [sampler.allow("line %s") for _ in range(20000)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sampler.suppressed == 80000
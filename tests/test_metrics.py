@@ -0,0 +1,123 @@
+import time
+import urllib.error
+import urllib.request
+from threading import Thread
+import pytest
+from command_queue import CommandQueue
+from errors import ErrorCode
+from helpers import simulated
+from metrics import MetricsRegistry, MetricsServer
+
+def run_threads(count, target):
+    threads = [Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def test_counter_sums_every_thread():
+    counter = MetricsRegistry().counter("test_total", "Test counter.", ("kind",))
+
+    def work():
+        for _ in range(1000):
+            counter.labels("a").inc()
+        counter.labels("b").inc(2.5)
+
+    run_threads(8, work)
+    assert counter.labels("a").value() == 8000
+    assert counter.labels("b").value() == 20.0
+
+def test_histogram_buckets_are_cumulative():
+    histogram = MetricsRegistry().histogram("test_seconds", "Test histogram.", buckets=(0.1, 1.0))
+
+    def work():
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value)
+
+    run_threads(4, work)
+    value = histogram.labels().value()
+    assert value["buckets"] == {0.1: 4, 1.0: 8, float("inf"): 12}
+    assert value["count"] == 12
+    assert value["sum"] == pytest.approx(4 * 5.55)
+
+def test_shards_of_exited_threads_are_folded_into_the_totals():
+    counter = MetricsRegistry().counter("test_total", "Test counter.")
+    for _ in range(20):
+        run_threads(5, counter.inc)
+    values = counter.labels()._values
+    assert counter.labels().value() == 100
+    assert values._shards == []
+    counter.inc()
+    assert len(values._shards) == 1
+    assert counter.labels().value() == 101
+
+def test_registry_returns_existing_metrics_and_rejects_mismatches():
+    registry = MetricsRegistry()
+    counter = registry.counter("test_total", "Test counter.", ("kind",))
+    assert registry.counter("test_total", "Test counter.", ("kind",)) is counter
+    with pytest.raises(ValueError):
+        registry.gauge("test_total", "Test gauge.", ("kind",))
+    with pytest.raises(ValueError):
+        registry.counter("test_total", "Test counter.", ("other",))
+    with pytest.raises(ValueError):
+        counter.labels("a", "b")
+
+def test_exposition_format():
+    registry = MetricsRegistry()
+    registry.counter("test_total", "Test counter.", ("kind",)).labels('say "hi"').inc(3)
+    registry.gauge("test_depth", "Test gauge.").set_function(lambda: 7)
+    registry.histogram("test_seconds", "Test histogram.", buckets=(1.0,)).observe(0.5)
+    assert registry.exposition().splitlines() == [
+        "# HELP test_depth Test gauge.",
+        "# TYPE test_depth gauge",
+        "test_depth 7",
+        "# HELP test_seconds Test histogram.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{le="1.0"} 1',
+        'test_seconds_bucket{le="+Inf"} 1',
+        "test_seconds_sum 0.5",
+        "test_seconds_count 1",
+        "# HELP test_total Test counter.",
+        "# TYPE test_total counter",
+        'test_total{kind="say \\"hi\\""} 3',
+    ]
+
+def test_metrics_server_serves_the_registry():
+    registry = MetricsRegistry()
+    registry.counter("test_total", "Test counter.").inc()
+    server = MetricsServer(registry, port=0).start()
+    try:
+        url = f"http://{server.host}:{server.port}"
+        with urllib.request.urlopen(f"{url}/metrics", timeout=2) as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert response.read().decode("utf-8") == registry.exposition()
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f"{url}/other", timeout=2)
+        assert error.value.code == 404
+    finally:
+        server.stop()
+
+def test_queue_errors_are_counted(make_router):
+    router = make_router({"sim": simulated()}, metrics=MetricsRegistry())
+    errors = router.errors_total
+    observe = {"action": "OBSERVE", "target": "sim", "property": "value"}
+
+    full = CommandQueue(router, max_depth=1, overflow="reject")
+    full.enqueue_command(dict(observe))
+    response = full.enqueue_command(dict(observe)).result(timeout=1)
+    assert response["error"]["code"] == ErrorCode.QUEUE_FULL.value
+    assert errors.labels(str(ErrorCode.QUEUE_FULL.value)).value() == 1
+
+    queue = CommandQueue(router, name="expiry")
+    expired = queue.enqueue_command(dict(observe), timeout=0.01)
+    invalid = queue.enqueue_command({"action": "OBSERVE", "target": "nowhere", "property": "value"})
+    time.sleep(0.05)
+    queue.start()
+    try:
+        assert expired.result(timeout=2)["error"]["code"] == ErrorCode.COMMAND_EXPIRED.value
+        assert invalid.result(timeout=2)["error"]["code"] == ErrorCode.INVALID_COMMAND.value
+    finally:
+        queue.stop()
+    assert errors.labels(str(ErrorCode.COMMAND_EXPIRED.value)).value() == 1
+    # Errors returned by the router are counted once, by the router.
+    assert errors.labels(str(ErrorCode.INVALID_COMMAND.value)).value() == 1
@@ -0,0 +1,136 @@
+import pytest
+from errors import Error, ErrorCode
+from helpers import simulated
+from middleware import Middleware, ShortCircuit
+from middleware.pipeline import MiddlewarePipeline
+
+OBSERVE = {"action": "OBSERVE", "target": "sim", "property": "value"}
+
+class Recorder(Middleware):
+    """Appends (name, hook) to a shared list for every hook call."""
+    def __init__(self, name, calls, before=None, after=None, on_error=None):
+        self.name = name
+        self.calls = calls
+        self.before_result = before
+        self.after_result = after
+        self.on_error_result = on_error
+
+    def before(self, command):
+        self.calls.append((self.name, "before"))
+        return command if self.before_result is None else self.before_result
+
+    def after(self, command, response):
+        self.calls.append((self.name, "after"))
+        return response if self.after_result is None else self.after_result
+
+    def on_error(self, command, error):
+        self.calls.append((self.name, "on_error"))
+        return self.on_error_result
+
+def pipeline_of(*middleware):
+    pipeline = MiddlewarePipeline()
+    for entry in middleware:
+        pipeline.add(entry)
+    return pipeline
+
+def test_before_runs_in_order_and_after_unwinds_in_reverse():
+    calls = []
+    chain = pipeline_of(Recorder("a", calls), Recorder("b", calls)).chain("OBSERVE", "sim")
+    command, response = chain.run_before(dict(OBSERVE))
+    assert response is None and command == OBSERVE
+    assert chain.run_after(command, {"value": 1}) == {"value": 1}
+    assert calls == [("a", "before"), ("b", "before"), ("b", "after"), ("a", "after")]
+
+def test_errors_go_through_on_error_until_replaced():
+    calls = []
+    chain = pipeline_of(Recorder("a", calls), Recorder("b", calls, on_error={"value": 0}),
+                        Recorder("c", calls)).chain("OBSERVE", "sim")
+    result = chain.run_after(dict(OBSERVE), Error(ErrorCode.ADAPTER_EXECUTION_FAILED, "boom"))
+    # b turns the error into a response, so a sees it through its after hook.
+    assert result == {"value": 0}
+    assert calls == [("c", "on_error"), ("b", "on_error"), ("a", "after")]
+
+@pytest.mark.parametrize("rejection", [
+    ShortCircuit({"value": 42}),
+    Error(ErrorCode.INVALID_COMMAND, "rejected"),
+])
+def test_before_short_circuits_skip_later_middleware(rejection):
+    calls = []
+    chain = pipeline_of(Recorder("a", calls), Recorder("b", calls, before=rejection),
+                        Recorder("c", calls)).chain("OBSERVE", "sim")
+    command, response = chain.run_before(dict(OBSERVE))
+    expected = rejection.response if isinstance(rejection, ShortCircuit) else rejection
+    assert response is expected
+    # Only the middleware registered ahead of b unwind.
+    unwound = "after" if isinstance(rejection, ShortCircuit) else "on_error"
+    assert calls == [("a", "before"), ("b", "before"), ("a", unwound)]
+
+def test_scoped_middleware_only_apply_to_their_actions_and_targets():
+    calls = []
+    pipeline = MiddlewarePipeline()
+    pipeline.add(Recorder("observe", calls), actions=["OBSERVE"])
+    pipeline.add(Recorder("other", calls), targets=["other"])
+    pipeline.chain("OBSERVE", "sim").run_before(dict(OBSERVE))
+    pipeline.chain("ACTUATE", "other").run_before({"action": "ACTUATE", "target": "other"})
+    assert calls == [("observe", "before"), ("other", "before")]
+
+def test_adding_or_removing_middleware_recompiles_chains():
+    calls = []
+    pipeline = pipeline_of(Recorder("a", calls))
+    assert len(pipeline.chain("OBSERVE", "sim").before) == 1
+    late = Recorder("b", calls)
+    pipeline.add(late)
+    assert len(pipeline.chain("OBSERVE", "sim").before) == 2
+    assert pipeline.remove(late) and not pipeline.remove(late)
+    assert list(pipeline) == [pipeline.chain("OBSERVE", "sim").before[0].middleware]
+
+def test_legacy_process_middleware_runs_as_before():
+    class Tag(Middleware):
+        def process(self, command):
+            return dict(command, tagged=True)
+
+    command, response = pipeline_of(Tag()).chain("OBSERVE", "sim").run_before(dict(OBSERVE))
+    assert response is None and command["tagged"] is True
+
+def test_hook_exceptions_propagate_out_of_the_chain():
+    class Broken(Middleware):
+        def before(self, command):
+            raise RuntimeError("broken middleware")
+
+    with pytest.raises(RuntimeError, match="broken middleware"):
+        pipeline_of(Broken()).chain("OBSERVE", "sim").run_before(dict(OBSERVE))
+
+def test_stats_count_each_hook():
+    calls = []
+    pipeline = pipeline_of(Recorder("a", calls))
+    chain = pipeline.chain("OBSERVE", "sim")
+    chain.run_before(dict(OBSERVE))
+    chain.run_after(OBSERVE, {"value": 1})
+    stats = pipeline.stats()[0]
+    assert stats["name"] == "Recorder"
+    assert stats["before"]["calls"] == stats["after"]["calls"] == 1
+    assert stats["on_error"]["calls"] == 0
+
+def test_router_runs_the_chain_around_the_adapter(make_router):
+    calls = []
+    router = make_router({"sim": simulated()})
+    router.add_middleware(Recorder("a", calls, after={"value": "patched"}))
+    assert router.route_command(dict(OBSERVE)) == {"value": "patched"}
+    assert calls == [("a", "before"), ("a", "after")]
+
+def test_router_returns_short_circuit_responses_without_the_adapter(make_router):
+    router = make_router({"sim": simulated()})
+    router.add_middleware(Recorder("a", [], before=ShortCircuit({"value": "cached"})))
+    router.adapters["sim"].execute = lambda command: pytest.fail("adapter was called")
+    assert router.route_command(dict(OBSERVE)) == {"value": "cached"}
+
+def test_router_reports_middleware_exceptions_as_internal_errors(make_router):
+    class Broken(Middleware):
+        def after(self, command, response):
+            raise RuntimeError("broken middleware")
+
+    router = make_router({"sim": simulated()})
+    router.add_middleware(Broken())
+    response = router.route_command(dict(OBSERVE))
+    assert response["error"]["code"] == ErrorCode.INTERNAL_ERROR.value
+    assert "broken middleware" in response["error"]["message"]
@@ -0,0 +1,90 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+from observe_cache import ObserveCache
+
+def test_concurrent_reads_are_coalesced():
+    cache = ObserveCache()
+    calls = []
+    release = Event()
+
+    def loader():
+        calls.append(1)
+        release.wait(1)
+        return {"value": 1}
+
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(cache.get_or_load, "t", "value", loader) for _ in range(4)]
+        while cache.stats()["coalesced"] < 3:
+            time.sleep(0.001)
+        release.set()
+        results = [future.result() for future in futures]
+    assert results == [{"value": 1}] * 4
+    assert len(calls) == 1
+
+def test_ttl_caches_and_invalidate_drops():
+    cache = ObserveCache(default_ttl=60)
+    reads = iter(range(10))
+    assert cache.get_or_load("t", "value", lambda: next(reads)) == 0
+    assert cache.get_or_load("t", "value", lambda: next(reads)) == 0
+    cache.invalidate("t")
+    assert cache.get_or_load("t", "value", lambda: next(reads)) == 1
+    assert cache.stats()["hits"] == 1
+
+def test_read_invalidated_while_in_flight_is_not_cached():
+    cache = ObserveCache(default_ttl=60)
+
+    def loader():
+        cache.invalidate("t")
+        return "stale"
+    assert cache.get_or_load("t", "value", loader) == "stale"
+    assert cache.get_or_load("t", "value", lambda: "fresh") == "fresh"
+
+def test_cancelling_async_leader_keeps_load_for_waiters():
+    cache = ObserveCache()
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def main():
+        leader = asyncio.ensure_future(cache.get_or_load_async("t", "value", loader))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(cache.get_or_load_async("t", "value", loader))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await waiter, leader.cancelled()
+
+    assert asyncio.run(main()) == ("value", True)
+    assert len(calls) == 1
+
+def test_async_loader_exception_reaches_every_caller():
+    cache = ObserveCache()
+
+    async def loader():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("bus error")
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_load_async("t", "value", loader) for _ in range(3)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+def test_deferred_callback_failure_does_not_stop_delivery():
+    cache = ObserveCache()
+    pending = []
+    delivered = []
+
+    def failing(result):
+        raise RuntimeError("caller bug")
+
+    cache.get_or_load_deferred("t", "value", pending.append, failing)
+    cache.get_or_load_deferred("t", "value", pending.append, delivered.append)
+    assert len(pending) == 1
+    pending[0]({"value": 2})
+    assert delivered == [{"value": 2}]
@@ -0,0 +1,142 @@
+import json
+import logging
+import pytest
+from codec import DecodeError
+from helpers import simulated
+from process_queue import ProcessCommandQueue, _peek_target, shard_for
+
+MEMBERS = ["light_1", "light_2", "light_3", "light_4"]
+
+@pytest.fixture
+def process_queue(write_config):
+    config = {name: simulated() for name in MEMBERS}
+    config["lights"] = {"group": MEMBERS}
+    queue = ProcessCommandQueue(write_config(config), process_count=2, threads_per_process=1,
+                                logging_options={"log_file": None, "level": logging.WARNING})
+    queue.start()
+    yield queue
+    queue.stop()
+
+def test_group_members_span_shards():
+    assert len({shard_for(name, 2) for name in MEMBERS}) == 2
+
+def test_group_command_is_expanded_to_member_shards(process_queue):
+    responses = []
+    command = {"action": "ACTUATE", "target": "lights", "property": "state", "value": "ON"}
+    process_queue.enqueue_command(command, callback=responses.append)
+    process_queue.join()
+    assert responses[0]["group"] == "lights"
+    assert responses[0]["succeeded"] == len(MEMBERS) and responses[0]["errors"] == {}
+
+def test_group_command_in_batch_keeps_slot(process_queue):
+    batches = []
+    process_queue.enqueue_batch([
+        {"action": "OBSERVE", "target": "light_1", "property": "value"},
+        {"action": "ACTUATE", "target": "lights", "property": "state", "value": "BLINK"},
+        {"action": "OBSERVE", "target": "light_4", "property": "value"},
+    ], callback=batches.append)
+    process_queue.join()
+    first, group, last = batches[0]
+    assert first == last == {"value": 0}
+    # Every member rejects the value, so the group answers with their common error.
+    assert "error" in group and "All 4 members of group 'lights' failed" in group["error"]["message"]
+
+def test_aggregate_reads_every_shard(process_queue):
+    responses = {}
+    command = {"action": "AGGREGATE", "target": "lights", "property": "value", "value": ["count", "max"]}
+    process_queue.enqueue_command(command, callback=lambda response: responses.update(read=response))
+    process_queue.enqueue_command(dict(command, window=10), callback=lambda response: responses.update(window=response))
+    process_queue.join()
+    assert responses["read"] == {"aggregate": "value", "targets": 4, "stats": {"count": 4, "max": 0.0}, "errors": {}}
+    assert responses["window"]["error"]["message"] == "Window queries are not supported by ProcessCommandQueue"
+
+def test_enqueue_returns_future(process_queue):
+    def fail(response):
+        raise RuntimeError("caller bug")
+    observe = {"action": "OBSERVE", "target": "light_2", "property": "value"}
+    assert process_queue.enqueue_command(observe, callback=fail).result(10) == {"value": 0}
+    # The receiver thread survived the raising callback.
+    assert process_queue.enqueue_command(observe, callback=lambda response: None).result(10) == {"value": 0}
+    group = process_queue.enqueue_command({"action": "OBSERVE", "target": "lights", "property": "value"},
+                                          callback=lambda response: None)
+    assert group.result(10)["succeeded"] == len(MEMBERS)
+    batch = process_queue.enqueue_batch([observe, {"action": "OBSERVE", "target": "light_3", "property": "value"}],
+                                        callback=lambda responses: None)
+    assert batch.result(10) == [{"value": 0}, {"value": 0}]
+    assert process_queue.enqueue_batch([], callback=lambda responses: None).result(1) == []
+
+def test_expanded_commands_get_a_priority_under_the_priority_scheduler(write_config):
+    config = {name: simulated() for name in MEMBERS}
+    config["lights"] = {"group": MEMBERS}
+    queue = ProcessCommandQueue(write_config(config), process_count=2, threads_per_process=1,
+                                queue_options={"scheduler": "priority"},
+                                logging_options={"log_file": None, "level": logging.WARNING})
+    queue.start()
+    try:
+        ignore = lambda response: None
+        group = queue.enqueue_command({"action": "ACTUATE", "target": "lights", "property": "state", "value": "ON"},
+                                      callback=ignore)
+        aggregate = queue.enqueue_command({"action": "AGGREGATE", "target": "lights", "property": "value",
+                                           "value": ["count"]}, callback=ignore)
+        batch = queue.enqueue_batch([{"action": "OBSERVE", "target": "light_1", "property": "value"}],
+                                    priority=None, callback=ignore)
+        assert group.result(10)["succeeded"] == len(MEMBERS)
+        assert aggregate.result(10)["stats"] == {"count": 4}
+        assert batch.result(10) == [{"value": 0}]
+        # The workers are still alive and answering.
+        assert queue.enqueue_command({"action": "OBSERVE", "target": "light_2", "property": "value"},
+                                     callback=ignore).result(10) == {"value": 0}
+    finally:
+        queue.stop()
+
+class CountingCodec:
+    """A JSON codec counting decodes; name it something else to stand in for another wire format."""
+
+    def __init__(self, name="json"):
+        self.name = name
+        self.decoded = 0
+
+    def decode(self, data):
+        self.decoded += 1
+        try:
+            return json.loads(data)
+        except ValueError as e:
+            raise DecodeError(str(e)) from e
+
+    def encode(self, obj):
+        return json.dumps(obj).encode("utf-8")
+
+@pytest.mark.parametrize("command, target", [
+    ('{"action": "OBSERVE", "target": "light_1", "property": "value"}', "light_1"),
+    (b'{"target" : "light_2", "action": "OBSERVE"}', "light_2"),
+    ('{"target": "light_1", "property": "target"}', None),
+    ('{"target": "caf\\u00e9"}', None),
+    ('{"action": "AGGREGATE", "target": "light_1"}', None),
+    ('{"target": ["light_1"]}', None),
+])
+def test_peek_target(command, target):
+    assert _peek_target(command) == target
+
+def test_json_commands_are_sharded_without_decoding_them(write_config):
+    config = {name: simulated() for name in MEMBERS}
+    config["lights"] = {"group": MEMBERS}
+    codec = CountingCodec()
+    queue = ProcessCommandQueue(write_config(config), process_count=2, router_options={"codec": codec})
+    text = '{"action": "OBSERVE", "target": "light_3", "property": "value"}'
+    assert queue._classify(text) == ("light_3", text)
+    assert codec.decoded == 0
+    # Group targets and AGGREGATE queries are expanded here, so they are decoded once.
+    group = '{"action": "OBSERVE", "target": "lights", "property": "value"}'
+    assert queue._classify(group) == ("lights", json.loads(group))
+    aggregate = '{"action": "AGGREGATE", "target": ["light_1", "light_2"], "property": "value"}'
+    assert queue._classify(aggregate)[1]["target"] == ["light_1", "light_2"]
+    assert codec.decoded == 2
+
+def test_other_codecs_are_decoded_with_the_router_codec(write_config):
+    codec = CountingCodec(name="binary")
+    queue = ProcessCommandQueue(write_config({name: simulated() for name in MEMBERS}), process_count=2,
+                                router_options={"codec": codec})
+    command = b'{"action": "OBSERVE", "target": "light_4", "property": "value"}'
+    assert queue._classify(command) == ("light_4", json.loads(command))
+    assert queue._classify(b"not a command") == (None, b"not a command")
+    assert codec.decoded == 2
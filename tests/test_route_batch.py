@@ -0,0 +1,65 @@
+import asyncio
+import time
+from helpers import counting_reads, simulated
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_batch_observe_window_matches_route_command(make_router):
+    config = {"sim": dict(simulated(), sampling={"value": {"interval": 0.01}})}
+    router = make_router(config)
+    counting_reads(router.adapters["sim"], value=5)
+    router.start_sampling()
+    wait_for(lambda: len(router.sampler.series[("sim", "value")].buffer) >= 3)
+    command = {"action": "OBSERVE", "target": "sim", "property": "value", "window": 60}
+    single = router.route_command(dict(command))
+    batched = router.route_batch([dict(command)])[0]
+    assert batched == single
+    assert batched["value"]["window"] == 60 and batched["value"]["mean"] == 5.0
+
+def test_batch_observe_window_requires_sampling(make_router):
+    router = make_router({"sim": simulated()})
+    response = router.route_batch([{"action": "OBSERVE", "target": "sim", "property": "value", "window": 10}])[0]
+    assert response["error"]["message"] == "Window queries require sampling to be started"
+
+def test_batch_keeps_per_target_order_across_observe_and_actuate(make_router):
+    router = make_router({"sim": simulated()}, cache_max_entries=16)
+    router.observe_cache.default_ttl = 60
+    adapter = counting_reads(router.adapters["sim"], value=1)
+    observe = {"action": "OBSERVE", "target": "sim", "property": "value"}
+    actuate = {"action": "ACTUATE", "target": "sim", "property": "state", "value": "ON"}
+    responses = router.route_batch([observe, observe, actuate, observe])
+    assert responses[0] == responses[1] == responses[3] == {"value": 1}
+    assert responses[2] == {"status": "State set to ON"}
+    # The second read is cached; the ACTUATE invalidates it, so the last one reads again.
+    assert adapter.reads == 2
+
+def test_async_batch_observes_share_one_read(make_router):
+    from async_router import AsyncCommandRouter
+    router = make_router({"sim": simulated()}, router_class=AsyncCommandRouter)
+    adapter = counting_reads(router.adapters["sim"], value=3, delay=0.05)
+    observe = {"action": "OBSERVE", "target": "sim", "property": "value"}
+    responses = asyncio.run(router.route_batch_async([observe, observe, observe]))
+    assert responses == [{"value": 3}] * 3
+    assert adapter.reads == 1
+def test_batch_runs_fan_outs_in_input_order(make_router):
+    config = {"a": simulated(), "b": simulated(), "both": {"group": ["a", "b"]}}
+    router = make_router(config)
+    order = []
+    for name in ("a", "b"):
+        adapter = router.adapters[name]
+        def transfer(written=None, name=name):
+            order.append((name, written))
+            return written if written is not None else 0
+        adapter._transfer = transfer
+    router.route_batch([
+        {"action": "ACTUATE", "target": "a", "property": "state", "value": "ON"},
+        {"action": "ACTUATE", "target": "both", "property": "state", "value": "OFF"},
+        {"action": "ACTUATE", "target": "b", "property": "state", "value": "ON"},
+    ])
+    assert order[0] == ("a", "ON")
+    assert sorted(order[1:3]) == [("a", "OFF"), ("b", "OFF")]
+    assert order[3] == ("b", "ON")
@@ -0,0 +1,55 @@
+import time
+from command_queue import CommandQueue
+from helpers import counting_reads, simulated
+from sampling import RingBuffer
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_ring_buffer_wraps_and_slices_windows():
+    buffer = RingBuffer(capacity=4)
+    for second in range(6):
+        buffer.append(100.0 + second, float(second))
+    assert len(buffer) == 4
+    assert buffer.latest() == (105.0, 5.0)
+    assert list(buffer.since(103.0)) == [3.0, 4.0, 5.0]
+    assert buffer.window(1.5, now=105.0) == [4.0, 5.0]
+
+def sampled_router(make_router, **entry):
+    router = make_router({"sim": dict(simulated(), sampling={"value": {"interval": 0.01}}, **entry)})
+    return router, counting_reads(router.adapters["sim"], value=7)
+
+def test_windows_ignore_wall_clock_steps(make_router, monkeypatch):
+    router, _ = sampled_router(make_router)
+    router.start_sampling()
+    wait_for(lambda: len(router.sampler.series[("sim", "value")].buffer) >= 3)
+    # A wall clock step, e.g. an NTP correction, must not empty or stretch the windows.
+    monkeypatch.setattr(time, "time", lambda: 0.0)
+    assert len(router.sampler.window_values("sim", "value", 60)) >= 3
+    assert router.route_command({"action": "OBSERVE", "target": "sim", "property": "value"}) == {"value": 7}
+
+def test_sampler_skips_targets_with_open_circuit(make_router):
+    router, adapter = sampled_router(make_router)
+    router.circuit_breaker.record_failure("sim")
+    router.circuit_breaker.record_failure("sim")
+    router.start_sampling()
+    series = router.sampler.series[("sim", "value")]
+    wait_for(lambda: series.skipped >= 3)
+    assert adapter.reads == 0
+    router.circuit_breaker.record_success("sim")
+    wait_for(lambda: adapter.reads >= 1)
+
+def test_sampler_takes_a_lane_slot(make_router):
+    router, adapter = sampled_router(make_router, max_concurrency=1)
+    queue = CommandQueue(router)
+    assert router.lanes is queue.lanes
+    assert queue.lanes.try_enter("sim")
+    router.start_sampling()
+    series = router.sampler.series[("sim", "value")]
+    wait_for(lambda: series.skipped >= 3)
+    assert adapter.reads == 0
+    queue.lanes.leave("sim")
+    wait_for(lambda: adapter.reads >= 1)
@@ -0,0 +1,84 @@
+import time
+from threading import Thread
+from scheduler import (
+    ACCEPTED, COALESCED, OVERFLOW_BLOCK, OVERFLOW_COALESCE, OVERFLOW_DROP_OLDEST_OBSERVE, OVERFLOW_REJECT,
+    PRIORITY_HIGH, PRIORITY_LOW, REJECTED, FifoScheduler, PriorityScheduler, QueuedCommand
+)
+
+def item(action="OBSERVE", target="t", property="value", priority=None, deadline=None):
+    command = {"action": action, "target": target, "property": property}
+    kwargs = {} if priority is None else {"priority": priority}
+    return QueuedCommand(command, deadline=deadline, key=(action, target, property), **kwargs)
+
+def test_reject_when_full():
+    scheduler = FifoScheduler(max_depth=1, overflow=OVERFLOW_REJECT)
+    assert scheduler.put(item()) == ACCEPTED
+    assert scheduler.put(item(target="u")) == REJECTED
+    assert scheduler.qsize() == 1
+
+def test_drop_oldest_observe_evicts_an_observe():
+    dropped = []
+    scheduler = FifoScheduler(max_depth=2, overflow=OVERFLOW_DROP_OLDEST_OBSERVE, on_dropped=dropped.append)
+    actuate, observe = item("ACTUATE", property="state"), item()
+    scheduler.put(actuate)
+    scheduler.put(observe)
+    newest = item("ACTUATE", target="u", property="state")
+    assert scheduler.put(newest) == ACCEPTED
+    assert dropped == [observe]
+    assert [scheduler.get(), scheduler.get()] == [actuate, newest]
+
+def test_drop_oldest_observe_rejects_without_observes():
+    scheduler = FifoScheduler(max_depth=1, overflow=OVERFLOW_DROP_OLDEST_OBSERVE)
+    scheduler.put(item("ACTUATE", property="state"))
+    assert scheduler.put(item("ACTUATE", target="u", property="state")) == REJECTED
+
+def test_coalesce_merges_into_pending_command():
+    scheduler = FifoScheduler(overflow=OVERFLOW_COALESCE)
+    first, second = item("ACTUATE", property="state"), item("ACTUATE", property="state")
+    second.command = dict(second.command, value="ON")
+    assert scheduler.put(first) == ACCEPTED
+    assert scheduler.put(second) == COALESCED
+    pending = scheduler.get()
+    assert pending is first and pending.followers == [second]
+    assert pending.command["value"] == "ON"
+    # Once taken, a new command for the key is queued again.
+    assert scheduler.put(item("ACTUATE", property="state")) == ACCEPTED
+
+def test_block_waits_for_a_free_slot():
+    scheduler = FifoScheduler(max_depth=1, overflow=OVERFLOW_BLOCK)
+    scheduler.put(item())
+    outcomes = []
+    producer = Thread(target=lambda: outcomes.append(scheduler.put(item(target="u"))))
+    producer.start()
+    time.sleep(0.05)
+    assert outcomes == []
+    scheduler.get()
+    producer.join(1)
+    assert outcomes == [ACCEPTED]
+
+def test_priority_order_and_expiry():
+    expired = []
+    scheduler = PriorityScheduler(on_expired=expired.append)
+    low, high = item(priority=PRIORITY_LOW), item(target="u", priority=PRIORITY_HIGH)
+    stale = item(target="v", priority=PRIORITY_HIGH, deadline=time.monotonic() - 1)
+    for queued in (low, stale, high):
+        scheduler.put(queued)
+    assert [scheduler.get(), scheduler.get()] == [high, low]
+    assert expired == [stale]
+
+def test_lone_expired_command_is_reported_without_waiting_for_another():
+    expired = []
+    scheduler = FifoScheduler(on_expired=expired.append)
+    consumer = Thread(target=lambda: expired.append(scheduler.get()))
+    consumer.start()
+    stale = item(deadline=time.monotonic() - 1)
+    scheduler.put(stale)
+    deadline = time.monotonic() + 1
+    while not expired and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert expired == [stale]
+    scheduler.join()
+    fresh = item(target="u")
+    scheduler.put(fresh)
+    consumer.join(1)
+    assert expired == [stale, fresh]
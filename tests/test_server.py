@@ -0,0 +1,128 @@
+import asyncio
+import json
+import time
+from async_router import AsyncCommandRouter
+from errors import ErrorCode
+from helpers import counting_reads, simulated
+from server import CommandServer
+
+def observe(target):
+    return {"action": "OBSERVE", "target": target, "property": "value"}
+
+async def exchange(server, requests):
+    """Sends each request on one connection and returns the responses by id."""
+    await server.start()
+    try:
+        reader, writer = await asyncio.open_connection(server.host, server.port)
+        for request in requests:
+            writer.write(json.dumps(request).encode() + b"\n")
+        await writer.drain()
+        responses = [json.loads(await asyncio.wait_for(reader.readline(), 2)) for _ in requests]
+        writer.close()
+        return {json.dumps(response["id"]): response for response in responses}
+    finally:
+        await server.stop()
+
+def test_failing_lines_are_answered_with_their_id(make_router, monkeypatch):
+    router = make_router({"sim": simulated(), "odd": simulated()}, router_class=AsyncCommandRouter)
+    counting_reads(router.adapters["odd"], value={1, 2})
+
+    async def broken_batch(commands):
+        raise RuntimeError("router bug")
+    monkeypatch.setattr(router, "route_batch_async", broken_batch)
+    server = CommandServer(router, port=0)
+    responses = asyncio.run(exchange(server, [
+        {"id": [1], "subscribe": {}},
+        {"id": 2, "unsubscribe": {"id": 1}},
+        dict(observe("odd"), id=3),
+        {"id": 4, "batch": [observe("sim")]},
+        dict(observe("sim"), id=5)
+    ]))
+    assert responses["[1]"]["error"]["code"] == ErrorCode.INVALID_COMMAND.value
+    assert responses["2"]["error"]["code"] == ErrorCode.INVALID_COMMAND.value
+    assert responses["3"]["error"]["code"] == ErrorCode.INTERNAL_ERROR.value
+    assert responses["4"]["error"]["code"] == ErrorCode.INTERNAL_ERROR.value
+    assert responses["5"] == {"id": 5, "result": {"value": 0}}
+
+def actuate(target, value="ON"):
+    return {"action": "ACTUATE", "target": target, "property": "state", "value": value}
+
+async def send(writer, request):
+    writer.write(json.dumps(request).encode() + b"\n")
+    await writer.drain()
+
+async def read(reader, timeout=2):
+    return json.loads(await asyncio.wait_for(reader.readline(), timeout))
+
+def test_pipelined_responses_are_written_as_they_are_ready(make_router):
+    router = make_router({"slow": simulated(latency={"seconds": 0.2}), "fast": simulated()},
+                         router_class=AsyncCommandRouter)
+    server = CommandServer(router, port=0)
+
+    async def run():
+        await server.start()
+        try:
+            reader, writer = await asyncio.open_connection(server.host, server.port)
+            start = time.monotonic()
+            await send(writer, dict(actuate("slow"), id="slow"))
+            await send(writer, dict(actuate("fast"), id="fast"))
+            first, second = await read(reader), await read(reader)
+            elapsed = time.monotonic() - start
+            writer.close()
+            return first["id"], second["id"], elapsed
+        finally:
+            await server.stop()
+
+    first, second, elapsed = asyncio.run(run())
+    assert (first, second) == ("fast", "slow")
+    assert elapsed < 0.35
+
+def test_idle_connections_do_not_hold_in_flight_slots(make_router):
+    router = make_router({"sim": simulated()}, router_class=AsyncCommandRouter)
+    server = CommandServer(router, port=0, max_in_flight=2)
+
+    async def run():
+        await server.start()
+        try:
+            idle = [await asyncio.open_connection(server.host, server.port) for _ in range(3)]
+            subscriber_reader, subscriber = await asyncio.open_connection(server.host, server.port)
+            await send(subscriber, {"id": "events", "subscribe": {"target": "sim"}})
+            assert "subscribed" in (await read(subscriber_reader))["result"]
+            reader, writer = await asyncio.open_connection(server.host, server.port)
+            await send(writer, dict(actuate("sim"), id=1))
+            response = await read(reader)
+            for _, connection in idle + [(None, subscriber), (None, writer)]:
+                connection.close()
+            return response
+        finally:
+            await server.stop()
+
+    assert asyncio.run(run()) == {"id": 1, "result": {"status": "State set to ON"}}
+
+def test_in_flight_limits_apply_backpressure(make_router):
+    router = make_router({name: simulated(latency={"seconds": 0.1}) for name in ("a", "b", "c")},
+                         router_class=AsyncCommandRouter)
+
+    async def run(server, connections):
+        """Sends one command per target, spread over connections; returns the seconds until all are answered."""
+        await server.start()
+        try:
+            streams = [await asyncio.open_connection(server.host, server.port) for _ in range(connections)]
+            start = time.monotonic()
+            for index, target in enumerate(("a", "b", "c")):
+                await send(streams[index % connections][1], dict(actuate(target), id=target))
+            for index in range(3):
+                await read(streams[index % connections][0])
+            elapsed = time.monotonic() - start
+            for _, writer in streams:
+                writer.close()
+            return elapsed
+        finally:
+            await server.stop()
+
+    # Unlimited, the three commands run together.
+    assert asyncio.run(run(CommandServer(router, port=0), 1)) < 0.25
+    # One per connection: a pipelining client gets its commands run one after another.
+    assert asyncio.run(run(CommandServer(router, port=0, max_in_flight_per_connection=1), 1)) >= 0.3
+    # One for the whole server: separate connections queue up as well.
+    assert asyncio.run(run(CommandServer(router, port=0, max_in_flight=1), 3)) >= 0.3
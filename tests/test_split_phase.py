@@ -0,0 +1,104 @@
+import time
+from threading import Event
+import pytest
+from command_queue import CommandQueue
+from errors import Error, ErrorCode
+from i2c_bus import close_bus, open_bus
+from simulation import FakeSMBus
+from split_phase import CompletionTimer, PendingOperation
+
+BUS = 91
+
+@pytest.fixture
+def timer():
+    timer = CompletionTimer()
+    yield timer
+    timer.stop()
+
+def test_pending_operation_waits_for_its_delay():
+    operation = PendingOperation(0.05, lambda: "done")
+    assert 0 < operation.remaining() <= 0.05
+    start = time.monotonic()
+    assert operation.wait() == "done"
+    assert time.monotonic() - start >= 0.04
+    assert operation.remaining() == 0.0
+
+def test_timer_completes_operations_when_due_in_order(timer):
+    results = []
+    done = Event()
+    start = time.monotonic()
+
+    def record(name):
+        def callback(result):
+            results.append((name, result, time.monotonic() - start))
+            if len(results) == 2:
+                done.set()
+        return callback
+
+    timer.schedule(PendingOperation(0.08, lambda: "slow"), record("slow"))
+    timer.schedule(PendingOperation(0.02, lambda: "fast"), record("fast"))
+    assert done.wait(1)
+    assert [(name, result) for name, result, _ in results] == [("fast", "fast"), ("slow", "slow")]
+    assert results[0][2] >= 0.015 and results[1][2] >= 0.075
+
+def test_timer_turns_failed_completion_into_error_and_survives_bad_callbacks(timer):
+    results = []
+    done = Event()
+
+    def fail():
+        raise OSError("NACK")
+
+    def bad_callback(result):
+        raise RuntimeError("caller bug")
+
+    timer.schedule(PendingOperation(0, fail), lambda result: results.append(result))
+    timer.schedule(PendingOperation(0.01, lambda: 1), bad_callback)
+    timer.schedule(PendingOperation(0.02, lambda: 2), lambda result: (results.append(result), done.set()))
+    assert done.wait(1)
+    assert isinstance(results[0], Error) and results[0].code == ErrorCode.ADAPTER_EXECUTION_FAILED
+    assert results[1] == 2
+
+@pytest.fixture
+def sensors(make_router):
+    """A router with four humidity sensors sharing one fake I2C bus."""
+    shared = open_bus(BUS, FakeSMBus)
+    names = [f"humidity_{index}" for index in range(4)]
+    config = {
+        name: {"module": "humidity_sensor_adapter",
+               "params": {"bus": BUS, "address": hex(0x40 + index), "measurement_delay": 0.1}}
+        for index, name in enumerate(names)
+    }
+    yield make_router(config), names
+    close_bus(shared)
+
+def humidity(target):
+    return {"action": "OBSERVE", "target": target, "property": "current_humidity"}
+
+def test_deferred_route_releases_the_caller(sensors):
+    router, names = sensors
+    results = []
+    done = Event()
+    start = time.monotonic()
+    router.route_command_deferred(humidity(names[0]), lambda response: (results.append(response), done.set()))
+    assert time.monotonic() - start < 0.05
+    assert done.wait(1)
+    assert results[0]["current_humidity"] == pytest.approx(0x6666 * 125.0 / 65536.0 - 6.0)
+
+def test_queue_overlaps_conversions_and_expires_parked_commands(sensors):
+    router, names = sensors
+    queue = CommandQueue(router, worker_count=1, split_phase=True)
+    queue.handle_response = lambda response: None
+    queue.start()
+    try:
+        start = time.monotonic()
+        futures = [queue.enqueue_command(humidity(name)) for name in names]
+        assert all("current_humidity" in future.result(1) for future in futures)
+        # One worker, four 0.1s conversions: they ran concurrently.
+        assert time.monotonic() - start < 0.3
+        # MAX_CONCURRENCY is 1, so the second read waits in the lane past its deadline.
+        first = queue.enqueue_command(humidity(names[0]))
+        second = queue.enqueue_command(humidity(names[0]), timeout=0.02)
+        assert "current_humidity" in first.result(1)
+        assert second.result(1)["error"]["code"] == ErrorCode.COMMAND_EXPIRED.value
+    finally:
+        queue.stop()
@@ -0,0 +1,76 @@
+import asyncio
+import time
+from threading import Timer
+from async_router import AsyncCommandRouter
+from command_queue import CommandQueue
+from core import CommandRouter
+from errors import ErrorCode
+from helpers import counting_reads, simulated
+from target_groups import load_groups
+
+def observe(target):
+    return {"action": "OBSERVE", "target": target, "property": "value"}
+
+def test_nested_groups_expand_once_and_cycles_are_skipped():
+    groups = load_groups({
+        "a": simulated(), "b": simulated(),
+        "pair": {"group": ["a", "b"]},
+        "all": {"group": ["pair", "b", "a"], "max_parallel": 2},
+        "loop": {"group": ["a", "loop"]}
+    })
+    assert groups["all"].members == ("a", "b") and groups["all"].max_parallel == 2
+    assert "loop" not in groups
+
+def test_members_slower_than_the_group_timeout_expire(make_router):
+    config = {name: simulated() for name in ("fast_1", "slow", "fast_2")}
+    config["room"] = {"group": list(config), "timeout": 0.1}
+    router = make_router(config)
+    counting_reads(router.adapters["slow"], value=1, delay=0.5)
+    start = time.monotonic()
+    response = router.route_command(observe("room"))
+    assert time.monotonic() - start < 0.4
+    assert response["succeeded"] == 2 and set(response["results"]) == {"fast_1", "fast_2"}
+    assert response["errors"]["slow"]["code"] == ErrorCode.COMMAND_EXPIRED.value
+
+def test_members_not_started_before_the_timeout_are_skipped(make_router):
+    config = {name: simulated() for name in ("first", "second", "third")}
+    config["room"] = {"group": list(config), "timeout": 0.1, "max_parallel": 1}
+    router = make_router(config)
+    adapters = [counting_reads(router.adapters[name], delay=0.2) for name in ("first", "second", "third")]
+    response = router.route_command(observe("room"))
+    # Every member expired, so the group answers with their common error.
+    assert response["error"]["code"] == ErrorCode.COMMAND_EXPIRED.value
+    time.sleep(0.3)
+    assert [adapter.reads for adapter in adapters] == [1, 0, 0]
+
+def lane_router(make_router, router_class=CommandRouter):
+    """A router with a one-slot target in a group, and the execution lanes a CommandQueue gives it."""
+    config = {"serial": dict(simulated(), max_concurrency=1), "free": simulated()}
+    config["room"] = {"group": ["serial", "free"], "timeout": 0.1}
+    router = make_router(config, router_class=router_class)
+    CommandQueue(router)
+    counting_reads(router.adapters["serial"])
+    # Something else, e.g. a queued command, holds the serial target's only slot.
+    assert router.lanes.try_enter("serial")
+    return router
+
+def test_members_wait_for_a_slot_in_their_execution_lane(make_router):
+    router = lane_router(make_router)
+    response = router.route_command(observe("room"))
+    assert response["errors"]["serial"]["code"] == ErrorCode.COMMAND_EXPIRED.value
+    assert "free" in response["results"] and router.adapters["serial"].reads == 0
+    # Once the slot is freed within the group timeout, the member runs.
+    Timer(0.03, router.lanes.leave, ("serial",)).start()
+    response = router.route_command(observe("room"))
+    assert response["succeeded"] == 2 and router.adapters["serial"].reads == 1
+    assert router.lanes.get_depths()["serial"]["active"] == 0
+
+def test_async_members_wait_for_a_slot_in_their_execution_lane(make_router):
+    router = lane_router(make_router, AsyncCommandRouter)
+    response = asyncio.run(router.route_command_async(observe("room")))
+    assert response["errors"]["serial"]["code"] == ErrorCode.COMMAND_EXPIRED.value
+    assert router.adapters["serial"].reads == 0
+    Timer(0.03, router.lanes.leave, ("serial",)).start()
+    response = asyncio.run(router.route_command_async(observe("room")))
+    assert response["succeeded"] == 2 and router.adapters["serial"].reads == 1
+    assert router.lanes.get_depths()["serial"]["active"] == 0